@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+原子写入文件
+
+先写入同目录下的临时文件，成功后用os.replace原子替换目标文件：写入过程中崩溃、出错或
+两个线程/进程同时写入，都不会留下只写了一半的文件。配置、处理清单、水印索引、缩略图缓存、
+性能报告和输出图片都通过这里写入。
+临时文件名包含进程号和线程号，以.tmp结尾（监视文件夹和缩略图缓存据此忽略它们）。
+
+本模块只依赖标准库，不导入项目中的其他模块，可以被任何模块使用。
+"""
+
+import contextlib
+import os
+import threading
+
+
+def temp_path_for(path):
+    """path对应的临时文件路径，不同进程、线程写入同一文件时互不冲突"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+@contextlib.contextmanager
+def atomic_output(path):
+    """
+    返回临时文件路径供调用者写入（如交给Pillow或jpegtran），正常退出时替换为path
+    出错时删除临时文件并重新抛出异常
+    """
+    temp_path = temp_path_for(path)
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path, data, fsync=True):
+    """
+    原子写入文件，目录不存在时创建
+    :param data: bytes，或按UTF-8编码的str
+    :param fsync: 替换前把内容刷到磁盘，断电后不会出现空文件；缓存等可以重新生成的文件可以关闭
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with atomic_output(path) as temp_path:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
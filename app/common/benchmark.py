@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+水印引擎吞吐量基准测试
+
+在本地生成固定内容的合成图片集（小图JPEG、24MP/100MP JPEG、RGBA PNG、调色板GIF、混合目录），
+用 WatermarkEngine 在不同位置、自动反色和编码配置下无界面处理，统计 张/秒、MP/s、峰值内存和输出体积。
+结果可以保存为基线文件，之后的运行与基线比较，吞吐量下降或内存增长超过阈值时视为性能回退。
+
+每个用例在独立的子进程中运行，峰值内存互不影响，水印缓存也不会在用例之间复用。
+用法见 python main.py bench --help。
+"""
+
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+from app.common.atomic_file import atomic_output, atomic_write
+from app.common.watermark_engine import IMAGE_EXTENSIONS, WatermarkEngine, get_application_path
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不统计峰值内存
+    resource = None
+
+# 合成图片的生成规则版本，规则变化时已生成的图片集会重新生成
+CORPUS_VERSION = 1
+
+# 图片集：名称 -> [(格式, 模式, 宽, 高, 数量), ...]
+CORPORA = {
+    'small': [('JPEG', 'RGB', 1600, 1200, 24)],
+    '24mp': [('JPEG', 'RGB', 6000, 4000, 3)],
+    '100mp': [('JPEG', 'RGB', 12240, 8160, 1)],
+    'png_rgba': [('PNG', 'RGBA', 2400, 1600, 6)],
+    'gif_palette': [('GIF', 'P', 1200, 900, 8)],
+    'mixed': [('JPEG', 'RGB', 4000, 3000, 4), ('PNG', 'RGBA', 1600, 1200, 2),
+              ('GIF', 'P', 1200, 900, 2), ('WEBP', 'RGB', 2000, 1500, 2)],
+}
+
+# 处理场景：名称 -> 覆盖的配置项
+SCENARIOS = {
+    'center': {'Logo_xy': {'x': 0, 'y': 0}, 'Auto_invert': False, 'Encoder_profile': 'max_quality'},
+    'corner_invert': {'Logo_xy': {'x': 2, 'y': 2}, 'Logo_bottom': 3, 'Auto_invert': True,
+                      'Encoder_profile': 'max_quality'},
+    'balanced': {'Logo_xy': {'x': 0, 'y': 2}, 'Auto_invert': True, 'Encoder_profile': 'balanced'},
+    'fast': {'Logo_xy': {'x': 1, 'y': 1}, 'Auto_invert': True, 'Invert_accuracy': 'fast',
+             'Encoder_profile': 'fast'},
+}
+
+DEFAULT_CORPORA = ('small', '24mp', 'png_rgba', 'gif_palette', 'mixed')
+DEFAULT_THRESHOLD = 0.10
+
+_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+_SEED = 20250723
+
+
+def get_bench_dir():
+    """获取基准测试目录data/bench，生成的图片集和默认基线保存在这里"""
+    return os.path.join(get_application_path(), 'data', 'bench')
+
+
+def _noise_tile(rng, size=256):
+    """生成固定种子的灰度噪声块，平铺后为合成图片提供纹理，使JPEG体积接近真实照片"""
+    return Image.frombytes('L', (size, size), bytes(rng.getrandbits(8) for _ in range(size * size)))
+
+
+def synthesize_image(image_format, mode, width, height, index):
+    """
+    生成一张内容固定的合成图片：渐变背景 + 平铺噪声 + 亮暗色块
+    相同参数每次生成的像素完全相同
+    """
+    rng = random.Random(f"{_SEED}-{image_format}-{width}x{height}-{index}")
+    gradient = Image.linear_gradient('L').resize((width, height), Image.BILINEAR)
+    channels = [gradient, gradient.transpose(Image.ROTATE_90).resize((width, height)),
+                gradient.transpose(Image.FLIP_TOP_BOTTOM)]
+    image = Image.merge('RGB', channels)
+
+    tile = _noise_tile(rng)
+    noise = Image.new('L', (width, height))
+    for top in range(0, height, tile.height):
+        for left in range(0, width, tile.width):
+            noise.paste(tile, (left, top))
+    image = Image.blend(image, Image.merge('RGB', (noise, noise, noise)), 0.25)
+
+    # 随机放置亮色和暗色块，让自动反色在不同位置得到不同结果
+    for _ in range(12):
+        block_w, block_h = rng.randint(width // 10, width // 3), rng.randint(height // 10, height // 3)
+        left, top = rng.randint(0, width - block_w), rng.randint(0, height - block_h)
+        color = (240, 240, 240) if rng.random() < 0.5 else (20, 20, 20)
+        image.paste(color, (left, top, left + block_w, top + block_h))
+
+    if mode == 'RGBA':
+        alpha = Image.linear_gradient('L').resize((width, height)).point(lambda value: 128 + value // 2)
+        image.putalpha(alpha)
+    elif mode == 'P':
+        image = image.quantize(colors=128)
+    return image
+
+
+def synthesize_logo(path):
+    """生成带透明通道的合成水印"""
+    logo = Image.new('RGBA', (800, 200), (0, 0, 0, 0))
+    stripe = Image.new('RGBA', (760, 40), (255, 255, 255, 230))
+    for top in (20, 80, 140):
+        logo.paste(stripe, (20, top))
+    logo.save(path, 'PNG')
+
+
+def ensure_corpus(name, bench_dir=None):
+    """
+    生成（或复用已生成的）图片集
+    :return: (图片目录, 水印路径)
+    """
+    bench_dir = bench_dir or get_bench_dir()
+    corpus_dir = os.path.join(bench_dir, 'corpus', name)
+    marker_path = os.path.join(corpus_dir, 'corpus.json')
+    spec = {'version': CORPUS_VERSION, 'spec': CORPORA[name]}
+    logo_path = os.path.join(bench_dir, 'corpus', 'logo.png')
+
+    if not os.path.exists(logo_path):
+        os.makedirs(os.path.dirname(logo_path), exist_ok=True)
+        # 中途退出时不留下不完整的水印，否则之后的运行会一直复用它
+        with atomic_output(logo_path) as temp_path:
+            synthesize_logo(temp_path)
+
+    try:
+        with open(marker_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == json.loads(json.dumps(spec)):
+                return corpus_dir, logo_path
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(corpus_dir, ignore_errors=True)
+    os.makedirs(corpus_dir)
+    for image_format, mode, width, height, count in CORPORA[name]:
+        for index in range(count):
+            image = synthesize_image(image_format, mode, width, height, index)
+            filename = f"{image_format.lower()}_{width}x{height}_{index:02d}{_EXTENSIONS[image_format]}"
+            save_kwargs = {'quality': 92} if image_format in ('JPEG', 'WEBP') else {}
+            image.save(os.path.join(corpus_dir, filename), image_format, **save_kwargs)
+            image.close()
+    # 标记文件最后写入，图片集生成到一半时退出会在下次运行时重新生成
+    atomic_write(marker_path, json.dumps(spec))
+    return corpus_dir, logo_path
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），无法获取时返回None"""
+    # Linux上ru_maxrss在exec后不会重置，会带上父进程fork时的内存，优先读取VmHWM
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(corpus_dir, logo_path, scenario, base_config, output_dir):
+    """在当前进程中处理一个图片集，返回统计结果"""
+    config = dict(base_config)
+    config.update(SCENARIOS[scenario])
+    config.update({
+        'Use_logo': logo_path,
+        'Out_path': output_dir,
+        'Incremental': False,
+        'Performance_report': False,
+    })
+
+    jobs = [(os.path.join(corpus_dir, name), name) for name in sorted(os.listdir(corpus_dir))
+            if name.lower().endswith(IMAGE_EXTENSIONS)]
+    engine = WatermarkEngine(config)
+    try:
+        engine.prepare()
+        success_count = engine.run(jobs)
+    finally:
+        engine.close()
+
+    summary = engine.metrics.summary()
+    output_bytes = sum(entry.stat().st_size for entry in os.scandir(output_dir) if entry.is_file())
+    return {
+        'images': len(jobs),
+        'succeeded': success_count,
+        'seconds': summary['elapsed'],
+        'images_per_second': summary['images_per_second'],
+        'megapixels_per_second': summary['megapixels_per_second'],
+        'peak_rss_mb': peak_rss_mb(),
+        'output_bytes': output_bytes,
+    }
+
+
+def _run_case_isolated(corpus_dir, logo_path, scenario, base_config):
+    """在子进程中运行一个用例，打包后的程序无法启动子解释器，改为在当前进程中运行"""
+    output_dir = tempfile.mkdtemp(prefix='markflow_bench_')
+    try:
+        if getattr(sys, 'frozen', False):
+            return run_case(corpus_dir, logo_path, scenario, base_config, output_dir)
+
+        payload = json.dumps({'corpus_dir': corpus_dir, 'logo_path': logo_path, 'scenario': scenario,
+                              'base_config': base_config, 'output_dir': output_dir})
+        result = subprocess.run([sys.executable, '-m', 'app.common.benchmark', payload],
+                                cwd=get_application_path(), capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"基准测试子进程退出码 {result.returncode}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def environment_info():
+    """记录影响结果的运行环境，比较基线时一并显示"""
+    info = {
+        'python': platform.python_version(),
+        'pillow': Image.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        import numpy
+        info['numpy'] = numpy.__version__
+    except ImportError:
+        info['numpy'] = None
+    return info
+
+
+def run_suite(corpora, scenarios, base_config, repeat=3, on_result=None):
+    """
+    运行基准测试
+    每个用例重复repeat次，取吞吐量最好的一次，减少偶发的系统抖动
+    :param on_result: 回调 (key, result)，每完成一个用例调用一次
+    :return: {'created', 'environment', 'results': {'corpus/scenario': result}}
+    """
+    results = {}
+    for corpus in corpora:
+        corpus_dir, logo_path = ensure_corpus(corpus)
+        for scenario in scenarios:
+            runs = [_run_case_isolated(corpus_dir, logo_path, scenario, base_config) for _ in range(max(1, repeat))]
+            best = max(runs, key=lambda run: run['megapixels_per_second'])
+            peaks = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+            best['peak_rss_mb'] = max(peaks) if peaks else None
+            key = f"{corpus}/{scenario}"
+            results[key] = best
+            if on_result:
+                on_result(key, best)
+    return {'created': time.time(), 'environment': environment_info(), 'results': results}
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    与基线比较
+    :return: [(key, 指标, 基线值, 当前值, 变化比例, 是否回退), ...]
+    """
+    rows = []
+    for key, result in current['results'].items():
+        base = baseline.get('results', {}).get(key)
+        if not base:
+            continue
+        for metric, higher_is_better in (('images_per_second', True), ('megapixels_per_second', True),
+                                         ('peak_rss_mb', False), ('output_bytes', False)):
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # 输出体积随Pillow版本正常变化，只显示不判定为回退
+            regressed = metric != 'output_bytes' and (change < -threshold if higher_is_better else change > threshold)
+            rows.append((key, metric, old, new, change, regressed))
+    return rows
+
+
+def load_baseline(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(report, path):
+    # 写入到一半的基线会让之后的每次比较都失败
+    atomic_write(path, json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    # 子进程入口：参数为JSON编码的用例，结果以JSON输出到stdout
+    case = json.loads(sys.argv[1])
+    print(json.dumps(run_case(case['corpus_dir'], case['logo_path'], case['scenario'],
+                              case['base_config'], case['output_dir'])))
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+打包配置分析
+
+markflow.spec 不再手写隐藏导入，而是在打包时调用 derive_profile() 从代码推导：
+    1. 从main.py开始解析import语句（包括函数内的延迟导入），得到程序实际用到的app模块
+    2. 在子进程中导入这些模块，得到真实的导入结果（包括qfluentwidgets等第三方库的间接导入）
+    3. 没有被导入的PyQt6模块和可选的重量级依赖（scipy、colorthief等）加入excludes
+打包结果再经过 filter_qt_files() 去掉用不到的Qt插件和翻译文件。
+
+bundle_size() 和 cold_start() 统计打包后的体积和冷启动耗时，用法见 python main.py build-profile --help。
+本模块只依赖标准库，不导入Qt（第2步在子进程中进行）。
+"""
+
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_PACKAGE = 'app'
+
+# 可能被PyInstaller顺带收集、但程序运行时不需要的模块，实际被导入时不会排除
+# （qfluentwidgets只在亚克力效果中使用scipy、colorthief，导入失败时自动关闭该效果）
+OPTIONAL_EXCLUDES = ('scipy', 'colorthief', 'matplotlib', 'pandas', 'tkinter', 'IPython',
+                     'PyQt6.uic', 'PyQt6.lupdate', 'qfluentwidgets.multimedia', 'PIL.ImageQt', 'PIL.ImageTk')
+
+# 保留的Qt插件类别，其余类别（多媒体、数据库、定位、网络等）不打包
+QT_PLUGIN_CATEGORIES = ('platforms', 'platformthemes', 'platforminputcontexts', 'styles', 'imageformats',
+                        'iconengines', 'xcbglintegrations', 'wayland-decoration-client',
+                        'wayland-graphics-integration-client', 'wayland-shell-integration')
+
+# 保留的图片格式插件：缩略图读取支持的输入格式、缓存使用的JPEG、窗口图标和矢量图标
+QT_IMAGE_FORMATS = ('qjpeg', 'qgif', 'qico', 'qsvg', 'qtiff', 'qwebp')
+
+# 保留的Qt翻译文件前缀（界面为中文，只需要Qt自带对话框的中文翻译）
+QT_TRANSLATIONS = ('qt_zh', 'qtbase_zh')
+
+
+def _module_file(root, module):
+    """模块对应的源文件，不存在（如打包前生成的resources_rc）时返回None"""
+    path = os.path.join(root, *module.split('.'))
+    return path + '.py' if os.path.isfile(path + '.py') else None
+
+
+def _imports(path):
+    """源文件中所有import语句导入的模块名（包括函数内的导入）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            names.add(node.module)
+            # from app.common import benchmark 导入的是子模块
+            names.update(f"{node.module}.{alias.name}" for alias in node.names)
+    return names
+
+
+def project_imports(root, entry='main.py'):
+    """
+    从入口文件开始解析import语句
+    :return: (用到的app模块, 直接导入的第三方包)
+    """
+    modules = set()
+    third_party = set()
+    pending = [os.path.join(root, entry)]
+    seen = set()
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        for name in _imports(path):
+            if name.split('.')[0] != PROJECT_PACKAGE:
+                third_party.add(name)
+                continue
+            module_path = _module_file(root, name)
+            if module_path is None and not name.endswith('_rc'):
+                # from app.x import 函数名 产生的名称不是模块
+                continue
+            modules.add(name)
+            if module_path:
+                pending.append(module_path)
+    # 第三方依赖只按顶层包名统计，不含标准库
+    stdlib = getattr(sys, 'stdlib_module_names', ())
+    third_party = {name.split('.')[0] for name in third_party} - set(stdlib)
+    return sorted(modules), sorted(third_party)
+
+
+_RUNTIME_SCRIPT = r"""
+import importlib, json, sys
+failures = {}
+for name in sys.argv[1:]:
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        failures[name] = f"{type(e).__name__}: {e}"
+print(json.dumps({'modules': sorted(sys.modules), 'failures': failures}))
+"""
+
+
+def runtime_imports(root, modules, python=None):
+    """
+    在子进程中导入模块，返回实际加载的全部模块
+    :return: (模块名集合, {导入失败的模块: 错误信息})
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    result = subprocess.run([python or sys.executable, '-c', _RUNTIME_SCRIPT, *modules],
+                            cwd=root, env=env, capture_output=True, text=True, timeout=300)
+    # qfluentwidgets导入时会打印提示，JSON在最后一行
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"分析导入时出错: {result.stderr.strip()}")
+    data = json.loads(lines[-1])
+    return set(data['modules']), data['failures']
+
+
+def _installed_qt_modules():
+    """已安装的PyQt6模块（PyQt6.QtCore等）"""
+    try:
+        import importlib.util
+        spec = importlib.util.find_spec('PyQt6')
+    except ImportError:
+        return []
+    if spec is None or not spec.submodule_search_locations:
+        return []
+    names = set()
+    for directory in spec.submodule_search_locations:
+        for filename in os.listdir(directory):
+            name = filename.split('.')[0]
+            if name.startswith('Qt') and filename.endswith(('.pyd', '.so')):
+                names.add(f"PyQt6.{name}")
+    return sorted(names)
+
+
+def derive_profile(root, python=None):
+    """
+    推导打包配置
+    :return: {'hiddenimports', 'excludes', 'qt_modules', 'third_party', 'failures'}
+    """
+    modules, third_party = project_imports(root)
+    loaded, failures = runtime_imports(root, modules, python)
+    qt_modules = sorted(name for name in loaded if name.startswith('PyQt6.Qt'))
+
+    excludes = [name for name in _installed_qt_modules() if name not in loaded]
+    excludes += [name for name in OPTIONAL_EXCLUDES
+                 if not any(module == name or module.startswith(name + '.') for module in loaded)]
+    return {
+        'hiddenimports': modules + qt_modules,
+        'excludes': excludes,
+        'qt_modules': qt_modules,
+        'third_party': third_party,
+        'failures': failures,
+    }
+
+
+def is_excluded_qt_file(dest):
+    """打包目标路径是否为不需要的Qt插件或翻译文件"""
+    parts = dest.replace('\\', '/').split('/')
+    try:
+        index = parts.index('Qt6')
+    except ValueError:
+        return False
+    rest = parts[index + 1:]
+    if len(rest) >= 2 and rest[0] == 'plugins':
+        if rest[1] not in QT_PLUGIN_CATEGORIES:
+            return True
+        if rest[1] == 'imageformats' and len(rest) >= 3:
+            name = rest[2].split('.')[0]
+            name = name[3:] if name.startswith('lib') else name
+            # Windows调试版本以d结尾，如qjpegd.dll
+            return name not in QT_IMAGE_FORMATS and name[:-1] not in QT_IMAGE_FORMATS
+    if len(rest) >= 2 and rest[0] == 'translations':
+        return not rest[1].startswith(QT_TRANSLATIONS)
+    return False
+
+
+def filter_qt_files(toc):
+    """
+    从PyInstaller的TOC（[(目标路径, 源路径, 类型), ...]）中去掉不需要的Qt文件
+    """
+    return [entry for entry in toc if not is_excluded_qt_file(entry[0])]
+
+
+def bundle_size(dist_dir, top=15):
+    """
+    统计打包目录的体积
+    :return: {'bytes', 'files', 'largest': [(相对路径, 字节数), ...]}，largest按前两级目录汇总
+    """
+    total = 0
+    count = 0
+    groups = {}
+    for directory, _, filenames in os.walk(dist_dir):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            total += size
+            count += 1
+            parts = os.path.relpath(path, dist_dir).replace('\\', '/').split('/')
+            # _internal/PyQt6/Qt6/... 按 _internal/PyQt6/Qt6 汇总
+            depth = 3 if parts[0] == '_internal' else 2
+            key = '/'.join(parts[:min(depth, len(parts))])
+            groups[key] = groups.get(key, 0) + size
+    largest = sorted(groups.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {'bytes': total, 'files': count, 'largest': largest}
+
+
+def cold_start(executable, runs=3, timeout=120):
+    """
+    启动打包后的程序并在首次绘制后退出，统计耗时
+    首次绘制时间读取程序写入data/reports的启动报告
+    :return: [{'seconds': 进程总耗时, 'first_paint_ms': 首次绘制时间}, ...]
+    """
+    report_dir = os.path.join(os.path.dirname(os.path.abspath(executable)), 'data', 'reports')
+    env = dict(os.environ, MARKFLOW_PROFILE_STARTUP='1', MARKFLOW_EXIT_AFTER_STARTUP='1')
+    results = []
+    for _ in range(runs):
+        started = time.time()
+        start = time.perf_counter()
+        subprocess.run([executable], env=env, timeout=timeout,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        seconds = time.perf_counter() - start
+
+        first_paint = None
+        try:
+            reports = [os.path.join(report_dir, name) for name in os.listdir(report_dir)
+                       if name.startswith('startup-') and name.endswith('.json')]
+            reports = [path for path in reports if os.path.getmtime(path) >= started - 1]
+            if reports:
+                with open(max(reports, key=os.path.getmtime), 'r', encoding='utf-8') as f:
+                    first_paint = json.load(f).get('first_paint')
+        except (OSError, ValueError):
+            pass
+        results.append({'seconds': round(seconds, 3), 'first_paint_ms': first_paint})
+    return results
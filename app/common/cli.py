@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+"""
+MarkFlow 命令行入口
+
+用法:
+    python main.py batch <输入文件/目录/通配符...> -o <输出目录> [选项]
+    python main.py resume [批次ID] [--list]
+    python main.py profiles <输入图片...> [-p 配置名]
+    python main.py bench [--corpus 名称] [--scenario 名称] [--save-baseline | --baseline 文件]
+    python main.py watch <监视目录...> -o <输出目录> [选项]
+    python main.py serve [--host 地址] [--port 端口] [-j 线程数] [--queue 数量]
+    python -m app.common.cli batch ...
+
+本模块不导入PyQt6和qfluentwidgets，可在无显示环境（服务器、容器、定时任务）中运行。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from app.common.dedupe import DEDUPE_MODES
+from app.common.encoder_profiles import benchmark_profiles, get_profiles
+from app.common.folder_scan import iter_input_files
+from app.common.http_service import (DEFAULT_HOST, DEFAULT_MAX_BODY_MB, DEFAULT_PORT, WatermarkHTTPServer,
+                                     WatermarkService)
+from app.common.image_collection import ImageCollection
+from app.common.instrumentation import format_throughput
+from app.common.journal import BatchJournal, find_unfinished
+from app.common.luminance import ACCURACY_SAMPLES
+from app.common.watch_folder import WatchService
+from app.common.watermark_engine import WatermarkEngine, WatermarkError, get_application_path, load_config
+
+# 命令行位置参数与配置文件中数值的对应关系
+X_POSITIONS = {'center': 0, 'left': 1, 'right': 2}
+Y_POSITIONS = {'center': 0, 'top': 1, 'bottom': 2}
+
+
+def collect_input_files(inputs):
+    """
+    展开输入参数，支持文件、目录（递归）和通配符
+    :return: 去重后保持顺序的 [(image_path, subdir), ...]，subdir为图片相对输入目录的子目录
+    """
+    return list(dict.fromkeys(iter_input_files(inputs)))
+
+
+def assign_display_names(image_paths):
+    """
+    为输入图片分配输出用的显示名称，同名文件按 name(1).ext 规则重命名，与GUI使用同一个ImageCollection
+    目录中的图片显示名称带有子目录，输出时保持相同的目录结构
+    :param image_paths: collect_input_files 的结果
+    :return: [(image_path, display_name), ...]
+    """
+    return ImageCollection(image_paths).items()
+
+
+def apply_overrides(config, args):
+    """用命令行参数覆盖配置文件中的值"""
+    config = dict(config)
+    if args.output:
+        config['Out_path'] = args.output
+    if args.logo:
+        config['Use_logo'] = args.logo
+    if args.width is not None or args.height is not None:
+        logo_size = dict(config.get('Logo_size', {}))
+        if args.width is not None:
+            logo_size['width'] = args.width
+        if args.height is not None:
+            logo_size['height'] = args.height
+        config['Logo_size'] = logo_size
+    if args.x is not None or args.y is not None:
+        logo_xy = dict(config.get('Logo_xy', {}))
+        if args.x is not None:
+            logo_xy['x'] = X_POSITIONS[args.x]
+        if args.y is not None:
+            logo_xy['y'] = Y_POSITIONS[args.y]
+        config['Logo_xy'] = logo_xy
+    if args.bottom is not None:
+        config['Logo_bottom'] = args.bottom
+    if args.auto_invert is not None:
+        config['Auto_invert'] = args.auto_invert
+    if args.invert_accuracy is not None:
+        config['Invert_accuracy'] = args.invert_accuracy
+    if args.jpeg_lossless is not None:
+        config['Jpeg_lossless'] = args.jpeg_lossless
+    if args.profile is not None:
+        config['Encoder_profile'] = args.profile
+    if args.workers is not None:
+        config['Workers'] = args.workers
+    if getattr(args, 'dedupe', None) is not None:
+        config['Dedupe'] = args.dedupe
+    if getattr(args, 'force', False):
+        config['Incremental'] = False
+    if getattr(args, 'polling', False):
+        config['Watch_polling'] = True
+    if getattr(args, 'settle', None) is not None:
+        config['Watch_settle'] = args.settle
+    return config
+
+
+def add_config_arguments(parser):
+    """添加与config.json字段对应的覆盖参数"""
+    parser.add_argument('-c', '--config', help='配置文件路径（默认读取data/config.json）')
+    parser.add_argument('--logo', help='水印文件名（data/watermarks中）或水印文件路径，覆盖Use_logo')
+    parser.add_argument('--width', type=int, help='水印宽度（px），覆盖Logo_size.width')
+    parser.add_argument('--height', type=int, help='水印高度（px），覆盖Logo_size.height')
+    parser.add_argument('--x', choices=list(X_POSITIONS), help='水平对齐方式，覆盖Logo_xy.x')
+    parser.add_argument('--y', choices=list(Y_POSITIONS), help='垂直对齐方式，覆盖Logo_xy.y')
+    parser.add_argument('--bottom', type=float, help='距离底部距离（%%），覆盖Logo_bottom')
+    parser.add_argument('--auto-invert', dest='auto_invert', action='store_true', default=None,
+                        help='启用自动反色')
+    parser.add_argument('--no-auto-invert', dest='auto_invert', action='store_false',
+                        help='关闭自动反色')
+    parser.add_argument('--invert-accuracy', choices=list(ACCURACY_SAMPLES),
+                        help='自动反色的背景采样精度，覆盖Invert_accuracy')
+    parser.add_argument('--jpeg-lossless', dest='jpeg_lossless', action='store_true', default=None,
+                        help='JPEG只重新编码水印覆盖的区域（需要jpegtran）')
+    parser.add_argument('--no-jpeg-lossless', dest='jpeg_lossless', action='store_false',
+                        help='JPEG整图重新编码')
+    parser.add_argument('-p', '--profile', help='输出编码配置名（见Encoder_profiles），覆盖Encoder_profile')
+    parser.add_argument('-j', '--workers', type=int, help='并行线程数（0表示CPU核心数），覆盖Workers')
+
+
+def build_parser():
+    """构建命令行解析器"""
+    parser = argparse.ArgumentParser(prog='markflow', description='MarkFlow 批量水印工具（命令行模式）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = subparsers.add_parser('batch', help='批量为图片添加水印')
+    batch_parser.add_argument('inputs', nargs='+', help='输入图片、目录（递归，输出保持子目录结构）或通配符（如 "photos/*.jpg"）')
+    batch_parser.add_argument('-o', '--output', help='输出目录，覆盖Out_path')
+    add_config_arguments(batch_parser)
+    batch_parser.add_argument('--dedupe', choices=list(DEDUPE_MODES),
+                              help='输入图片去重方式，覆盖Dedupe')
+    batch_parser.add_argument('-f', '--force', action='store_true',
+                              help='重新处理所有图片，忽略增量清单中已是最新的输出')
+    batch_parser.add_argument('-q', '--quiet', action='store_true', help='不输出进度信息')
+    batch_parser.set_defaults(func=run_batch)
+
+    resume_parser = subparsers.add_parser('resume', help='继续被中断的批处理')
+    resume_parser.add_argument('batch_id', nargs='?', help='要继续的批次ID（默认最近一个）')
+    resume_parser.add_argument('-l', '--list', action='store_true', help='列出未完成的批次')
+    resume_parser.add_argument('-d', '--discard', action='store_true', help='放弃该批次，删除其日志')
+    resume_parser.add_argument('-q', '--quiet', action='store_true', help='不输出进度信息')
+    resume_parser.set_defaults(func=run_resume)
+
+    profiles_parser = subparsers.add_parser('profiles', help='比较各编码配置的速度和输出体积')
+    profiles_parser.add_argument('inputs', nargs='+', help='用于测试的图片、目录或通配符')
+    profiles_parser.add_argument('-c', '--config', help='配置文件路径（默认读取data/config.json）')
+    profiles_parser.add_argument('-p', '--profile', action='append', dest='profiles',
+                                 help='只测试指定的编码配置，可重复使用')
+    profiles_parser.add_argument('-f', '--format', choices=['jpeg', 'png', 'webp'],
+                                 help='统一编码为指定格式（默认与输入格式相同）')
+    profiles_parser.set_defaults(func=run_profiles)
+
+    bench_parser = subparsers.add_parser('bench', help='运行吞吐量基准测试并与基线比较')
+    bench_parser.add_argument('--corpus', action='append', dest='corpora',
+                              help='合成图片集：small、24mp、100mp、png_rgba、gif_palette、mixed，可重复使用'
+                                   '（默认除100mp外全部）')
+    bench_parser.add_argument('--scenario', action='append', dest='scenarios',
+                              help='处理场景：center、corner_invert、balanced、fast，可重复使用（默认全部）')
+    bench_parser.add_argument('-c', '--config', help='基础配置文件（默认读取data/config.json）')
+    bench_parser.add_argument('-j', '--workers', type=int, help='并行线程数，覆盖Workers')
+    bench_parser.add_argument('-r', '--repeat', type=int, default=3, help='每个用例重复次数，取最好的一次（默认3）')
+    bench_parser.add_argument('--baseline', help='基线文件（默认data/bench/baseline.json）')
+    bench_parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    bench_parser.add_argument('--threshold', type=float, help='判定为性能回退的变化比例（默认0.10）')
+    bench_parser.set_defaults(func=run_bench)
+
+    watch_parser = subparsers.add_parser('watch', help='监视文件夹，自动为新放入的图片添加水印')
+    watch_parser.add_argument('directories', nargs='*',
+                              help='监视的目录（包括子目录，输出保持子目录结构），默认为Watch_folders')
+    watch_parser.add_argument('-o', '--output', help='输出目录，覆盖Out_path')
+    add_config_arguments(watch_parser)
+    watch_parser.add_argument('--existing', action='store_true', help='启动时处理目录中已有的图片')
+    watch_parser.add_argument('--polling', action='store_true',
+                              help='定时扫描目录而不使用系统的文件变化通知（网络共享目录），覆盖Watch_polling')
+    watch_parser.add_argument('--settle', type=float,
+                              help='文件多久不再变化后视为写入完成（秒），覆盖Watch_settle')
+    watch_parser.add_argument('-q', '--quiet', action='store_true', help='不输出每张图片的处理信息')
+    watch_parser.set_defaults(func=run_watch)
+
+    serve_parser = subparsers.add_parser('serve', help='启动本地HTTP水印服务')
+    serve_parser.add_argument('--host', help=f'监听地址，覆盖Serve_host（默认{DEFAULT_HOST}）')
+    serve_parser.add_argument('--port', type=int, help=f'监听端口，覆盖Serve_port（默认{DEFAULT_PORT}）')
+    add_config_arguments(serve_parser)
+    serve_parser.add_argument('--queue', type=int, help='等待处理的请求数上限，超出时返回429，覆盖Serve_queue_size')
+    serve_parser.add_argument('-v', '--verbose', action='store_true', help='输出每个请求的日志')
+    serve_parser.set_defaults(func=run_serve, output=None)
+
+    build_profile_parser = subparsers.add_parser('build-profile', help='分析打包需要的模块，统计打包后的体积和冷启动耗时')
+    build_profile_parser.add_argument('--dist', help='打包输出目录（如dist/MarkFlow），指定时统计体积和冷启动耗时')
+    build_profile_parser.add_argument('-r', '--runs', type=int, default=3, help='冷启动测量次数（默认3）')
+    build_profile_parser.add_argument('--json', action='store_true', help='以JSON输出')
+    build_profile_parser.set_defaults(func=run_build_profile)
+
+    return parser
+
+
+def run_profiles(args):
+    """执行编码配置对比命令，输出每个配置的吞吐量和体积"""
+    try:
+        profiles = get_profiles(load_config(args.config))
+    except (OSError, ValueError, WatermarkError) as e:
+        print(f"读取配置文件时出错: {e}", file=sys.stderr)
+        return 2
+
+    if args.profiles:
+        missing = [name for name in args.profiles if name not in profiles]
+        if missing:
+            print(f"编码配置不存在: {', '.join(missing)}", file=sys.stderr)
+            return 2
+        profiles = {name: profiles[name] for name in args.profiles}
+
+    image_paths = collect_input_files(args.inputs)
+    if not image_paths:
+        print("没有找到需要处理的图片", file=sys.stderr)
+        return 2
+
+    image_format = args.format.upper() if args.format else None
+    results = benchmark_profiles([image_path for image_path, _ in image_paths], profiles, image_format)
+
+    print(f"{'配置':<16}{'图片/s':>10}{'MP/s':>10}{'输出体积':>14}{'相对原图':>10}")
+    for result in results:
+        seconds = result['seconds'] or 1e-9
+        ratio = result['bytes'] / result['source_bytes'] if result['source_bytes'] else 0
+        print(f"{result['profile']:<16}{result['images'] / seconds:>10.2f}{result['megapixels'] / seconds:>10.1f}"
+              f"{result['bytes'] / 1024 / 1024:>12.2f}MB{ratio:>10.2f}x")
+    return 0
+
+
+def run_build_profile(args):
+    """执行打包分析命令"""
+    # 只在打包时使用，按需导入
+    from app.common import build_profile
+
+    result = {}
+    try:
+        result['profile'] = build_profile.derive_profile(get_application_path())
+    except (OSError, RuntimeError, ValueError, subprocess.SubprocessError) as e:
+        print(f"分析导入时出错: {e}", file=sys.stderr)
+        return 2
+
+    if args.dist:
+        executable = os.path.join(args.dist, 'MarkFlow.exe' if os.name == 'nt' else 'MarkFlow')
+        if not os.path.isfile(executable):
+            print(f"找不到打包后的程序: {executable}", file=sys.stderr)
+            return 2
+        result['size'] = build_profile.bundle_size(args.dist)
+        try:
+            result['cold_start'] = build_profile.cold_start(executable, max(1, args.runs))
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"启动打包后的程序时出错: {e}", file=sys.stderr)
+            return 1
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    profile = result['profile']
+    print(f"程序模块: {len(profile['hiddenimports']) - len(profile['qt_modules'])} 个")
+    print(f"Qt模块: {', '.join(name.split('.')[-1] for name in profile['qt_modules'])}")
+    print(f"第三方依赖: {', '.join(profile['third_party'])}")
+    print(f"排除: {', '.join(profile['excludes'])}")
+    for name, error in profile['failures'].items():
+        print(f"导入失败: {name}: {error}", file=sys.stderr)
+
+    if 'size' in result:
+        size = result['size']
+        print(f"\n体积: {size['bytes'] / 1024 / 1024:.1f} MB，{size['files']} 个文件")
+        for path, size_bytes in size['largest']:
+            print(f"  {size_bytes / 1024 / 1024:>8.1f} MB  {path}")
+        runs = result['cold_start']
+        print("冷启动: " + "，".join(
+            f"{run['seconds']:.2f}s" + (f"（首次绘制 {run['first_paint_ms']:.0f} ms）" if run['first_paint_ms'] else '')
+            for run in runs))
+    return 0
+
+
+def run_bench(args):
+    """执行基准测试命令，有性能回退时返回1"""
+    # 基准测试只在开发时使用，按需导入
+    from app.common import benchmark
+
+    corpora = args.corpora or list(benchmark.DEFAULT_CORPORA)
+    scenarios = args.scenarios or list(benchmark.SCENARIOS)
+    unknown = [name for name in corpora if name not in benchmark.CORPORA]
+    unknown += [name for name in scenarios if name not in benchmark.SCENARIOS]
+    if unknown:
+        print(f"未知的图片集或场景: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    try:
+        base_config = load_config(args.config)
+    except (OSError, ValueError, WatermarkError) as e:
+        print(f"读取配置文件时出错: {e}", file=sys.stderr)
+        return 2
+    if args.workers is not None:
+        base_config['Workers'] = args.workers
+
+    baseline_path = args.baseline or os.path.join(benchmark.get_bench_dir(), 'baseline.json')
+    threshold = args.threshold if args.threshold is not None else benchmark.DEFAULT_THRESHOLD
+
+    print(f"{'用例':<28}{'图片/s':>10}{'MP/s':>10}{'峰值内存':>12}{'输出体积':>14}")
+
+    def on_result(key, result):
+        rss = f"{result['peak_rss_mb']:.0f}MB" if result['peak_rss_mb'] is not None else 'n/a'
+        print(f"{key:<28}{result['images_per_second']:>10.2f}{result['megapixels_per_second']:>10.1f}"
+              f"{rss:>12}{result['output_bytes'] / 1024 / 1024:>12.2f}MB", flush=True)
+
+    report = benchmark.run_suite(corpora, scenarios, base_config, args.repeat, on_result)
+
+    if args.save_baseline:
+        benchmark.save_baseline(report, baseline_path)
+        print(f"已保存基线: {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print("没有基线文件，使用 --save-baseline 保存本次结果作为基线", file=sys.stderr)
+        return 0
+
+    baseline = benchmark.load_baseline(baseline_path)
+    if baseline.get('environment') != report['environment']:
+        print(f"注意：运行环境与基线不同，基线: {baseline.get('environment')}", file=sys.stderr)
+
+    rows = benchmark.compare(report, baseline, threshold)
+    regressions = [row for row in rows if row[5]]
+    print(f"\n与基线比较（阈值 {threshold:.0%}）:")
+    if not rows:
+        print("基线中没有相同的用例")
+    for key, metric, old, new, change, regressed in rows:
+        flag = '  <-- 回退' if regressed else ''
+        print(f"{key:<28}{metric:<24}{old:>12.2f}{new:>12.2f}{change:>+9.1%}{flag}")
+    if regressions:
+        print(f"发现 {len(regressions)} 项性能回退", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_batch(args):
+    """执行批处理命令"""
+    try:
+        config = apply_overrides(load_config(args.config), args)
+    except (OSError, ValueError, WatermarkError) as e:
+        print(f"读取配置文件时出错: {e}", file=sys.stderr)
+        return 2
+
+    image_paths = collect_input_files(args.inputs)
+    if not image_paths:
+        print("没有找到需要处理的图片", file=sys.stderr)
+        return 2
+
+    unfinished = find_unfinished()
+    if unfinished and not args.quiet:
+        print(f"有 {len(unfinished)} 个未完成的批处理，可使用 resume 命令继续（resume --list 查看）", file=sys.stderr)
+
+    return process_batch(config, assign_display_names(image_paths), args.quiet)
+
+
+def run_resume(args):
+    """执行恢复命令：列出、放弃或继续未完成的批处理"""
+    journals = find_unfinished()
+    if args.list:
+        if not journals:
+            print("没有未完成的批处理")
+        for journal in journals:
+            created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(journal.created))
+            print(f"{journal.batch_id}  {created}  已完成 {len(journal.completed)}/{len(journal.jobs)}  "
+                  f"输出目录: {journal.config.get('Out_path', '')}")
+        return 0
+
+    if args.batch_id:
+        journals = [journal for journal in journals if journal.batch_id == args.batch_id]
+    if not journals:
+        print("没有找到可以继续的批处理", file=sys.stderr)
+        return 2
+
+    journal = journals[0]
+    if args.discard:
+        journal.discard()
+        print(f"已放弃批处理 {journal.batch_id}")
+        return 0
+
+    pending = journal.pending()
+    if not args.quiet:
+        print(f"继续批处理 {journal.batch_id}：剩余 {len(pending)}/{len(journal.jobs)} 张图片", file=sys.stderr)
+    return process_batch(journal.config, pending, args.quiet, journal.resume())
+
+
+def run_watch(args):
+    """执行监视命令，直到按下Ctrl+C"""
+    try:
+        config = apply_overrides(load_config(args.config), args)
+    except (OSError, ValueError, WatermarkError) as e:
+        print(f"读取配置文件时出错: {e}", file=sys.stderr)
+        return 2
+
+    directories = args.directories or config.get('Watch_folders') or []
+    if not directories:
+        print("没有指定监视的目录", file=sys.stderr)
+        return 2
+
+    def on_processed(name, latency, skipped):
+        if not args.quiet:
+            state = '未变化，已跳过' if skipped else f"{latency * 1000:.0f} ms"
+            print(f"{name}（{state}）", file=sys.stderr)
+
+    def on_error(message):
+        print(message, file=sys.stderr)
+
+    service = WatchService(config, directories, on_processed, on_error, include_existing=args.existing)
+    try:
+        service.prepare()
+    except (OSError, WatermarkError) as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    mode = '定时扫描' if service.watcher.polling else '文件变化通知'
+    print(f"正在监视（{mode}）: {', '.join(service.directories)}，输出目录: {service.engine.out_path}，"
+          f"按Ctrl+C停止", file=sys.stderr)
+    stop_event = threading.Event()
+    try:
+        service.run(stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
+    print(f"已停止监视: 处理 {service.processed_count} 张图片，失败 {service.error_count} 张")
+    return 1 if service.error_count else 0
+
+
+def run_serve(args):
+    """执行服务命令，直到按下Ctrl+C"""
+    try:
+        config = apply_overrides(load_config(args.config), args)
+    except (OSError, ValueError, WatermarkError) as e:
+        print(f"读取配置文件时出错: {e}", file=sys.stderr)
+        return 2
+
+    host = args.host or config.get('Serve_host') or DEFAULT_HOST
+    port = args.port if args.port is not None else config.get('Serve_port', DEFAULT_PORT)
+    # 线程数使用Serve_workers，-j同时覆盖Workers和Serve_workers
+    service = WatermarkService(config, args.workers, args.queue)
+    try:
+        service.prepare()
+        server = WatermarkHTTPServer((host, int(port)), service,
+                                     config.get('Serve_max_body_mb', DEFAULT_MAX_BODY_MB), args.verbose)
+    except (OSError, ValueError, WatermarkError) as e:
+        print(f"启动服务时出错: {e}", file=sys.stderr)
+        service.close()
+        return 2
+
+    print(f"MarkFlow服务已启动: http://{host}:{server.server_address[1]}（{service.workers} 个工作线程，"
+          f"队列 {service.queue_size}），按Ctrl+C停止", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    print(json.dumps(service.metrics.snapshot(), ensure_ascii=False))
+    return 0
+
+
+def process_batch(config, jobs, quiet=False, journal=None):
+    """
+    处理一个批次并输出结果，批次日志记录每张图片的完成情况
+    :param journal: 继续已有批次时传入，为空时新建
+    """
+    errors = []
+
+    def on_progress(current, total):
+        if not quiet:
+            print(f"\r[{current}/{total}]", end='', file=sys.stderr, flush=True)
+
+    def on_error(message):
+        errors.append(message)
+
+    engine = WatermarkEngine(config)
+    try:
+        engine.prepare()
+        if journal is None:
+            journal = BatchJournal.create(config, jobs)
+        success_count = engine.run(jobs, on_progress=on_progress, on_error=on_error, journal=journal)
+    except (OSError, WatermarkError) as e:
+        # 水印无法读取、data目录只读等
+        print(str(e), file=sys.stderr)
+        return 2
+    finally:
+        engine.close()
+        if journal is not None:
+            # 中断（如Ctrl+C）时保留日志以便恢复
+            journal.close()
+
+    # 批次已全部处理（失败的图片已报告），删除日志
+    journal.finish()
+
+    if not quiet:
+        print(file=sys.stderr)
+    for message in errors:
+        print(message, file=sys.stderr)
+    print(f"完成: {success_count}/{len(jobs)} 张图片，{format_throughput(engine.metrics.summary())}，"
+          f"输出目录: {engine.out_path}")
+    if engine.report_path and not quiet:
+        print(f"性能报告: {engine.report_path}")
+    return 1 if errors else 0
+
+
+def main(argv=None):
+    """命令行入口，返回进程退出码"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
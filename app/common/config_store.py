@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+配置服务
+
+data/config.json 只在内存中保存一份，各界面通过 get_config_store() 读写，不再各自整份读取、整份覆盖：
+    - 读取时只做一次stat()，文件修改时间（或大小）变化后才重新解析，外部编辑会被自动读入
+    - 修改先写入内存并通知监听者，短时间内的多次修改合并为一次写入（防抖）
+    - 写入先写临时文件再原子替换，两处同时保存或程序中途退出都不会损坏配置文件
+    - 写入前如果文件已被外部修改，先读入外部修改，再覆盖本进程改动过的字段，互不丢失
+
+本模块不依赖Qt，GUI中的变更信号见 app/components/configSignals.py。
+"""
+
+import atexit
+import copy
+import json
+import os
+import threading
+
+from app.common.atomic_file import atomic_write
+from app.common.watermark_engine import get_application_path, get_config_path
+
+# 最后一次修改后等待多久写入文件（秒）
+SAVE_DELAY = 0.5
+
+
+def get_default_config_path():
+    """获取默认配置config/default_config.json的路径（打包后位于_internal中）"""
+    for path in (os.path.join(get_application_path(), 'config', 'default_config.json'),
+                 os.path.join(get_application_path(), '_internal', 'config', 'default_config.json')):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class ConfigStore:
+    """
+    内存中的配置，可在多个线程中同时使用
+    监听者以 (键, 新值) 调用，在触发变化的线程中执行（set() 的调用线程或读取到外部修改的线程）
+    """
+
+    def __init__(self, path=None, default_path=None, save_delay=SAVE_DELAY):
+        """
+        :param path: 配置文件路径，为None时每次使用get_config_path()（data目录可能在启动过程中才创建）
+        :param default_path: 配置文件不存在时使用的默认配置
+        """
+        self._path = path
+        self.default_path = default_path
+        self.save_delay = save_delay
+        self._data = {}
+        self._pending = {}  # 尚未写入文件的修改
+        self._stamp = None  # 最近一次读取或写入时文件的 (修改时间, 大小)
+        self._loaded = False
+        self._timer = None
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    @property
+    def path(self):
+        return self._path or get_config_path()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_file(self):
+        """读取配置文件，不存在时读取默认配置，损坏时返回None"""
+        for path in (self.path, self.default_path):
+            if not path or not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取配置文件时出错: {e}")
+                return None
+            return data if isinstance(data, dict) else None
+        return {}
+
+    def reload(self, force=False):
+        """
+        文件修改时间或大小变化时重新读取
+        :return: 是否重新读取了文件
+        """
+        changes = []
+        with self._lock:
+            stamp = self._file_stamp()
+            if self._loaded and not force and stamp == self._stamp:
+                return False
+            data = self._read_file()
+            self._stamp = stamp
+            if data is None:
+                # 文件损坏（如被外部程序写了一半）时保留内存中的配置
+                self._loaded = True
+                return False
+            # 本进程尚未写入的修改优先
+            data.update(copy.deepcopy(self._pending))
+            if self._loaded:
+                changes = [(key, data.get(key)) for key in self._data.keys() | data.keys()
+                           if self._data.get(key) != data.get(key)]
+            self._data = data
+            self._loaded = True
+        self._notify(changes)
+        return True
+
+    def get(self, key, default=None):
+        """读取配置项，返回值的副本，修改返回值不会影响配置"""
+        self.reload()
+        with self._lock:
+            return copy.deepcopy(self._data.get(key, default))
+
+    def get_str(self, key, default=''):
+        value = self.get(key)
+        return value if isinstance(value, str) else default
+
+    def get_bool(self, key, default=False):
+        value = self.get(key)
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        if isinstance(value, (int, float)):
+            return bool(value)
+        return default
+
+    def get_int(self, key, default=0):
+        value = self.get(key)
+        if isinstance(value, bool):
+            return default
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key, default=0.0):
+        value = self.get(key)
+        if isinstance(value, bool):
+            return default
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return default
+
+    def get_dict(self, key, default=None):
+        value = self.get(key)
+        if isinstance(value, dict):
+            return value
+        return {} if default is None else default
+
+    def snapshot(self):
+        """完整配置的副本，交给批处理引擎等需要一份固定配置的地方"""
+        self.reload()
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+    def set(self, key, value):
+        """修改单个配置项"""
+        self.update({key: value})
+
+    def update(self, values):
+        """
+        修改多个配置项，值变化时通知监听者并安排写入文件
+        :param values: {键: 值}
+        """
+        self.reload()
+        changes = []
+        with self._lock:
+            for key, value in values.items():
+                value = copy.deepcopy(value)
+                if key in self._data and self._data[key] == value:
+                    continue
+                self._data[key] = value
+                self._pending[key] = value
+                changes.append((key, copy.deepcopy(value)))
+            if changes:
+                self._schedule_save()
+        self._notify(changes)
+
+    def _schedule_save(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self.save_delay <= 0:
+            self._timer = None
+            self.save()
+            return
+        self._timer = threading.Timer(self.save_delay, self.save)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def save(self):
+        """
+        立即写入文件：先写临时文件，再原子替换
+        :return: 是否写入成功
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            # 读入写入前的外部修改，本进程的修改在reload中覆盖在其上
+            self.reload()
+            payload = json.dumps(self._data, ensure_ascii=False, indent=4)
+            try:
+                atomic_write(self.path, payload)
+            except OSError as e:
+                print(f"保存配置文件时出错: {e}")
+                return False
+            self._pending.clear()
+            self._stamp = self._file_stamp()
+            return True
+
+    def flush(self):
+        """有尚未写入的修改时立即写入（程序退出前调用）"""
+        with self._lock:
+            if self._pending:
+                return self.save()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            return True
+
+    def ensure_file(self):
+        """配置文件不存在时按默认配置创建"""
+        with self._lock:
+            if os.path.exists(self.path):
+                return
+            self.reload(force=True)
+            self.save()
+
+    def add_listener(self, callback):
+        """注册变更回调 callback(键, 新值)"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self, changes):
+        if not changes:
+            return
+        with self._lock:
+            listeners = list(self._listeners)
+        for key, value in changes:
+            for callback in listeners:
+                try:
+                    callback(key, value)
+                except Exception as e:
+                    print(f"处理配置变更 {key} 时出错: {e}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_config_store():
+    """获取data/config.json的配置服务（进程内唯一），程序退出时自动写入未保存的修改"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConfigStore(default_path=get_default_config_path())
+            atexit.register(_store.flush)
+        return _store
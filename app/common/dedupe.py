@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+输入图片去重
+
+同一张照片被导出到多个文件夹、或被不同的人重复提交时，只处理一次，其余输出直接硬链接或跳过。
+
+完全相同的文件分三步查找，每一步只处理上一步中仍有重复可能的文件：
+    1. 按文件大小分组，大小唯一的文件不需要读取
+    2. 读取开头、中间、结尾各一块计算抽样哈希，排除大小相同但内容不同的文件
+    3. 流式计算完整哈希，确认内容完全一致
+近似重复（Dedupe为perceptual时）使用差值哈希（dHash）：解码为9x8灰度图，比较相邻像素得到64位指纹，
+汉明距离不超过阈值即视为同一张图片（如重新压缩、缩放过的副本）。
+指纹按阈值+1段分桶，至少一段完全相同的指纹才逐一比较，不需要两两比较全部图片。
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+DEDUPE_MODES = ('off', 'exact', 'perceptual')
+
+# 抽样哈希每块的大小
+SAMPLE_BLOCK_SIZE = 64 * 1024
+# 完整哈希每次读取的大小
+HASH_CHUNK_SIZE = 1024 * 1024
+# 近似重复的默认汉明距离阈值（64位中）
+DEFAULT_PERCEPTUAL_THRESHOLD = 4
+
+
+def sampled_digest(path, size):
+    """读取开头、中间、结尾三块计算哈希，用于快速排除内容不同的文件"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for offset in sorted({0, max(0, size // 2 - SAMPLE_BLOCK_SIZE // 2), max(0, size - SAMPLE_BLOCK_SIZE)}):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def full_digest(path):
+    """流式计算整个文件的哈希"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def perceptual_hash(path):
+    """
+    计算64位差值哈希
+    JPEG使用draft模式按DCT缩放解码，不需要解码出全分辨率图像
+    """
+    with Image.open(path) as image:
+        image.draft('L', (64, 64))
+        small = image.convert('L').resize((9, 8), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def _map(function, args, workers):
+    """并行计算，出错的项结果为None（交给后续的处理流程报告错误）"""
+    def call(arg):
+        try:
+            return function(*arg)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+
+    if workers <= 1 or len(args) <= 1:
+        return [call(arg) for arg in args]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(call, args))
+
+
+def _refine(groups, function, arguments, workers):
+    """
+    对每组中的文件计算function，按结果拆分，只保留仍有多个文件的组
+    :param arguments: 下标 -> function的参数元组
+    """
+    members = [index for group in groups for index in group]
+    results = dict(zip(members, _map(function, [arguments(index) for index in members], workers)))
+    refined = []
+    for group in groups:
+        buckets = {}
+        for index in group:
+            if results[index] is not None:
+                buckets.setdefault(results[index], []).append(index)
+        refined.extend(bucket for bucket in buckets.values() if len(bucket) > 1)
+    return refined
+
+
+def exact_groups(paths, workers=1):
+    """
+    查找内容完全相同的文件
+    :return: [[下标, ...], ...]，每组至少两个文件，组内按原顺序排列
+    """
+    by_size = {}
+    sizes = {}
+    for index, path in enumerate(paths):
+        try:
+            sizes[index] = os.path.getsize(path)
+        except OSError:
+            continue
+        by_size.setdefault(sizes[index], []).append(index)
+    groups = [group for group in by_size.values() if len(group) > 1]
+    if groups:
+        groups = _refine(groups, sampled_digest, lambda index: (paths[index], sizes[index]), workers)
+    if groups:
+        groups = _refine(groups, full_digest, lambda index: (paths[index],), workers)
+    return groups
+
+
+def perceptual_groups(paths, threshold=DEFAULT_PERCEPTUAL_THRESHOLD, workers=1):
+    """
+    查找近似重复的图片，只在扩展名相同的图片之间比较（输出格式一致才能共用输出文件）
+    :return: [[下标, ...], ...]，每组至少两个文件，组内按原顺序排列
+    """
+    hashes = _map(perceptual_hash, [(path,) for path in paths], workers)
+    # 纯色或单向渐变的图片指纹全为0或全为1，不包含可比较的结构，不参与近似匹配
+    hashes = [None if value in (0, (1 << 64) - 1) else value for value in hashes]
+
+    # 指纹分成threshold+1段，汉明距离不超过threshold的两个指纹至少有一段完全相同
+    band_count = threshold + 1
+    bounds = [64 * band // band_count for band in range(band_count + 1)]
+    buckets = {}
+    for index, value in enumerate(hashes):
+        if value is None:
+            continue
+        ext = os.path.splitext(paths[index])[1].lower()
+        for band in range(band_count):
+            key = (ext, band, (value >> bounds[band]) & ((1 << (bounds[band + 1] - bounds[band])) - 1))
+            buckets.setdefault(key, []).append(index)
+
+    # 并查集合并候选对，近似关系按传递合并
+    parent = list(range(len(paths)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for candidates in buckets.values():
+        for i, first in enumerate(candidates):
+            for second in candidates[i + 1:]:
+                if bin(hashes[first] ^ hashes[second]).count('1') <= threshold:
+                    root_first, root_second = find(first), find(second)
+                    if root_first != root_second:
+                        parent[max(root_first, root_second)] = min(root_first, root_second)
+
+    groups = {}
+    for index, value in enumerate(hashes):
+        if value is not None:
+            groups.setdefault(find(index), []).append(index)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def find_duplicates(jobs, mode='exact', threshold=DEFAULT_PERCEPTUAL_THRESHOLD, workers=1):
+    """
+    在批处理任务中查找重复的图片，每组保留最先出现的一张
+    :param jobs: [(image_path, display_name), ...]
+    :param mode: 'exact' 只合并内容完全相同的文件，'perceptual' 同时合并近似重复的图片
+    :return: (需要处理的任务, {保留图片的显示名称: [重复的 (image_path, display_name), ...]})
+    """
+    if mode not in ('exact', 'perceptual') or len(jobs) < 2:
+        return list(jobs), {}
+
+    paths = [image_path for image_path, _ in jobs]
+    groups = exact_groups(paths, workers)
+    if mode == 'perceptual':
+        # 完全相同的文件已经分组，只需为每组的第一张和其余图片计算感知哈希
+        duplicate_indexes = {index for group in groups for index in group[1:]}
+        remaining = [index for index in range(len(jobs)) if index not in duplicate_indexes]
+        merged = {group[0]: group for group in groups}
+        for group in perceptual_groups([paths[index] for index in remaining], threshold, workers):
+            members = []
+            for position in group:
+                members.extend(merged.pop(remaining[position], [remaining[position]]))
+            members.sort()
+            merged[members[0]] = members
+        groups = list(merged.values())
+
+    duplicates = {}
+    skipped = set()
+    for group in groups:
+        primary = jobs[group[0]][1]
+        duplicates[primary] = [tuple(jobs[index]) for index in group[1:]]
+        skipped.update(group[1:])
+    unique_jobs = [tuple(job) for index, job in enumerate(jobs) if index not in skipped]
+    return unique_jobs, duplicates
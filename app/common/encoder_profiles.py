@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+输出编码配置
+
+config.json中的 Encoder_profiles 定义若干命名配置，Encoder_profile 选择当前批次使用哪一个。
+每个配置按输出格式（jpeg / png / webp）分别给出编码参数：
+
+    jpeg: quality（1-100 或 "match" 按原图量化表估算）、subsampling（"4:4:4"/"4:2:2"/"4:2:0"/"keep"）、
+          progressive、optimize
+    png:  optimize、compress_level（0-9）
+    webp: quality、lossless、method（0-6）
+
+未列出的参数使用Pillow默认值。
+"""
+
+import io
+import os
+import time
+
+from PIL import Image, JpegImagePlugin
+
+DEFAULT_PROFILE = 'max_quality'
+
+# 内置编码配置，config.json中的同名配置会覆盖这里的定义
+BUILTIN_PROFILES = {
+    # 与早期版本一致：JPEG最高质量，PNG不做优化
+    'max_quality': {
+        'jpeg': {'quality': 100},
+        'png': {'optimize': False},
+        'webp': {},
+    },
+    # 与原图质量接近，体积通常与原图相当
+    'match_source': {
+        'jpeg': {'quality': 'match', 'subsampling': 'keep', 'optimize': True},
+        'png': {'compress_level': 6},
+        'webp': {'quality': 'match', 'method': 4},
+    },
+    # 体积与画质的折中，适合上传
+    'balanced': {
+        'jpeg': {'quality': 90, 'subsampling': '4:2:0', 'progressive': True, 'optimize': True},
+        'png': {'compress_level': 6},
+        'webp': {'quality': 90, 'method': 4},
+    },
+    # 编码最快
+    'fast': {
+        'jpeg': {'quality': 90, 'subsampling': '4:2:0'},
+        'png': {'compress_level': 1},
+        'webp': {'quality': 85, 'method': 0},
+    },
+}
+
+# 内置配置在界面上显示的名称
+PROFILE_LABELS = {
+    'max_quality': '最高质量',
+    'match_source': '匹配原图',
+    'balanced': '均衡',
+    'fast': '最快',
+}
+
+# 输出格式 -> 配置中的分组名
+_FORMAT_GROUPS = {'JPEG': 'jpeg', 'PNG': 'png', 'WEBP': 'webp'}
+
+# JPEG标准亮度量化表（IJG，质量50，与Pillow的quantization一致按行排列）
+_STD_LUMINANCE_QTABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+)
+
+# 无法估算原图质量时使用的默认值
+FALLBACK_QUALITY = 95
+
+
+def get_profiles(config):
+    """合并内置配置与config.json中的自定义配置"""
+    profiles = {name: dict(profile) for name, profile in BUILTIN_PROFILES.items()}
+    profiles.update(config.get('Encoder_profiles') or {})
+    return profiles
+
+
+def get_profile(config, name=None):
+    """
+    获取编码配置
+    :param name: 配置名，为空时使用config中的Encoder_profile
+    :return: 配置字典，不存在时返回None
+    """
+    name = name or config.get('Encoder_profile') or DEFAULT_PROFILE
+    return get_profiles(config).get(name)
+
+
+def estimate_jpeg_quality(quantization):
+    """
+    根据亮度量化表估算JPEG的IJG质量值
+    :param quantization: Pillow JpegImageFile.quantization
+    :return: 1-100，无法估算时返回None
+    """
+    if not quantization or 0 not in quantization:
+        return None
+    table = list(quantization[0])
+    if len(table) != 64:
+        return None
+    if all(q == 1 for q in table):
+        return 100
+
+    # IJG缩放公式：q = (std * scale + 50) / 100，反推出平均缩放比例
+    scale = sum(q * 100.0 / std for q, std in zip(table, _STD_LUMINANCE_QTABLE)) / 64
+    if scale <= 0:
+        return 100
+    quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+    return max(1, min(100, int(round(quality))))
+
+
+def build_save_kwargs(profile, image_format, image):
+    """
+    根据编码配置生成 Image.save 的参数
+    :param image_format: Pillow格式名，如 'JPEG'
+    :param image: 待保存的图像，用于 "match"/"keep" 等依赖原图的选项
+    """
+    group = _FORMAT_GROUPS.get(image_format)
+    options = dict((profile or {}).get(group) or {}) if group else {}
+    # 很多手机和相机拍摄的JPEG被Pillow识别为MPO（JpegImageFile的子类），同样带有量化表
+    is_jpeg_source = isinstance(image, JpegImagePlugin.JpegImageFile) and hasattr(image, 'quantization')
+
+    if options.get('quality') == 'match':
+        quality = estimate_jpeg_quality(image.quantization) if is_jpeg_source else None
+        options['quality'] = quality or FALLBACK_QUALITY
+
+    # "keep" 只能用于从JPEG文件打开的图像；Pillow只对格式为JPEG的图像接受 "keep"，这里换成原图的采样方式
+    if options.get('subsampling') == 'keep':
+        sampling = JpegImagePlugin.get_sampling(image) if is_jpeg_source and image_format == 'JPEG' else -1
+        if sampling >= 0:
+            options['subsampling'] = sampling
+        else:
+            options.pop('subsampling')
+
+    return options
+
+
+def benchmark_profiles(image_paths, profiles, image_format=None):
+    """
+    在内存中用每个编码配置编码输入图片，统计速度和体积
+    :param image_paths: 输入图片路径列表
+    :param profiles: {配置名: 配置}
+    :param image_format: 强制使用的输出格式，为空时与输入格式相同
+    :return: [{'profile', 'images', 'seconds', 'bytes', 'source_bytes', 'megapixels'}, ...]
+    """
+    images = []
+    results = []
+    try:
+        for image_path in image_paths:
+            # 保留JpegImageFile对象，以便 "match"/"keep" 读取原图量化表
+            image = Image.open(image_path)
+            image.load()
+            images.append((image, os.path.getsize(image_path), image_format or image.format))
+
+        for name, profile in profiles.items():
+            total_bytes = 0
+            megapixels = 0.0
+            start_time = time.perf_counter()
+            for image, _, target_format in images:
+                buffer = io.BytesIO()
+                image.save(buffer, target_format, **build_save_kwargs(profile, target_format, image))
+                total_bytes += buffer.tell()
+                megapixels += image.width * image.height / 1_000_000
+            results.append({
+                'profile': name,
+                'images': len(images),
+                'seconds': time.perf_counter() - start_time,
+                'bytes': total_bytes,
+                'source_bytes': sum(size for _, size, _ in images),
+                'megapixels': megapixels,
+            })
+    finally:
+        for image, _, _ in images:
+            image.close()
+    return results
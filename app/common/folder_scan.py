@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+文件夹扫描
+
+递归枚举目录中的图片，供拖入文件夹和命令行输入目录使用：
+    - 使用 os.scandir 逐个目录遍历，边遍历边产出，不需要等整棵目录树遍历完
+    - 先按扩展名过滤，再读取文件头确认确实是图片，跳过改了扩展名的其他文件
+    - 每张图片附带相对于输入目录的子目录，输出时按相同的子目录结构保存
+不跟随指向目录的符号链接，避免链接成环时无限遍历。
+"""
+
+import glob
+import os
+
+from app.common.watermark_engine import IMAGE_EXTENSIONS
+
+# 文件头标识，与 IMAGE_EXTENSIONS 中的格式对应
+_SIGNATURES = (
+    b'\xff\xd8\xff',  # JPEG
+    b'\x89PNG\r\n\x1a\n',  # PNG
+    b'BM',  # BMP
+    b'GIF87a',
+    b'GIF89a',
+    b'II*\x00',  # TIFF（小端）
+    b'MM\x00*',  # TIFF（大端）
+)
+
+
+def sniff_image(path):
+    """读取文件头判断是否为支持的图片格式，无法读取时返回False"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(12)
+    except OSError:
+        return False
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return True
+    return header.startswith(_SIGNATURES)
+
+
+def scan_directory(root, stop_event=None, sniff=True):
+    """
+    递归枚举目录中的图片
+    同一目录中按文件名排序，先产出文件再进入子目录
+    :param stop_event: threading.Event，被设置后尽快停止遍历
+    :param sniff: 是否读取文件头确认格式
+    :return: 生成器，产出 (image_path, subdir)，subdir为相对root的子目录（用/分隔，根目录为''）
+    """
+    root = os.path.abspath(root)
+    stack = [(root, '')]
+    while stack:
+        directory, subdir = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"读取目录 {directory} 时出错: {e}")
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            if stop_event is not None and stop_event.is_set():
+                return
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if sniff and not sniff_image(entry.path):
+                continue
+            yield entry.path, subdir
+
+        # 逆序入栈，使子目录按名称顺序出栈
+        for entry in reversed(subdirectories):
+            stack.append((entry.path, f"{subdir}/{entry.name}" if subdir else entry.name))
+
+
+def iter_input_files(inputs, stop_event=None):
+    """
+    展开输入的文件、目录和通配符
+    目录递归枚举并保留子目录结构；单独指定的文件和通配符匹配的文件只按扩展名过滤，子目录为''
+    :return: 生成器，产出 (image_path, subdir)，路径为绝对路径
+    """
+    for item in inputs:
+        if stop_event is not None and stop_event.is_set():
+            return
+        if os.path.isdir(item):
+            yield from scan_directory(item, stop_event)
+        elif os.path.isfile(item):
+            if item.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.abspath(item), ''
+        else:
+            for file_path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(file_path) and file_path.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.abspath(file_path), ''
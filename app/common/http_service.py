@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+"""
+本地HTTP水印服务
+
+供网站后台等程序直接调用（python main.py serve），不需要界面：
+    POST /watermark   请求体为图片文件，返回添加水印后的图片（格式与输入相同）
+                      水印配置可以用查询参数覆盖，如 ?Use_logo=logo.png&Logo_size.width=200&Auto_invert=true，
+                      或 ?config={"Logo_xy": {"x": 2, "y": 2}}；
+                      也可以发送JSON请求体 {"image": "<base64>", "config": {...}}
+    GET  /health      服务状态
+    GET  /metrics     请求数、耗时分位数、队列长度等统计（JSON）
+
+图片在固定数量的工作线程中处理，排队的请求超过 Serve_queue_size 时直接返回429。
+相同配置的请求共用一个已准备好的WatermarkEngine（水印只缩放、分析一次），连接使用HTTP/1.1保持连接。
+本模块只依赖标准库和Pillow，不导入Qt。
+"""
+
+import base64
+import binascii
+import collections
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from PIL import Image
+
+from app.common.watermark_engine import WatermarkEngine, WatermarkError, get_watermark_dir, resolve_logo_path
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 等待处理的请求数上限（不含正在处理的），超出时返回429
+DEFAULT_QUEUE_SIZE = 16
+# 请求体大小上限（MB）
+DEFAULT_MAX_BODY_MB = 100
+# 保持连接时等待下一个请求的时间（秒）
+KEEPALIVE_TIMEOUT = 30
+# 缓存的已准备引擎数量（每种配置组合一个）
+MAX_ENGINES = 16
+# 计算耗时分位数时保留的最近请求数
+LATENCY_WINDOW = 1000
+
+# 请求中水印宽度和高度的上限（px），避免一个请求占用工作线程缩放超大的水印
+MAX_LOGO_SIZE = 4096
+
+# 允许在请求中覆盖的配置项，输出目录、增量清单等与单次请求无关的配置不能覆盖
+OVERRIDE_KEYS = ('Use_logo', 'Logo_size', 'Logo_bottom', 'Logo_xy', 'Auto_invert', 'Invert_accuracy',
+                 'Encoder_profile')
+
+
+class RequestError(Exception):
+    """请求无效，status为返回的HTTP状态码"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _parse_value(value):
+    """查询参数的值按JSON解析（数字、true/false、对象），无法解析时作为字符串"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_overrides(query):
+    """
+    从查询参数中解析配置覆盖
+    Logo_size.width=200 覆盖嵌套字段，config={...} 一次覆盖多个字段
+    """
+    overrides = {}
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key == 'config':
+            value = _parse_value(value)
+            if not isinstance(value, dict):
+                raise RequestError(400, "config参数必须是JSON对象")
+            merge_overrides(overrides, value)
+            continue
+        name, _, field = key.partition('.')
+        merge_overrides(overrides, {name: {field: _parse_value(value)} if field else _parse_value(value)})
+    return overrides
+
+
+def merge_overrides(overrides, values):
+    """合并配置覆盖，Logo_size、Logo_xy等字典按字段合并"""
+    for key, value in values.items():
+        if key not in OVERRIDE_KEYS:
+            raise RequestError(400, f"不能覆盖配置项 {key}，可用的配置项: {', '.join(OVERRIDE_KEYS)}")
+        if isinstance(value, dict) and isinstance(overrides.get(key), dict):
+            overrides[key] = {**overrides[key], **value}
+        else:
+            overrides[key] = value
+    use_logo = overrides.get('Use_logo')
+    if use_logo is not None and (not isinstance(use_logo, str) or os.path.basename(use_logo) != use_logo
+                                 or '\\' in use_logo or use_logo in ('', '.', '..')):
+        # 请求中只能选择水印库中的水印，不能读取任意路径的文件
+        raise RequestError(400, "Use_logo只能是水印库（data/watermarks）中的文件名")
+    logo_size = overrides.get('Logo_size')
+    if logo_size is not None:
+        if not isinstance(logo_size, dict):
+            raise RequestError(400, "Logo_size必须是包含width和height的对象")
+        for field in ('width', 'height'):
+            value = logo_size.get(field)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool)
+                                      or not 0 < value <= MAX_LOGO_SIZE):
+                raise RequestError(400, f"Logo_size.{field}必须是1到{MAX_LOGO_SIZE}之间的整数")
+    logo_bottom = overrides.get('Logo_bottom')
+    if logo_bottom is not None and (not isinstance(logo_bottom, (int, float)) or isinstance(logo_bottom, bool)
+                                    or not 0 <= logo_bottom <= 100):
+        raise RequestError(400, "Logo_bottom必须是0到100之间的数字（图片高度的百分比）")
+    logo_xy = overrides.get('Logo_xy')
+    if logo_xy is not None:
+        if not isinstance(logo_xy, dict):
+            raise RequestError(400, "Logo_xy必须是包含x和y的对象")
+        for field in ('x', 'y'):
+            value = logo_xy.get(field)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value not in (0, 1, 2)):
+                raise RequestError(400, f"Logo_xy.{field}必须是0（居中）、1（靠左/靠上）或2（靠右/靠下）")
+    return overrides
+
+
+def library_logo_path(name):
+    """
+    请求中的Use_logo只在水印库中查找，不像resolve_logo_path那样先按路径查找
+    :return: 水印文件的绝对路径，不在水印库中或不存在时抛出RequestError
+    """
+    directory = os.path.realpath(get_watermark_dir())
+    path = os.path.realpath(os.path.join(directory, name))
+    if not path.startswith(directory + os.sep) or not os.path.isfile(path):
+        raise RequestError(400, f"水印库中没有水印: {name}")
+    return path
+
+
+def apply_request_overrides(config, overrides):
+    """在基础配置上应用请求中的覆盖，字典类型的配置项按字段合并"""
+    config = dict(config)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key] = {**config[key], **value}
+        elif key == 'Use_logo':
+            config[key] = library_logo_path(value)
+        else:
+            config[key] = value
+    return config
+
+
+class ServiceMetrics:
+    """服务统计，多个请求线程同时更新"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.engine_hits = 0
+        self.engine_misses = 0
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, ok, seconds=None, bytes_in=0, bytes_out=0):
+        with self._lock:
+            self.requests += 1
+            if ok:
+                self.succeeded += 1
+                self._latencies.append(seconds)
+            else:
+                self.failed += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def record_rejected(self):
+        with self._lock:
+            self.requests += 1
+            self.rejected += 1
+
+    def record_engine(self, hit):
+        with self._lock:
+            if hit:
+                self.engine_hits += 1
+            else:
+                self.engine_misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            data = {
+                'uptime_seconds': round(time.time() - self.started, 1),
+                'requests': self.requests,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'engine_cache': {'hits': self.engine_hits, 'misses': self.engine_misses},
+            }
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        data['latency_ms'] = {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99),
+                              'max': round(latencies[-1] * 1000, 1)} if latencies else {}
+        return data
+
+
+class WatermarkService:
+    """
+    有界的工作线程池 + 按配置缓存的WatermarkEngine
+    submit() 在队列已满时抛出RequestError(429)
+    """
+
+    def __init__(self, config, workers=None, queue_size=None):
+        self.config = dict(config)
+        if workers is None:
+            workers = self.config.get('Serve_workers', 0)
+        if queue_size is None:
+            queue_size = self.config.get('Serve_queue_size', DEFAULT_QUEUE_SIZE)
+        try:
+            workers = int(workers or 0)
+        except (TypeError, ValueError):
+            workers = 0
+        try:
+            queue_size = max(0, int(queue_size))
+        except (TypeError, ValueError):
+            queue_size = DEFAULT_QUEUE_SIZE
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.queue_size = queue_size
+        self.metrics = ServiceMetrics()
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='markflow-serve')
+        # 正在处理和等待处理的请求共用的名额
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._pending = 0
+        self._engines = collections.OrderedDict()  # 配置 -> (引擎, 水印文件的大小和修改时间)
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """正在处理和等待处理的请求数"""
+        return self._pending
+
+    def prepare(self):
+        """用基础配置准备一个引擎，配置不完整时在启动时就报错"""
+        self.get_engine({})
+
+    def get_engine(self, overrides):
+        """
+        获取应用了覆盖配置的已准备引擎
+        水印文件被替换后重新准备，配置不完整时抛出WatermarkError
+        """
+        key = json.dumps(overrides, sort_keys=True, ensure_ascii=False)
+        config = apply_request_overrides(self.config, overrides)
+        try:
+            stat = os.stat(resolve_logo_path(config.get('Use_logo', '')))
+            stamp = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            stamp = None
+        with self._lock:
+            cached = self._engines.get(key)
+            if cached is not None and cached[1] == stamp:
+                self._engines.move_to_end(key)
+                self.metrics.record_engine(True)
+                return cached[0]
+
+        # 在锁外准备，首次使用某个水印和尺寸时的缩放不阻塞其他请求
+        # 被替换或淘汰的引擎可能仍在其他线程中使用，不调用close()，由垃圾回收释放
+        engine = WatermarkEngine(config)
+        engine.prepare(output=False)
+        self.metrics.record_engine(False)
+        with self._lock:
+            self._engines[key] = (engine, stamp)
+            self._engines.move_to_end(key)
+            while len(self._engines) > MAX_ENGINES:
+                self._engines.popitem(last=False)
+        return engine
+
+    def submit(self, data, overrides):
+        """
+        提交一张图片
+        :return: Future，结果为 (输出文件内容, 格式名)
+        """
+        if not self._slots.acquire(blocking=False):
+            self.metrics.record_rejected()
+            raise RequestError(429, "服务繁忙，请稍后重试")
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._process, data, overrides)
+        except RuntimeError:
+            self._release()
+            raise RequestError(503, "服务正在停止")
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _process(self, data, overrides):
+        return self.get_engine(overrides).process_bytes(data)
+
+    def health(self):
+        return {'status': 'ok', 'workers': self.workers, 'queue_size': self.queue_size,
+                'pending': self.pending, 'engines': len(self._engines)}
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for engine, _ in self._engines.values():
+                engine.close()
+            self._engines.clear()
+
+
+class WatermarkRequestHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理，每个连接一个线程，图片交给WatermarkService的工作线程处理"""
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    server_version = 'MarkFlow'
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self._send(status, body, 'application/json; charset=utf-8', headers)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/health':
+            self._send_json(200, self.service.health())
+        elif path == '/metrics':
+            self._send_json(200, {**self.service.metrics.snapshot(), **self.service.health()})
+        else:
+            self._send_json(404, {'error': f"未知的路径: {path}"})
+
+    do_HEAD = do_GET
+
+    def _read_body(self):
+        """读取请求体，超过大小上限时断开连接（剩余的请求体无法跳过）"""
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self.close_connection = True
+            raise RequestError(411, "需要Content-Length")
+        if length < 0:
+            # rfile.read(-1) 会一直读到客户端断开连接
+            self.close_connection = True
+            raise RequestError(400, "Content-Length不能为负数")
+        if length > self.server.max_body:
+            self.close_connection = True
+            raise RequestError(413, f"请求体超过 {self.server.max_body // (1024 * 1024)} MB")
+        return self.rfile.read(length)
+
+    def _parse_request(self, query):
+        """:return: (图片文件内容, 配置覆盖)"""
+        data = self._read_body()
+        overrides = parse_overrides(query)
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type == 'application/json':
+            try:
+                payload = json.loads(data.decode('utf-8'))
+                data = base64.b64decode(payload['image'], validate=True)
+            except (ValueError, KeyError, TypeError, binascii.Error):
+                raise RequestError(400, "JSON请求体应为 {\"image\": \"<base64>\", \"config\": {...}}")
+            config = payload.get('config') or {}
+            if not isinstance(config, dict):
+                raise RequestError(400, "config必须是JSON对象")
+            merge_overrides(overrides, config)
+        if not data:
+            raise RequestError(400, "请求体中没有图片")
+        return data, overrides
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        start = time.perf_counter()
+        bytes_in = 0
+        try:
+            if url.path != '/watermark':
+                # 未读取的请求体会被当作下一个请求，直接断开连接
+                self.close_connection = True
+                raise RequestError(404, f"未知的路径: {url.path}")
+            data, overrides = self._parse_request(url.query)
+            bytes_in = len(data)
+            output, image_format = self.service.submit(data, overrides).result()
+        except RequestError as e:
+            if e.status != 429:
+                self.service.metrics.record(False, bytes_in=bytes_in)
+            headers = {'Retry-After': '1'} if e.status == 429 else None
+            self._send_json(e.status, {'error': str(e)}, headers)
+            return
+        except WatermarkError as e:
+            self.service.metrics.record(False, bytes_in=bytes_in)
+            self._send_json(400, {'error': str(e)})
+            return
+        except (OSError, ValueError) as e:
+            # 包括UnidentifiedImageError和截断的图片
+            self.service.metrics.record(False, bytes_in=bytes_in)
+            self._send_json(415, {'error': f"无法处理的图片: {e}"})
+            return
+        except Exception as e:
+            self.service.metrics.record(False, bytes_in=bytes_in)
+            self._send_json(500, {'error': f"处理图片时出错: {e}"})
+            return
+
+        seconds = time.perf_counter() - start
+        self.service.metrics.record(True, seconds, bytes_in, len(output))
+        self._send(200, output, Image.MIME.get(image_format, 'application/octet-stream'),
+                   {'X-MarkFlow-Time-Ms': f"{seconds * 1000:.1f}"})
+
+
+class WatermarkHTTPServer(ThreadingHTTPServer):
+    """每个连接一个线程的HTTP服务器，持有WatermarkService"""
+    daemon_threads = True
+
+    def __init__(self, address, service, max_body_mb=DEFAULT_MAX_BODY_MB, verbose=False):
+        super().__init__(address, WatermarkRequestHandler)
+        self.service = service
+        self.max_body = int(max_body_mb * 1024 * 1024)
+        self.verbose = verbose
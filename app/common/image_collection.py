@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+待处理图片集合
+
+主页图片列表、批处理任务和命令行共用的数据结构，保存 图片路径 -> 显示名称 的有序映射：
+    - 添加、按路径去重、删除都是O(1)
+    - 同名文件按 name(1).ext、name(2).ext 分配显示名称，每个文件名各自维护计数器，
+      上千个 IMG_0001.JPG 也不需要每次从1开始尝试
+    - 按添加顺序遍历；按行号访问时使用懒生成的顺序表，单独删除后下次访问时重建一次，
+      按行区间删除时直接在顺序表上删除
+显示名称同时决定输出文件名（name_watermarked.ext），因此在集合内保证唯一。
+从文件夹中递归添加的图片，显示名称带有相对子目录（如 2024/trip/IMG_0001.JPG，用/分隔），
+输出时按相同的子目录结构保存，不同子目录中的同名文件不需要重命名。
+"""
+
+import os
+
+
+class ImageCollection:
+    """有序、按路径去重、显示名称唯一的图片集合"""
+
+    def __init__(self, image_paths=None):
+        self._names = {}  # image_path -> display_name，保持添加顺序
+        self._paths = {}  # display_name -> image_path
+        self._counters = {}  # 原始文件名 -> 下一个尝试的序号
+        self._order = None  # 按行号访问用的路径列表，删除后失效
+        self._rows = None  # image_path -> 行号，删除后失效
+        if image_paths:
+            self.extend(image_paths)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __bool__(self):
+        return bool(self._names)
+
+    def __contains__(self, image_path):
+        return image_path in self._names
+
+    def __iter__(self):
+        """按添加顺序产出 (image_path, display_name)"""
+        return iter(self._names.items())
+
+    def items(self):
+        """当前内容的快照 [(image_path, display_name), ...]，可以安全地交给其他线程"""
+        return list(self._names.items())
+
+    def display_name(self, image_path):
+        return self._names.get(image_path)
+
+    def path_for(self, display_name):
+        return self._paths.get(display_name)
+
+    def add(self, image_path, subdir=''):
+        """
+        添加一张图片
+        :param subdir: 相对子目录（用/分隔），会成为显示名称的前缀
+        :return: 分配的显示名称，路径已存在时返回None
+        """
+        if not image_path or image_path in self._names:
+            return None
+
+        filename = os.path.basename(image_path)
+        display_name = self._allocate_name(f"{subdir}/{filename}" if subdir else filename)
+        self._names[image_path] = display_name
+        self._paths[display_name] = image_path
+        if self._order is not None:
+            if self._rows is not None:
+                self._rows[image_path] = len(self._order)
+            self._order.append(image_path)
+        return display_name
+
+    def extend(self, image_paths):
+        """
+        添加多张图片
+        :param image_paths: 图片路径，或文件夹扫描产出的 (image_path, subdir)
+        :return: 实际添加的 [(image_path, display_name), ...]
+        """
+        added = []
+        for image_path in image_paths:
+            subdir = ''
+            if isinstance(image_path, tuple):
+                image_path, subdir = image_path
+            display_name = self.add(image_path, subdir)
+            if display_name is not None:
+                added.append((image_path, display_name))
+        return added
+
+    def remove(self, image_path):
+        """
+        移除一张图片，释放其显示名称
+        :return: 被移除图片的显示名称，不存在时返回None
+        """
+        display_name = self._names.pop(image_path, None)
+        if display_name is None:
+            return None
+        del self._paths[display_name]
+        self._order = self._rows = None
+        return display_name
+
+    def remove_rows(self, first, last):
+        """
+        移除第first到第last行（含），保留顺序表，连续多次区间删除不需要每次重建
+        :return: 被移除的 [(image_path, display_name), ...]
+        """
+        order = self._ordered()
+        removed = []
+        for image_path in order[first:last + 1]:
+            display_name = self._names.pop(image_path)
+            del self._paths[display_name]
+            removed.append((image_path, display_name))
+        del order[first:last + 1]
+        self._rows = None
+        return removed
+
+    def clear(self):
+        self._names.clear()
+        self._paths.clear()
+        self._counters.clear()
+        self._order = self._rows = None
+
+    def at(self, row):
+        """按行号获取 (image_path, display_name)"""
+        image_path = self._ordered()[row]
+        return image_path, self._names[image_path]
+
+    def row_of(self, image_path):
+        """获取图片的行号，不存在时返回None"""
+        if self._rows is None:
+            self._rows = {path: row for row, path in enumerate(self._ordered())}
+        return self._rows.get(image_path)
+
+    def _ordered(self):
+        if self._order is None:
+            self._order = list(self._names)
+            self._rows = None
+        return self._order
+
+    def _allocate_name(self, filename):
+        """分配唯一的显示名称，重名时按 name(n).ext 递增，序号从该文件名上次用到的位置继续"""
+        if filename not in self._paths:
+            return filename
+
+        name, ext = os.path.splitext(filename)
+        counter = self._counters.get(filename, 1)
+        while f"{name}({counter}){ext}" in self._paths:
+            counter += 1
+        self._counters[filename] = counter + 1
+        return f"{name}({counter}){ext}"
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+批处理日志
+
+每个批次在 data/journals 中对应一个只追加的JSON Lines文件：
+第一行记录批次的配置和全部图片，之后每处理完一张追加一行。
+批次正常结束时删除日志；程序被关闭、崩溃或机器重启后留下的日志即为未完成的批次，
+重新打开程序或执行 resume 命令时可以从未完成的图片继续。
+
+写入时每行都会flush，并按时间间隔fsync：断电时最多丢失最后一秒的记录，
+这些图片会在恢复时重新处理（输出文件是原子替换的，重复处理不会留下半个文件）。
+"""
+
+import json
+import os
+import time
+import uuid
+
+from app.common.watermark_engine import get_application_path
+
+JOURNAL_VERSION = 1
+
+# 两次fsync之间的最短间隔（秒），避免每张图片都等待磁盘
+FSYNC_INTERVAL = 1.0
+
+
+def get_journal_dir():
+    """获取批处理日志目录data/journals"""
+    return os.path.join(get_application_path(), 'data', 'journals')
+
+
+def _process_alive(pid):
+    """判断进程是否仍在运行，用于排除其他进程正在执行的批次"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class BatchJournal:
+    """一个批次的处理日志"""
+
+    def __init__(self, path, header, completed=None):
+        self.path = path
+        self.header = header
+        self.completed = set(completed or ())  # 已成功输出的显示名称
+        self._file = None
+        self._last_sync = 0.0
+
+    @property
+    def batch_id(self):
+        return self.header.get('id', os.path.splitext(os.path.basename(self.path))[0])
+
+    @property
+    def config(self):
+        """创建批次时生效的配置，恢复时沿用"""
+        return self.header.get('config', {})
+
+    @property
+    def jobs(self):
+        """批次中的全部图片 [(image_path, display_name), ...]"""
+        return [tuple(job) for job in self.header.get('jobs', [])]
+
+    @property
+    def created(self):
+        return self.header.get('created', 0)
+
+    def pending(self):
+        """尚未成功处理的图片，保持原顺序"""
+        return [job for job in self.jobs if job[1] not in self.completed]
+
+    @classmethod
+    def create(cls, config, jobs, directory=None):
+        """为新批次创建日志并写入批次信息"""
+        directory = directory or get_journal_dir()
+        os.makedirs(directory, exist_ok=True)
+        created = time.time()
+        # 同一进程在同一秒内可能创建多个批次（监视文件夹、连续两次手动处理），加随机后缀区分
+        batch_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(created))}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        header = {
+            'type': 'batch',
+            'version': JOURNAL_VERSION,
+            'id': batch_id,
+            'created': created,
+            'pid': os.getpid(),
+            'config': config,
+            'jobs': [list(job) for job in jobs],
+        }
+        journal = cls(os.path.join(directory, f"{batch_id}.jsonl"), header)
+        journal._open()
+        journal._append(header, sync=True)
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        """
+        读取日志文件
+        最后一行可能因崩溃只写了一半，无法解析的行直接忽略
+        :return: BatchJournal，文件不是有效日志时返回None
+        """
+        header = None
+        completed = set()
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('type') == 'batch':
+                    header = record
+                elif record.get('type') == 'item' and record.get('ok'):
+                    completed.add(record.get('name'))
+                elif record.get('type') == 'resume' and header is not None:
+                    header['pid'] = record.get('pid')
+        if header is None or header.get('version') != JOURNAL_VERSION:
+            return None
+        return cls(path, header, completed)
+
+    def resume(self):
+        """在原日志上继续追加记录，并标记为由当前进程执行"""
+        torn = False
+        with open(self.path, 'rb') as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        self._open()
+        if torn:
+            # 崩溃时最后一行只写了一半，另起一行避免新记录与之拼接
+            self._file.write('\n')
+        self.header['pid'] = os.getpid()
+        self._append({'type': 'resume', 'pid': os.getpid(), 'time': time.time()}, sync=True)
+        return self
+
+    def record(self, display_name, ok, message=None):
+        """记录一张图片的处理结果"""
+        if ok:
+            self.completed.add(display_name)
+        entry = {'type': 'item', 'name': display_name, 'ok': bool(ok)}
+        if message:
+            entry['error'] = message
+        self._append(entry)
+
+    def close(self):
+        """关闭日志文件但保留，供之后恢复"""
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def finish(self):
+        """批次已全部处理，删除日志"""
+        self.close()
+        self.discard()
+
+    def discard(self):
+        """放弃恢复，删除日志"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _append(self, record, sync=False):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        if sync or time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+            self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+
+def find_unfinished(directory=None):
+    """
+    查找未完成的批次，跳过仍在其他进程中运行的批次
+    :return: [BatchJournal, ...]，按创建时间从新到旧排列
+    """
+    directory = directory or get_journal_dir()
+    if not os.path.isdir(directory):
+        return []
+
+    journals = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith('.jsonl'):
+            continue
+        try:
+            journal = BatchJournal.load(entry.path)
+        except OSError as e:
+            print(f"读取批处理日志 {entry.path} 时出错: {e}")
+            continue
+        if journal is None or _process_alive(journal.header.get('pid', 0)):
+            continue
+        if not journal.pending():
+            # 所有图片都已完成，只是没来得及删除日志
+            journal.discard()
+            continue
+        journals.append(journal)
+    journals.sort(key=lambda journal: journal.created, reverse=True)
+    return journals
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+JPEG区域无损水印
+
+水印通常只覆盖图片的一个角落，没有必要解码并重新压缩整张照片。
+这里借助 libjpeg-turbo 的 jpegtran：
+    1. jpegtran -crop 无损裁出覆盖水印、按MCU对齐的小块区域
+    2. 只解码这一小块，粘贴水印后按原量化表重新编码
+    3. jpegtran -drop 把小块放回原图，其余DCT块原样复制
+
+区域之外的像素与原图完全一致，也不会因整图重新压缩而增大文件。
+jpegtran 为可选依赖（需支持 -drop，libjpeg-turbo 2.1 及以上），找不到时由调用方回退到整图处理。
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from PIL import Image
+
+
+class JpegRegionError(Exception):
+    """区域无损处理失败，调用方应回退到整图重新编码"""
+
+
+_jpegtran_lock = threading.Lock()
+_jpegtran_cache = {}
+
+
+def find_jpegtran(configured_path=''):
+    """
+    查找支持 -drop 的 jpegtran
+    :param configured_path: 配置中指定的可执行文件路径，为空时在PATH中查找
+    :return: 可执行文件路径，不可用时返回None
+    """
+    candidate = configured_path or shutil.which('jpegtran')
+    if not candidate:
+        return None
+
+    with _jpegtran_lock:
+        if candidate not in _jpegtran_cache:
+            try:
+                # jpegtran -help 的输出在stderr中，旧版本不支持 -drop
+                result = subprocess.run([candidate, '-help'], capture_output=True, text=True, timeout=10)
+                supported = '-drop' in (result.stdout + result.stderr)
+            except (OSError, subprocess.SubprocessError):
+                supported = False
+            _jpegtran_cache[candidate] = candidate if supported else None
+        return _jpegtran_cache[candidate]
+
+
+def get_mcu_size(image):
+    """
+    根据色度采样系数计算JPEG的MCU尺寸，如4:2:0为16x16，4:4:4为8x8
+    :param image: Pillow打开的JPEG图像（无需解码）
+    """
+    layers = getattr(image, 'layer', None) or [(0, 1, 1, 0)]
+    max_h = max(layer[1] for layer in layers)
+    max_v = max(layer[2] for layer in layers)
+    return 8 * max_h, 8 * max_v
+
+
+def align_box(box, image_size, mcu_size):
+    """
+    将区域扩展到MCU边界，并限制在图像范围内
+    :return: (left, top, right, bottom)，区域与图像不相交时返回None
+    """
+    width, height = image_size
+    mcu_w, mcu_h = mcu_size
+    left, top, right, bottom = box
+    left, top = max(0, left), max(0, top)
+    right, bottom = min(width, right), min(height, bottom)
+    if left >= right or top >= bottom:
+        return None
+
+    left = left // mcu_w * mcu_w
+    top = top // mcu_h * mcu_h
+    right = min(width, -(-right // mcu_w) * mcu_w)
+    bottom = min(height, -(-bottom // mcu_h) * mcu_h)
+    return left, top, right, bottom
+
+
+def _run_jpegtran(args):
+    """执行jpegtran，失败时抛出JpegRegionError"""
+    try:
+        result = subprocess.run(args, capture_output=True, timeout=120)
+    except (OSError, subprocess.SubprocessError) as e:
+        raise JpegRegionError(f"jpegtran执行失败: {e}")
+    if result.returncode != 0:
+        raise JpegRegionError(f"jpegtran执行失败: {result.stderr.decode(errors='replace').strip()}")
+
+
+def watermark_region(jpegtran, image_path, output_path, box, compose):
+    """
+    只重新编码覆盖水印的MCU块，其余DCT数据原样复制
+    :param jpegtran: find_jpegtran() 返回的可执行文件路径
+    :param box: 水印在原图中的区域 (left, top, right, bottom)
+    :param compose: 回调 compose(region_image, offset_x, offset_y)，在裁出的区域上原地粘贴水印，
+                    offset为水印相对区域左上角的位置
+    :return: True表示已写入output_path
+    """
+    with Image.open(image_path) as image:
+        # MPO（多图JPEG）的主图就是普通JPEG，附加的图像与整图处理时一样不会写入输出
+        if image.format not in ('JPEG', 'MPO'):
+            raise JpegRegionError("不是JPEG文件")
+        image_size = image.size
+        mcu_size = get_mcu_size(image)
+
+    aligned = align_box(box, image_size, mcu_size)
+    if aligned is None:
+        # 水印完全在图片外，原样复制
+        shutil.copyfile(image_path, output_path)
+        return True
+
+    left, top, right, bottom = aligned
+    with tempfile.TemporaryDirectory(prefix='markflow_') as temp_dir:
+        region_path = os.path.join(temp_dir, 'region.jpg')
+        patch_path = os.path.join(temp_dir, 'patch.jpg')
+
+        # 1. 无损裁出水印覆盖的区域
+        _run_jpegtran([jpegtran, '-copy', 'none', '-crop', f"{right - left}x{bottom - top}+{left}+{top}",
+                       '-outfile', region_path, image_path])
+
+        # 2. 只解码该区域并粘贴水印，按原量化表和采样方式重新编码
+        with Image.open(region_path) as region:
+            region.load()
+            compose(region, box[0] - left, box[1] - top)
+            region.save(patch_path, 'JPEG', quality='keep')
+
+        # 3. 把处理后的区域放回原图，保留EXIF等全部元数据
+        _run_jpegtran([jpegtran, '-copy', 'all', '-drop', f"+{left}+{top}", patch_path,
+                       '-outfile', output_path, image_path])
+    return True
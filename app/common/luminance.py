@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+背景亮度分析
+
+自动反色只需要知道水印下方区域的大致亮度，不必逐像素统计整块区域。
+这里先在低分辨率视图上取样（已解码图片用 Image.reduce，JPEG文件用 draft 缩小解码），
+再用NumPy在直方图上计算统计量；未安装NumPy时回退到Pillow的ImageStat。
+"""
+
+import math
+
+from PIL import Image, ImageStat
+
+try:
+    import numpy as np
+except ImportError:  # NumPy为可选依赖
+    np = None
+
+# 精度档位 -> 参与统计的最大采样点数，None表示使用全部像素
+ACCURACY_SAMPLES = {
+    'exact': None,
+    'balanced': 512 * 512,
+    'fast': 128 * 128,
+}
+DEFAULT_ACCURACY = 'balanced'
+
+_LEVELS = np.arange(256, dtype=np.float64) if np is not None else None
+
+# Image.reduce 支持的模式，其他模式需先转换为灰度
+_REDUCIBLE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'I', 'F')
+
+
+class RegionStats:
+    """区域亮度统计结果（0-255）"""
+
+    def __init__(self, mean, std, minimum, maximum, samples):
+        self.mean = mean
+        self.std = std
+        self.min = minimum
+        self.max = maximum
+        self.samples = samples  # 实际参与统计的像素数
+
+    def __repr__(self):
+        return (f"RegionStats(mean={self.mean:.1f}, std={self.std:.1f}, "
+                f"min={self.min}, max={self.max}, samples={self.samples})")
+
+
+def reduce_factor(pixel_count, accuracy=DEFAULT_ACCURACY):
+    """根据区域像素数和精度档位计算缩小倍数（>=1）"""
+    max_samples = ACCURACY_SAMPLES.get(accuracy, ACCURACY_SAMPLES[DEFAULT_ACCURACY])
+    if not max_samples or pixel_count <= max_samples:
+        return 1
+    return max(1, int(math.ceil(math.sqrt(pixel_count / max_samples))))
+
+
+def compute_stats(gray_image):
+    """
+    计算灰度图像的亮度统计
+    先由Pillow在C层生成256级直方图，再用NumPy在直方图上向量化计算，开销与像素数基本无关
+    """
+    if np is not None:
+        histogram = np.asarray(gray_image.histogram(), dtype=np.float64)
+        total = histogram.sum()
+        if total == 0:
+            return RegionStats(0.0, 0.0, 0, 0, 0)
+        mean = float(histogram @ _LEVELS / total)
+        std = float(math.sqrt(histogram @ np.square(_LEVELS - mean) / total))
+        levels = np.flatnonzero(histogram)
+        return RegionStats(mean, std, int(levels[0]), int(levels[-1]), int(total))
+
+    stat = ImageStat.Stat(gray_image)
+    minimum, maximum = stat.extrema[0]
+    return RegionStats(stat.mean[0], stat.stddev[0], minimum, maximum, int(stat.count[0]))
+
+
+def clip_box(size, box):
+    """将区域裁剪到图像范围内，区域与图像不相交时返回None"""
+    width, height = size
+    left, top, right, bottom = box
+    left, top = max(0, left), max(0, top)
+    right, bottom = min(width, right), min(height, bottom)
+    if left >= right or top >= bottom:
+        return None
+    return left, top, right, bottom
+
+
+def measure_region(image, box, accuracy=DEFAULT_ACCURACY):
+    """
+    统计已打开图片中指定区域的亮度
+    :param image: PIL图像对象
+    :param box: (left, top, right, bottom)，超出图像的部分会被裁掉
+    :param accuracy: 'exact'、'balanced' 或 'fast'
+    :return: RegionStats，区域与图像不相交时返回None
+    """
+    box = clip_box(image.size, box)
+    if box is None:
+        return None
+
+    left, top, right, bottom = box
+    factor = reduce_factor((right - left) * (bottom - top), accuracy)
+    if factor > 1 and image.mode in _REDUCIBLE_MODES:
+        # 在C层按块平均缩小指定区域，不需要先裁剪出全分辨率区域
+        region = image.reduce(factor, box=box)
+    else:
+        region = image.crop(box)
+        if factor > 1:
+            region = region.convert('L')
+            region = region.resize((max(1, region.width // factor), max(1, region.height // factor)),
+                                   Image.NEAREST)
+
+    gray = region if region.mode == 'L' else region.convert('L')
+    return compute_stats(gray)
+
+
+def measure_file_region(image_path, box, accuracy=DEFAULT_ACCURACY):
+    """
+    直接从文件统计指定区域的亮度
+    JPEG使用draft按1/2~1/8缩小解码，只需完整解码的一小部分开销
+    :param box: 原图坐标系下的区域
+    :return: RegionStats，区域与图像不相交时返回None
+    """
+    with Image.open(image_path) as image:
+        full_width, full_height = image.size
+        box = clip_box(image.size, box)
+        if box is None:
+            return None
+
+        if image.format == 'JPEG':
+            left, top, right, bottom = box
+            factor = reduce_factor((right - left) * (bottom - top), accuracy)
+            if factor > 1:
+                image.draft('L' if image.mode == 'L' else 'RGB',
+                            (max(1, full_width // factor), max(1, full_height // factor)))
+                # draft之后图片尺寸变小，按比例换算区域坐标
+                scale_x = image.size[0] / full_width
+                scale_y = image.size[1] / full_height
+                box = (int(left * scale_x), int(top * scale_y),
+                       max(int(left * scale_x) + 1, int(math.ceil(right * scale_x))),
+                       max(int(top * scale_y) + 1, int(math.ceil(bottom * scale_y))))
+
+        image.load()
+        return measure_region(image, box, accuracy)
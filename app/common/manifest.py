@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+增量处理清单
+
+data/manifest.json 记录每个输出文件由哪张输入图片、在什么水印配置下生成：
+输入的大小、修改时间和内容指纹，水印配置的哈希，以及输出文件的大小和修改时间。
+再次运行时，输入和输出的stat()结果与记录一致、配置哈希相同的图片直接跳过，
+未变化的文件只需要两次stat()和一次字典查找，不需要读取内容。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from app.common.atomic_file import atomic_write
+
+MANIFEST_VERSION = 1
+
+# 批处理过程中每记录这么多张输出或每隔这么多秒保存一次，中途崩溃或被终止时已处理的记录不会丢失
+SAVE_EVERY = 100
+SAVE_INTERVAL = 5.0
+
+# 与输出结果有关的配置项，其余配置（主题、线程数等）变化不会使已有输出失效
+_OUTPUT_CONFIG_KEYS = ('Logo_size', 'Logo_xy', 'Logo_bottom', 'Auto_invert', 'Invert_accuracy', 'Jpeg_lossless')
+
+
+def file_fingerprint(image_path=None, data=None):
+    """
+    计算文件内容指纹
+    :param data: 已读入内存的文件内容，提供时不再读取image_path
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if data is not None:
+        digest.update(data)
+    else:
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_fingerprint(config, logo_path, encoder_profile):
+    """
+    计算生效水印配置的哈希：水印文件、尺寸、位置、底部距离、自动反色和编码参数
+    水印文件按路径、大小和修改时间识别，替换水印文件后旧输出随之失效
+    """
+    logo_stat = os.stat(logo_path)
+    effective = {key: config.get(key) for key in _OUTPUT_CONFIG_KEYS}
+    effective['logo'] = [os.path.abspath(logo_path), logo_stat.st_size, logo_stat.st_mtime_ns]
+    effective['encoder'] = encoder_profile
+    payload = json.dumps(effective, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class Manifest:
+    """
+    输出清单，以输出文件的绝对路径为键
+    多个处理线程可以同时查询和记录，save() 时与磁盘上的清单合并后原子替换
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._changed = {}
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read(path):
+        """读取清单文件，不存在或损坏时返回空字典"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"读取处理清单时出错: {e}")
+            return {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def load(self):
+        self.entries = self._read(self.path)
+        return self
+
+    def is_current(self, image_path, source_stat, output_path, config_hash):
+        """
+        判断输出是否已经是最新的
+        输入的大小和修改时间与记录一致时只做stat比较；修改时间变了但大小相同（如复制、touch）时，
+        再比较内容指纹，内容未变则更新记录并视为最新
+        """
+        key = os.path.abspath(output_path)
+        with self._lock:
+            entry = self.entries.get(key)
+        if not entry or entry.get('config') != config_hash or entry.get('source') != os.path.abspath(image_path):
+            return False
+
+        try:
+            output_stat = os.stat(output_path)
+        except OSError:
+            return False
+        if output_stat.st_size != entry.get('output_size') or output_stat.st_mtime_ns != entry.get('output_mtime'):
+            return False
+
+        if source_stat.st_size != entry.get('size'):
+            return False
+        if source_stat.st_mtime_ns == entry.get('mtime'):
+            return True
+
+        if file_fingerprint(image_path) != entry.get('digest'):
+            return False
+        updated = dict(entry, mtime=source_stat.st_mtime_ns)
+        with self._lock:
+            self.entries[key] = updated
+            self._changed[key] = updated
+        return True
+
+    def record(self, image_path, source_stat, digest, output_path, config_hash):
+        """记录一张已写入的输出"""
+        output_stat = os.stat(output_path)
+        key = os.path.abspath(output_path)
+        entry = {
+            'source': os.path.abspath(image_path),
+            'size': source_stat.st_size,
+            'mtime': source_stat.st_mtime_ns,
+            'digest': digest,
+            'config': config_hash,
+            'output_size': output_stat.st_size,
+            'output_mtime': output_stat.st_mtime_ns,
+        }
+        with self._lock:
+            self.entries[key] = entry
+            self._changed[key] = entry
+
+    def maybe_save(self):
+        """批处理过程中调用，新记录达到SAVE_EVERY条或距上次保存超过SAVE_INTERVAL秒时保存"""
+        with self._lock:
+            due = len(self._changed) >= SAVE_EVERY or (
+                self._changed and time.monotonic() - self._last_save >= SAVE_INTERVAL)
+        if due:
+            self.save()
+
+    def save(self):
+        """写回有变化的记录，先与磁盘上的清单合并，避免覆盖其他进程的记录"""
+        with self._lock:
+            if not self._changed:
+                return
+            entries = self._read(self.path)
+            entries.update(self._changed)
+
+            atomic_write(self.path, json.dumps({'version': MANIFEST_VERSION, 'entries': entries}, ensure_ascii=False))
+
+            self.entries = entries
+            self._changed = {}
+            self._last_save = time.monotonic()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+流式处理管道
+
+各阶段由有界队列连接，每个阶段有独立的并发线程数：
+读盘、解码、合成、编码、写盘可以同时进行，I/O与CPU互相重叠，
+而队列容量限制了同时在内存中的条目数量。
+"""
+
+import queue
+import threading
+
+# 队列结束标记
+_STOP = object()
+
+
+class PipelineStage:
+    """管道中的一个阶段"""
+
+    def __init__(self, name, func, workers=1):
+        """
+        :param name: 阶段名称，用于线程命名和调试
+        :param func: 处理函数 func(item) -> item，可原地修改条目后返回
+        :param workers: 该阶段的并发线程数
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+
+class _Entry:
+    """在队列之间传递的条目，出错后携带异常继续流向末端，以便统计进度"""
+
+    def __init__(self, item):
+        self.item = item
+        self.error = None
+
+
+class Pipeline:
+    """
+    由多个阶段组成的处理管道
+    用法：for item, error in Pipeline(stages).run(items): ...
+    """
+
+    def __init__(self, stages, queue_size=4):
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """停止投递新条目，已进入管道的条目会继续处理完"""
+        self._cancelled.set()
+
+    def run(self, items):
+        """
+        处理所有条目
+        :param items: 可迭代的输入条目，会被逐个投递，不会一次性全部读入
+        :return: 生成器，按完成顺序产出 (item, error)，error为None表示成功
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]),
+                                    name='pipeline-feed', daemon=True)]
+
+        for index, stage in enumerate(self.stages):
+            # 同一阶段的线程共享计数，最后一个退出的线程把结束标记传给下一阶段
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for worker_index in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[index], queues[index + 1], remaining, lock),
+                    name=f'pipeline-{stage.name}-{worker_index}',
+                    daemon=True,
+                ))
+
+        for thread in threads:
+            thread.start()
+
+        output = queues[-1]
+        finished = False
+        try:
+            while True:
+                entry = output.get()
+                if entry is _STOP:
+                    finished = True
+                    break
+                yield entry.item, entry.error
+        finally:
+            if not finished:
+                # 消费方提前退出：停止投递，等已在管道中的条目处理完，让所有线程正常结束
+                self._cancelled.set()
+                while output.get() is not _STOP:
+                    pass
+            for thread in threads:
+                thread.join()
+
+    def _feed(self, items, first_queue):
+        """投递线程"""
+        try:
+            for item in items:
+                if self._cancelled.is_set():
+                    break
+                first_queue.put(_Entry(item))
+        finally:
+            first_queue.put(_STOP)
+
+    @staticmethod
+    def _work(stage, in_queue, out_queue, remaining, lock):
+        """阶段工作线程"""
+        while True:
+            entry = in_queue.get()
+            if entry is _STOP:
+                # 放回结束标记，让同阶段的其他线程也能退出
+                in_queue.put(_STOP)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    out_queue.put(_STOP)
+                return
+
+            if entry.error is None:
+                try:
+                    entry.item = stage.func(entry.item)
+                except Exception as e:
+                    entry.error = e
+            out_queue.put(entry)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+预处理水印缓存
+
+每批任务只需缩放一次水印、判断一次明暗并生成黑/白两种反色版本，
+逐张图片处理时只做查表。缓存跨批次保留，按LRU淘汰。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageStat
+
+# 缓存的预处理水印数量上限
+MAX_CACHED_WATERMARKS = 8
+
+
+def is_light_image(image):
+    """
+    判断图像是否主要是浅色
+    :param image: PIL图像对象
+    :return: 如果主要是浅色返回True，否则返回False
+    """
+    try:
+        # 转换为灰度图，由Pillow在C层计算平均亮度
+        avg_brightness = ImageStat.Stat(image.convert('L')).mean[0]
+
+        # 如果平均亮度大于等于128，则认为是浅色图像
+        return avg_brightness >= 128
+    except Exception as e:
+        print(f"判断图像明暗时出错: {e}")
+        # 出错时默认返回True（浅色）
+        return True
+
+
+def invert_watermark_color(watermark_image, target_color='white'):
+    """
+    反转水印颜色
+    :param watermark_image: 原始水印图像
+    :param target_color: 目标颜色 ('white' 或 'black')
+    :return: 调整颜色后的水印图像
+    """
+    try:
+        fill = 255 if target_color == 'white' else 0
+        if watermark_image.mode == 'RGBA':
+            # 对于RGBA图像，创建纯色层并保持原始alpha通道
+            alpha = watermark_image.getchannel('A')
+            layer = Image.new('L', watermark_image.size, fill)
+            inverted = Image.merge('RGBA', (layer, layer, layer, alpha))
+        else:
+            # 对于RGB图像，创建纯色图像
+            inverted = Image.new(watermark_image.mode, watermark_image.size, (fill, fill, fill))
+        return inverted
+    except Exception as e:
+        print(f"反转水印颜色时出错: {e}")
+        return watermark_image
+
+
+class PreparedWatermark:
+    """已缩放的水印及其明暗分类、黑白反色版本，创建后只读，可在多个线程间共享"""
+
+    def __init__(self, logo_image, with_variants=True):
+        self.image = logo_image
+        # 提前加载像素数据，多个工作线程共享同一个只读水印
+        self.image.load()
+        self.is_light = is_light_image(logo_image)
+        self.white = invert_watermark_color(logo_image, 'white') if with_variants else None
+        self.black = invert_watermark_color(logo_image, 'black') if with_variants else None
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def mode(self):
+        return self.image.mode
+
+    def variant(self, target_color):
+        """
+        获取指定颜色的水印
+        :param target_color: 'white'、'black'，其他值返回原始水印
+        """
+        if target_color == 'white' and self.white is not None:
+            return self.white
+        if target_color == 'black' and self.black is not None:
+            return self.black
+        return self.image
+
+    @classmethod
+    def from_file(cls, logo_path, size, with_variants=True):
+        """从文件加载水印并缩放到指定尺寸"""
+        with Image.open(logo_path) as logo_image:
+            resized = logo_image.resize(size, Image.LANCZOS)
+        return cls(resized, with_variants)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_prepared_watermark(logo_path, size, with_variants=True):
+    """
+    获取预处理水印，命中缓存时直接返回
+    缓存键为 (文件路径, 修改时间, 文件大小, 目标尺寸, 是否生成反色版本)，文件被替换后自动失效
+    """
+    stat = os.stat(logo_path)
+    key = (os.path.abspath(logo_path), stat.st_mtime_ns, stat.st_size, tuple(size), with_variants)
+    with _cache_lock:
+        prepared = _cache.get(key)
+        if prepared is not None:
+            _cache.move_to_end(key)
+            return prepared
+
+        prepared = PreparedWatermark.from_file(logo_path, tuple(size), with_variants)
+        _cache[key] = prepared
+        while len(_cache) > MAX_CACHED_WATERMARKS:
+            _cache.popitem(last=False)
+        return prepared
+
+
+def clear_watermark_cache():
+    """清空预处理水印缓存"""
+    with _cache_lock:
+        _cache.clear()
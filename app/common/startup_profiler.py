@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+启动耗时统计
+
+记录从main.py开始执行到主窗口首次绘制之间的各个阶段：导入模块、创建QApplication、读取配置、
+构造各个界面、显示窗口和首次绘制，延迟创建的界面在第一次切换过去时记录构造耗时。
+
+首次绘制超过 Startup_budget_ms 时打印各阶段耗时；Startup_profile 为true
+（或设置环境变量 MARKFLOW_PROFILE_STARTUP=1）时总是打印，并在data/reports中写入JSON报告。
+本模块不依赖Qt，需在导入PyQt6之前导入，导入本身的耗时可以忽略。
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from app.common.instrumentation import write_json_report
+
+# 默认启动预算（毫秒），首次绘制超过时打印耗时明细
+DEFAULT_BUDGET_MS = 2000
+
+
+class StartupProfiler:
+    """启动耗时记录，时间均为相对于开始记录时的毫秒数"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.events = []  # [{'name', 'at', 'duration'}]，里程碑的duration为None
+        self.first_paint = None
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def mark(self, name):
+        """记录一个里程碑"""
+        self.events.append({'name': name, 'at': round(self.elapsed_ms(), 1), 'duration': None})
+
+    @contextmanager
+    def span(self, name):
+        """记录代码块的开始时间和耗时"""
+        start = self.elapsed_ms()
+        try:
+            yield
+        finally:
+            self.events.append({'name': name, 'at': round(start, 1),
+                                'duration': round(self.elapsed_ms() - start, 1)})
+
+    def finish(self, config=None, report_dir=None):
+        """
+        主窗口首次绘制时调用，按配置打印并保存报告
+        :param config: 包含Startup_profile和Startup_budget_ms的配置
+        :param report_dir: 启用统计时写入报告的目录
+        :return: 首次绘制时间（毫秒）
+        """
+        if self.first_paint is not None:
+            return self.first_paint
+        self.mark('first_paint')
+        self.first_paint = self.events[-1]['at']
+
+        config = config or {}
+        enabled = bool(config.get('Startup_profile')) or os.environ.get('MARKFLOW_PROFILE_STARTUP') == '1'
+        try:
+            budget = float(config.get('Startup_budget_ms', DEFAULT_BUDGET_MS))
+        except (TypeError, ValueError):
+            budget = DEFAULT_BUDGET_MS
+        over_budget = 0 < budget < self.first_paint
+
+        if over_budget:
+            print(f"启动耗时 {self.first_paint:.0f} ms，超出预算 {budget:.0f} ms")
+        if enabled or over_budget:
+            print(self.format())
+        if enabled and report_dir:
+            try:
+                print(f"启动报告: {self.write_report(report_dir)}")
+            except OSError as e:
+                print(f"写入启动报告时出错: {e}")
+        return self.first_paint
+
+    def format(self):
+        """各阶段耗时的文本"""
+        lines = ["启动耗时（ms）:"]
+        for event in self.events:
+            if event['duration'] is None:
+                lines.append(f"  {event['at']:>8.1f}  {event['name']}")
+            else:
+                lines.append(f"  {event['at']:>8.1f}  {event['name']}（{event['duration']:.1f}）")
+        return "\n".join(lines)
+
+    def write_report(self, directory):
+        """
+        写入JSON报告，并清理超出MAX_REPORTS的旧报告
+        :return: 报告路径
+        """
+        return write_json_report(directory, 'startup', self.started,
+                                 {'started': self.started, 'first_paint': self.first_paint, 'events': self.events})
+
+
+# 进程内唯一的启动记录，从main.py导入本模块时开始计时
+profiler = StartupProfiler()
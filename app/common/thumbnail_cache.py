@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+缩略图磁盘缓存
+
+以 源文件路径 + 修改时间 + 文件大小 + 缩略图尺寸 为键，把编码后的缩略图保存在 data/thumbnails 中，
+再次拖入同一批图片时只需一次stat()和一次小文件读取，不需要重新解码原图。
+源文件被修改后键随之变化，旧缩略图不再命中，最终被LRU淘汰。
+
+缓存总大小超过上限时按最近使用时间（文件修改时间，命中时更新）淘汰最旧的缩略图。
+本模块只处理字节数据，不依赖Qt，编解码由调用方完成。
+"""
+
+import hashlib
+import os
+import threading
+
+from app.common.atomic_file import atomic_write
+from app.common.config_store import get_config_store
+from app.common.watermark_engine import get_application_path
+
+# 缓存格式版本，缩略图生成方式变化时递增，使旧缓存失效
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# 超过上限时淘汰到上限的这个比例，避免每次写入都触发淘汰
+_EVICT_TARGET = 0.9
+
+
+def get_thumbnail_dir():
+    """获取缩略图缓存目录data/thumbnails"""
+    return os.path.join(get_application_path(), 'data', 'thumbnails')
+
+
+def create_thumbnail_cache():
+    """
+    按配置创建缩略图缓存
+    Thumbnail_cache_size为缓存上限（MB），为0时不使用缓存，返回None
+    """
+    max_mb = get_config_store().get_float('Thumbnail_cache_size', DEFAULT_MAX_BYTES // 1024 // 1024)
+    if max_mb <= 0:
+        return None
+    return ThumbnailCache(get_thumbnail_dir(), int(max_mb * 1024 * 1024))
+
+
+class ThumbnailCache:
+    """缩略图磁盘缓存，可在多个线程中同时使用"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 首次写入时统计
+
+    def key(self, source_path, variant=''):
+        """
+        计算缓存键
+        :param variant: 缩略图规格（如尺寸），规格不同的缩略图分开缓存
+        :return: 键，源文件不存在时返回None
+        """
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return None
+        raw = f"{CACHE_VERSION}|{os.path.abspath(source_path)}|{stat.st_mtime_ns}|{stat.st_size}|{variant}"
+        return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _path(self, key):
+        # 按键的前两位分子目录，避免单个目录中文件过多
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """读取缩略图，未命中时返回None"""
+        if key is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            # 更新修改时间作为最近使用时间
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        """写入缩略图，超出大小上限时淘汰最久未使用的缩略图"""
+        if key is None or self.max_bytes <= 0:
+            return
+        path = self._path(key)
+        try:
+            # 覆盖已有的缩略图时，总大小中要减去被替换的文件
+            replaced_bytes = os.path.getsize(path)
+        except OSError:
+            replaced_bytes = 0
+        try:
+            # 缓存丢失后可以重新生成，不等待刷盘
+            atomic_write(path, data, fsync=False)
+        except OSError as e:
+            print(f"写入缩略图缓存时出错: {e}")
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, _, size in self._scan())
+            else:
+                self._total_bytes += len(data) - replaced_bytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def clear(self):
+        """删除全部缓存"""
+        with self._lock:
+            for path, _, _ in self._scan():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_bytes = 0
+
+    def _scan(self):
+        """列出缓存中的文件 [(路径, 最近使用时间, 大小), ...]"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for subdir in os.scandir(self.directory):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        return entries
+
+    def _evict(self):
+        """按最近使用时间从旧到新删除，直到总大小低于上限的90%"""
+        entries = sorted(self._scan(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * _EVICT_TARGET
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
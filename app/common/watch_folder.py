@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+监视文件夹（热文件夹）
+
+监视一个或多个目录（包括子目录），新放入或被修改的图片写入完成后自动添加水印：
+    - 安装了watchdog时使用系统的文件变化通知（Linux上为inotify），否则（或Watch_polling为true时）定时扫描目录。
+      网络共享目录通常收不到变化通知，需要使用定时扫描
+    - 文件的大小和修改时间在Watch_settle秒内不再变化、并且可以打开读取时才视为写入完成；
+      inotify报告文件写入后关闭时不需要等待
+    - WatchService 持有一个长期存在的WatermarkEngine，水印只在启动时缩放、分析一次，
+      每批新文件直接进入处理流程，输出按相对于监视目录的子目录结构保存
+已经处理过且没有变化的文件由增量清单跳过。本模块不依赖Qt，命令行（python main.py watch）和主页共用。
+"""
+
+import os
+import posixpath
+import threading
+import time
+
+from app.common.folder_scan import sniff_image
+from app.common.instrumentation import BatchMetrics
+from app.common.watermark_engine import IMAGE_EXTENSIONS, WatermarkEngine, WatermarkError
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog为可选依赖，未安装时定时扫描目录
+    FileSystemEventHandler = object
+    Observer = None
+
+# 文件大小和修改时间保持不变多久后视为写入完成（秒）
+DEFAULT_SETTLE = 0.3
+# 定时扫描的间隔（秒）
+DEFAULT_POLL_INTERVAL = 0.5
+
+# 下载或复制过程中的临时文件
+_TEMP_SUFFIXES = ('.tmp', '.part', '.partial', '.crdownload', '.download')
+
+
+class _PendingFile:
+    """等待写入完成的文件"""
+    __slots__ = ('stamp', 'changed', 'detected', 'closed')
+
+    def __init__(self, detected):
+        self.stamp = None
+        self.changed = detected  # 最近一次大小或修改时间变化的时间
+        self.detected = detected
+        self.closed = False
+
+
+class _EventHandler(FileSystemEventHandler):
+    """把watchdog事件转发给FolderWatcher"""
+
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.dest_path)
+
+    def on_closed(self, event):
+        # 只有inotify提供，文件写入后关闭，不需要再等待
+        if not event.is_directory:
+            self.watcher.notify(event.src_path, closed=True)
+
+
+class FolderWatcher:
+    """
+    监视目录中新增或修改的图片
+    run() 在调用线程中循环，文件写入完成后以 [(路径, 发现时间), ...] 调用on_ready
+    """
+
+    def __init__(self, directories, settle=DEFAULT_SETTLE, poll_interval=DEFAULT_POLL_INTERVAL,
+                 polling=False, ignore=(), include_existing=False):
+        """
+        :param polling: 为True时不使用系统通知，只定时扫描
+        :param ignore: 不监视的目录（如位于监视目录中的输出目录）
+        :param include_existing: 是否处理启动时目录中已有的图片
+        """
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.settle = max(0.0, settle)
+        self.poll_interval = max(0.05, poll_interval)
+        self.polling = polling or Observer is None
+        self.ignore = [os.path.abspath(directory) for directory in ignore]
+        self.include_existing = include_existing
+        self._pending = {}
+        self._known = {}  # 定时扫描时上次看到的 路径 -> (大小, 修改时间)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    @property
+    def mode(self):
+        return 'polling' if self.polling else 'events'
+
+    def _accepts(self, path):
+        """是否是需要处理的文件（按文件名判断，文件头在写入完成后检查）"""
+        name = os.path.basename(path)
+        lower = name.lower()
+        if name.startswith(('.', '~')) or lower.endswith(_TEMP_SUFFIXES) or not lower.endswith(IMAGE_EXTENSIONS):
+            return False
+        return not any(path == directory or path.startswith(directory + os.sep) for directory in self.ignore)
+
+    def notify(self, path, closed=False):
+        """记录一个新增或修改的文件，可在任意线程中调用"""
+        path = os.path.abspath(path)
+        if not self._accepts(path):
+            return
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is None:
+                pending = self._pending[path] = _PendingFile(time.monotonic())
+            pending.closed = pending.closed or closed
+        self._wakeup.set()
+
+    def _scan(self):
+        """遍历监视目录，返回 路径 -> (大小, 修改时间)"""
+        files = {}
+        stack = list(self.directories)
+        while stack:
+            directory = stack.pop()
+            if any(directory == ignored or directory.startswith(ignored + os.sep) for ignored in self.ignore):
+                continue
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file() and self._accepts(entry.path):
+                                stat = entry.stat()
+                                files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return files
+
+    def _poll(self):
+        """定时扫描：与上次的结果比较，大小或修改时间变化的文件加入等待"""
+        files = self._scan()
+        for path, stamp in files.items():
+            if self._known.get(path) != stamp:
+                self.notify(path)
+        self._known = files
+
+    def _collect_ready(self):
+        """
+        检查等待中的文件，返回已写入完成的 [(路径, 发现时间), ...]
+        """
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            pending = list(self._pending.items())
+        for path, state in pending:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 文件已被删除或移走
+                with self._lock:
+                    self._pending.pop(path, None)
+                continue
+            stamp = (stat.st_size, stat.st_mtime_ns)
+            if stamp != state.stamp:
+                state.stamp = stamp
+                state.changed = now
+                if not state.closed:
+                    continue
+            if stat.st_size == 0 or (not state.closed and now - state.changed < self.settle):
+                continue
+            # 另一个进程仍在写入时（Windows上）无法打开；文件头不是图片时不再等待
+            try:
+                with open(path, 'rb'):
+                    pass
+            except OSError:
+                continue
+            with self._lock:
+                self._pending.pop(path, None)
+            if sniff_image(path):
+                ready.append((path, state.detected))
+        return ready
+
+    def run(self, on_ready, stop_event):
+        """监视目录直到stop_event被设置"""
+        observer = None
+        self._known = self._scan()
+        if self.include_existing:
+            for path in self._known:
+                self.notify(path)
+        if not self.polling:
+            observer = Observer()
+            handler = _EventHandler(self)
+            for directory in self.directories:
+                observer.schedule(handler, directory, recursive=True)
+            observer.start()
+
+        next_poll = time.monotonic() + self.poll_interval
+        try:
+            while not stop_event.is_set():
+                with self._lock:
+                    has_pending = bool(self._pending)
+                # 有等待中的文件时按较短的间隔检查是否写入完成
+                timeout = min(self.settle / 2, self.poll_interval) if has_pending else self.poll_interval
+                if self.polling:
+                    timeout = min(timeout, max(0.0, next_poll - time.monotonic()))
+                self._wakeup.wait(max(timeout, 0.01))
+                self._wakeup.clear()
+                if stop_event.is_set():
+                    break
+
+                if self.polling and time.monotonic() >= next_poll:
+                    self._poll()
+                    next_poll = time.monotonic() + self.poll_interval
+                ready = self._collect_ready()
+                if ready:
+                    on_ready(ready)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+
+class WatchService:
+    """
+    热文件夹服务：FolderWatcher + 长期存在的WatermarkEngine
+    用法：service = WatchService(config, directories); service.prepare(); service.run(stop_event)
+    """
+
+    def __init__(self, config, directories, on_processed=None, on_error=None, include_existing=False):
+        """
+        :param on_processed: 回调 (显示名称, 从发现到处理完成的秒数, 是否因未变化而跳过)
+        :param on_error: 回调 (错误信息)
+        """
+        self.config = dict(config)
+        # 每批只有几张图片，不为每批写入性能报告
+        self.config['Performance_report'] = False
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.on_processed = on_processed
+        self.on_error = on_error
+        self.engine = WatermarkEngine(self.config)
+        self.processed_count = 0
+        self.error_count = 0
+
+        try:
+            settle = float(config.get('Watch_settle', DEFAULT_SETTLE))
+        except (TypeError, ValueError):
+            settle = DEFAULT_SETTLE
+        try:
+            poll_interval = float(config.get('Watch_poll_interval', DEFAULT_POLL_INTERVAL))
+        except (TypeError, ValueError):
+            poll_interval = DEFAULT_POLL_INTERVAL
+        out_path = self.engine.out_path
+        self.watcher = FolderWatcher(self.directories, settle, poll_interval,
+                                     polling=bool(config.get('Watch_polling', False)),
+                                     ignore=[out_path] if out_path else (),
+                                     include_existing=include_existing)
+
+    def prepare(self):
+        """检查配置并预处理水印，配置不完整时抛出WatermarkError"""
+        out_path = self.engine.out_path
+        out_real = os.path.realpath(out_path) if out_path else None
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                raise NotADirectoryError(f"监视目录不存在: {directory}")
+            # 输出目录会被忽略，监视目录与它相同或位于其中时所有图片都不会被处理
+            real = os.path.realpath(directory)
+            if out_real and (real == out_real or real.startswith(out_real.rstrip(os.sep) + os.sep)):
+                raise WatermarkError(f"输出目录不能是监视目录或包含监视目录: {out_path}")
+        self.engine.prepare()
+
+    def display_name(self, path):
+        """
+        输出使用的显示名称：相对于所在监视目录的路径，监视多个目录时以目录名区分
+        两边都解析符号链接后比较（如/var与/private/var），找不到所在的监视目录时只使用文件名
+        """
+        real = os.path.realpath(path)
+        roots = [directory for directory in self.directories
+                 if real.startswith(os.path.realpath(directory).rstrip(os.sep) + os.sep)]
+        if not roots:
+            return os.path.basename(path)
+        root = max(roots, key=lambda directory: len(os.path.realpath(directory)))
+        name = os.path.relpath(real, os.path.realpath(root)).replace(os.sep, '/')
+        if len(self.directories) > 1:
+            name = posixpath.join(os.path.basename(root.rstrip(os.sep)) or 'root', name)
+        return name
+
+    def process(self, ready):
+        """处理一批写入完成的文件"""
+        detected = {}
+        jobs = []
+        for path, detected_at in ready:
+            name = self.display_name(path)
+            detected[name] = detected_at
+            jobs.append((path, name))
+
+        # 长期运行时每批单独统计，不累积历史记录
+        self.engine.metrics = BatchMetrics()
+
+        def on_error(message):
+            self.error_count += 1
+            if self.on_error:
+                self.on_error(message)
+
+        self.engine.run(jobs, on_error=on_error)
+        finished = time.monotonic()
+        for record in self.engine.metrics.items:
+            if not record['ok']:
+                continue
+            self.processed_count += 1
+            if self.on_processed:
+                name = record['name']
+                self.on_processed(name, finished - detected.get(name, finished), record['skipped'])
+
+    def run(self, stop_event):
+        """监视并处理新文件，直到stop_event被设置"""
+        try:
+            self.watcher.run(self.process, stop_event)
+        finally:
+            self.engine.close()
@@ -0,0 +1,740 @@
+# -*- coding: utf-8 -*-
+"""
+水印处理引擎
+
+只依赖Pillow，不导入PyQt6/qfluentwidgets，
+GUI中的WatermarkProcessor和命令行批处理模式共用这里的逻辑。
+"""
+
+import io
+import json
+import os
+import posixpath
+import shutil
+import sys
+
+from PIL import Image
+
+from app.common.atomic_file import atomic_output
+from app.common.dedupe import DEFAULT_PERCEPTUAL_THRESHOLD, find_duplicates
+from app.common.encoder_profiles import build_save_kwargs, get_profile
+from app.common.instrumentation import BatchMetrics, timed
+from app.common.jpeg_region import JpegRegionError, find_jpegtran, watermark_region
+from app.common.luminance import DEFAULT_ACCURACY, measure_region
+from app.common.manifest import Manifest, config_fingerprint, file_fingerprint
+from app.common.pipeline import Pipeline, PipelineStage
+from app.common.prepared_watermark import get_prepared_watermark
+from app.common.watermark_index import WatermarkIndex
+
+# 支持处理的图片扩展名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+
+# 处理管道的阶段及默认并发数，0表示使用Workers计算出的线程数
+PIPELINE_STAGES = ('read', 'decode', 'composite', 'encode', 'write')
+DEFAULT_STAGE_WORKERS = {'read': 2, 'decode': 0, 'composite': 0, 'encode': 0, 'write': 2}
+# 相邻阶段之间的队列容量，限制同时在内存中的图片数量
+DEFAULT_QUEUE_SIZE = 4
+
+# 在内存中处理图片（process_bytes）时，输入格式对应的输出扩展名
+# 很多手机和相机拍摄的JPEG被Pillow识别为MPO，与处理文件时一样按.jpg编码为JPEG
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'MPO': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'GIF': '.gif', 'BMP': '.bmp',
+                     'TIFF': '.tif'}
+
+
+class WatermarkError(Exception):
+    """水印任务无法开始时抛出的异常（配置缺失、水印不存在等）"""
+
+
+def get_application_path():
+    """获取应用程序所在目录的正确路径"""
+    if getattr(sys, 'frozen', False):
+        # 如果程序是打包后的exe文件
+        application_path = os.path.dirname(sys.executable)
+        # 检查data目录是否在可执行文件同级目录
+        data_path = os.path.join(application_path, 'data')
+        if not os.path.exists(data_path):
+            # 如果不存在，则尝试使用_internal同级目录
+            internal_path = os.path.join(application_path, '_internal')
+            if os.path.exists(internal_path):
+                application_path = internal_path
+    else:
+        # 如果是直接运行的Python脚本
+        application_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return application_path
+
+
+def get_config_path():
+    """获取data/config.json的路径"""
+    return os.path.join(get_application_path(), 'data', 'config.json')
+
+
+def get_manifest_path():
+    """获取增量处理清单data/manifest.json的路径"""
+    return os.path.join(get_application_path(), 'data', 'manifest.json')
+
+
+def get_watermark_dir():
+    """获取水印库目录data/watermarks"""
+    return os.path.join(get_application_path(), 'data', 'watermarks')
+
+
+def get_watermark_index():
+    """读取水印库索引data/watermark_index.json，预览图保存在data/watermark_previews"""
+    data_dir = os.path.join(get_application_path(), 'data')
+    return WatermarkIndex(get_watermark_dir(), os.path.join(data_dir, 'watermark_index.json'),
+                          os.path.join(data_dir, 'watermark_previews')).load()
+
+
+def get_report_dir():
+    """获取性能报告目录data/reports"""
+    return os.path.join(get_application_path(), 'data', 'reports')
+
+
+def load_config(config_path=None):
+    """
+    读取配置文件
+    未指定路径时读取data/config.json，不存在时回退到config/default_config.json
+    """
+    candidates = [config_path] if config_path else [
+        get_config_path(),
+        os.path.join(get_application_path(), 'config', 'default_config.json'),
+        os.path.join(get_application_path(), '_internal', 'config', 'default_config.json'),
+    ]
+    for path in candidates:
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    if config_path:
+        raise WatermarkError(f"配置文件不存在: {config_path}")
+    return {}
+
+
+def output_format(ext):
+    """根据输出扩展名确定Pillow的保存格式"""
+    ext = ext.lower()
+    if ext in ['.jpg', '.jpeg']:
+        return "JPEG"
+    if ext == '.png':
+        return "PNG"
+    image_format = Image.registered_extensions().get(ext)
+    if image_format is None:
+        raise ValueError(f"unknown file extension: {ext}")
+    return image_format
+
+
+def resolve_logo_path(use_logo):
+    """
+    根据Use_logo查找水印文件
+    Use_logo可以是data/watermarks中的文件名，也可以是直接指向文件的路径
+    """
+    if os.path.isfile(use_logo):
+        return use_logo
+
+    base_dir = get_application_path()
+    logo_path = os.path.join(base_dir, 'data', 'watermarks', use_logo)
+
+    # 如果在打包环境中且data目录不存在，则尝试_internal目录
+    if not os.path.exists(logo_path) and getattr(sys, 'frozen', False):
+        # 检查_internal目录中的路径
+        internal_logo_path = os.path.join(base_dir, '_internal', 'data', 'watermarks', use_logo)
+        if os.path.exists(internal_logo_path):
+            logo_path = internal_logo_path
+    return logo_path
+
+
+def calculate_logo_position(image, logo, x_pos, y_pos, bottom_margin=0):
+    """计算水印位置 (PIL版本)"""
+    image_width, image_height = image.size
+    logo_width, logo_height = logo.size
+
+    # 计算x坐标
+    if x_pos == 0:  # 居中
+        logo_x = (image_width - logo_width) // 2
+    elif x_pos == 1:  # 靠左
+        logo_x = 0
+    elif x_pos == 2:  # 靠右
+        logo_x = image_width - logo_width
+    else:
+        logo_x = 0
+
+    # 计算y坐标
+    if y_pos == 0:  # 居中
+        logo_y = (image_height - logo_height) // 2
+    elif y_pos == 1:  # 靠上
+        logo_y = 0
+    elif y_pos == 2:  # 靠下
+        # 使用百分比计算底部边距
+        bottom_margin_px = int((bottom_margin / 100.0) * image_height) if bottom_margin else 0
+        logo_y = image_height - logo_height - bottom_margin_px  # 考到底部边距
+    else:
+        logo_y = 0
+
+    return logo_x, logo_y
+
+
+def choose_watermark_color(avg_brightness, is_light_watermark):
+    """
+    根据背景亮度和水印明暗决定水印颜色
+    目标是确保水印与背景有足够的对比度
+    :return: 'white'、'black'，保持原样时返回None
+    """
+    # 特殊处理：如果背景非常亮（如纯白）且水印是浅色（如白色）
+    # 则必须将水印转为深色以确保可见性
+    if avg_brightness >= 200 and is_light_watermark:
+        return 'black'
+
+    if avg_brightness < 85:  # 背景很暗
+        # 在暗背景下，使用浅色水印提高可见性，深色水印转为浅色
+        return None if is_light_watermark else 'white'
+    elif avg_brightness >= 170:  # 背景很亮
+        # 在亮背景下，使用深色水印提高可见性，浅色水印转为深色
+        return 'black' if is_light_watermark else None
+    else:  # 背景是中等亮度
+        # 对于中等亮度背景，基于水印颜色做轻微调整
+        if is_light_watermark and avg_brightness >= 128:
+            # 浅色水印在偏亮的中等亮度背景下，变为深色
+            return 'black'
+        elif not is_light_watermark and avg_brightness < 128:
+            # 深色水印在偏暗的中等亮度背景下，变为浅色
+            return 'white'
+        # 其他情况保持原样
+        return None
+
+
+def adjust_watermark_color(background_image, watermark, logo_x, logo_y, accuracy=DEFAULT_ACCURACY):
+    """
+    根据背景明暗度选择水印颜色
+    确保水印在各种背景下都有良好的可见性
+    :param watermark: PreparedWatermark，明暗分类和反色版本已预先计算
+    :param accuracy: 背景亮度采样精度，见luminance.ACCURACY_SAMPLES
+    :return: 要粘贴的水印图像
+    """
+    try:
+        # 统计水印将要放置的背景区域的亮度 (0-255)
+        watermark_width, watermark_height = watermark.size
+        stats = measure_region(background_image,
+                               (logo_x, logo_y, logo_x + watermark_width, logo_y + watermark_height),
+                               accuracy)
+
+        # 如果水印完全在图像外部，则直接返回原水印
+        if stats is None:
+            return watermark.image
+
+        return watermark.variant(choose_watermark_color(stats.mean, watermark.is_light))
+
+    except Exception as e:
+        print(f"调整水印颜色时出错: {e}")
+        # 出错时返回原始水印
+        return watermark.image
+
+
+class BatchItem:
+    """在管道各阶段之间传递的单张图片"""
+
+    def __init__(self, image_path, display_name):
+        self.image_path = image_path
+        self.display_name = display_name
+        self.ext = ''
+        self.output_path = None
+        self.data = None  # 读入内存的原始文件
+        self.image = None  # 解码后的图像
+        self.encoded = None  # 编码后的输出文件
+        self.region = False  # 是否使用JPEG区域无损模式
+        self.done = False  # 输出是否已写入
+        self.skipped = False  # 输出已是最新，跳过处理
+        self.duplicate_of = None  # 与之内容相同、实际处理的图片的显示名称
+        self.source_stat = None  # 输入文件的stat结果，用于增量清单
+        self.digest = None  # 输入文件的内容指纹
+        self.timings = {}  # 各阶段耗时（秒）
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.pixels = 0
+
+    def release(self):
+        """释放该图片占用的内存"""
+        if self.image is not None:
+            self.image.close()
+            self.image = None
+        self.data = None
+        self.encoded = None
+
+
+class WatermarkEngine:
+    """
+    水印批处理引擎
+    用法：engine = WatermarkEngine(config); engine.prepare(); engine.run(jobs)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.watermark = None
+        self.encoder_profile = None
+        self.manifest = None
+        self.config_hash = None
+        self.skipped_count = 0
+        self.metrics = BatchMetrics()
+        self.report_path = None
+        self._pipeline = None
+
+    @property
+    def out_path(self):
+        return self.config.get('Out_path', '')
+
+    def prepare(self, output=True):
+        """
+        检查配置并加载、缩放水印，配置不完整时抛出WatermarkError
+        :param output: 为False时只在内存中处理图片（process_bytes），不需要输出目录和增量清单
+        """
+        self.metrics = BatchMetrics()
+        use_logo = self.config.get('Use_logo', '')
+        out_path = self.out_path
+        logo_size = self.config.get('Logo_size', {})
+
+        # 检查必要配置
+        if not use_logo:
+            raise WatermarkError("未选择水印图片")
+
+        if output and not out_path:
+            raise WatermarkError("未设置输出路径")
+
+        # 获取输出编码配置
+        self.encoder_profile = get_profile(self.config)
+        if self.encoder_profile is None:
+            raise WatermarkError(f"编码配置不存在: {self.config.get('Encoder_profile')}")
+
+        # 确保输出目录存在
+        if output:
+            os.makedirs(out_path, exist_ok=True)
+
+        # 加载水印图片
+        logo_path = resolve_logo_path(use_logo)
+        if not os.path.exists(logo_path):
+            raise WatermarkError(f"水印图片不存在: {logo_path}")
+
+        # 获取水印尺寸
+        width = logo_size.get('width', 100)
+        height = logo_size.get('height', 100)
+
+        # 从缓存获取预处理水印，同一水印和尺寸在多个批次间只缩放、分析一次
+        auto_invert = self.config.get('Auto_invert', False)
+        # 首次使用时在这里完成LANCZOS缩放和反色版本生成，计入prepare阶段
+        # 明暗分类在缩放后的水印上计算，不使用索引中按原图计算的结果，阈值附近的水印两者可能不同
+        with timed(self.metrics.batch_timings, 'prepare'):
+            self.watermark = get_prepared_watermark(logo_path, (width, height), with_variants=bool(auto_invert))
+
+        # 加载增量处理清单，记录每个输出对应的输入指纹和配置哈希
+        self.config_hash = config_fingerprint(self.config, logo_path, self.encoder_profile)
+        if output:
+            self.manifest = Manifest(get_manifest_path()).load()
+
+    def close(self):
+        """释放对预处理水印的引用，水印本身保留在缓存中供后续批次复用"""
+        self.watermark = None
+        self.manifest = None
+
+    def resolve_worker_count(self, total_count):
+        """
+        根据配置计算工作线程数
+        Workers 为 0 或未设置时使用CPU核心数，为 1 时退化为串行处理
+        """
+        try:
+            workers = int(self.config.get('Workers', 0) or 0)
+        except (TypeError, ValueError):
+            workers = 0
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        return max(1, min(workers, total_count))
+
+    def build_pipeline(self, workers):
+        """
+        构建 读盘 -> 解码 -> 合成 -> 编码 -> 写盘 处理管道
+        各阶段并发数来自Pipeline_workers，为0时使用workers；队列容量来自Pipeline_queue_size
+        """
+        stage_workers = dict(DEFAULT_STAGE_WORKERS)
+        stage_workers.update(self.config.get('Pipeline_workers') or {})
+        functions = {
+            'read': self._read_stage,
+            'decode': self._decode_stage,
+            'composite': self._composite_stage,
+            'encode': self._encode_stage,
+            'write': self._write_stage,
+        }
+        stages = []
+        for name in PIPELINE_STAGES:
+            try:
+                count = int(stage_workers.get(name) or 0)
+            except (TypeError, ValueError):
+                count = 0
+            stages.append(PipelineStage(name, functions[name], count if count > 0 else workers))
+        return Pipeline(stages, self.config.get('Pipeline_queue_size', DEFAULT_QUEUE_SIZE))
+
+    def cancel(self):
+        """停止向管道投递新图片，已在处理中的图片会继续完成"""
+        if self._pipeline is not None:
+            self._pipeline.cancel()
+
+    def run(self, image_paths_with_names, on_progress=None, on_error=None, journal=None):
+        """
+        批量处理图片
+        :param image_paths_with_names: [(image_path, display_name), ...]
+        :param on_progress: 回调 (已完成数量, 总数量)
+        :param on_error: 回调 (错误信息)
+        :param journal: BatchJournal，每处理完一张图片追加一条记录，用于中断后恢复
+        :return: 成功处理的图片数量
+        """
+        total_count = len(image_paths_with_names)
+        success_count = 0
+        done_count = 0
+        self.skipped_count = 0
+        self.report_path = None
+
+        # 内容去重：重复的图片不进入处理流程，原图处理完成后再链接或跳过
+        jobs, duplicates = self._find_duplicates(image_paths_with_names)
+
+        def finish(item, error):
+            nonlocal success_count, done_count
+            for entry, entry_error in self._with_duplicates(item, error, duplicates.pop(item.display_name, ())):
+                done_count += 1
+                self.metrics.add_item(entry, entry_error)
+                if journal is not None:
+                    journal.record(entry.display_name, entry_error is None, str(entry_error) if entry_error else None)
+                if entry_error is None:
+                    success_count += 1
+                    self.skipped_count += entry.skipped
+                elif on_error:
+                    on_error(f"处理图片 {entry.image_path} 时出错: {str(entry_error)}")
+                # 发送进度
+                if on_progress:
+                    on_progress(done_count, total_count)
+            # 定期保存增量清单，批次中途崩溃或被终止时已处理的图片下次不必重新处理
+            if self.manifest is not None:
+                try:
+                    self.manifest.maybe_save()
+                except OSError as e:
+                    print(f"保存处理清单时出错: {e}")
+
+        # 根据配置决定并行线程数（Pillow在解码和编码时会释放GIL）
+        workers = self.resolve_worker_count(len(jobs))
+
+        if workers <= 1:
+            # 串行处理每张图片
+            try:
+                for image_path, display_name in jobs:
+                    item = BatchItem(image_path, display_name)
+                    try:
+                        self.process_item(item)
+                    except Exception as e:
+                        finish(item, e)
+                    else:
+                        finish(item, None)
+            finally:
+                self._finish_batch()
+        else:
+            # 流水线并行处理：读盘、解码、合成、编码、写盘同时进行，有界队列限制内存占用
+            # 每张图片都基于同一个原始水印计算，输出与串行一致
+            self._pipeline = self.build_pipeline(workers)
+            items = (BatchItem(image_path, display_name) for image_path, display_name in jobs)
+            try:
+                for item, error in self._pipeline.run(items):
+                    if error is not None:
+                        item.release()
+                    finish(item, error)
+            finally:
+                self._pipeline = None
+                self._finish_batch()
+
+        return success_count
+
+    def _find_duplicates(self, jobs):
+        """
+        按Dedupe配置查找重复的图片
+        :return: (需要处理的任务, {保留图片的显示名称: [重复的 (image_path, display_name), ...]})
+        """
+        mode = self.config.get('Dedupe', 'off')
+        if mode not in ('exact', 'perceptual'):
+            return list(jobs), {}
+        try:
+            threshold = int(self.config.get('Dedupe_threshold', DEFAULT_PERCEPTUAL_THRESHOLD))
+        except (TypeError, ValueError):
+            threshold = DEFAULT_PERCEPTUAL_THRESHOLD
+        with timed(self.metrics.batch_timings, 'dedupe'):
+            return find_duplicates(jobs, mode, threshold, self.resolve_worker_count(len(jobs)))
+
+    def _with_duplicates(self, item, error, duplicates):
+        """依次产出处理完成的图片及其重复图片的结果 (BatchItem, 错误)"""
+        yield item, error
+        for image_path, display_name in duplicates:
+            duplicate = BatchItem(image_path, display_name)
+            duplicate.duplicate_of = item.display_name
+            if error is not None:
+                yield duplicate, WatermarkError(f"与 {item.display_name} 内容相同，该图片处理失败: {error}")
+                continue
+            try:
+                self._write_duplicate(duplicate, item.output_path)
+            except Exception as e:
+                yield duplicate, e
+            else:
+                yield duplicate, None
+
+    def _write_duplicate(self, item, source_output):
+        """
+        为重复的图片生成输出：硬链接到原图的输出，文件系统不支持硬链接（如FAT32、跨分区）时复制
+        Dedupe_action为skip时不生成输出
+        """
+        item.ext, item.output_path = self._output_path(item.display_name)
+        if self.config.get('Dedupe_action', 'link') == 'skip':
+            return
+        if os.path.exists(item.output_path) and os.path.samefile(item.output_path, source_output):
+            return
+        with timed(item.timings, 'write'):
+            with atomic_output(item.output_path) as temp_path:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                try:
+                    os.link(source_output, temp_path)
+                except OSError:
+                    shutil.copyfile(source_output, temp_path)
+
+    def process_image(self, image_path, display_name):
+        """
+        为单张图片添加水印并保存，依次执行管道的各个阶段
+        :return: 输出文件路径
+        """
+        return self.process_item(BatchItem(image_path, display_name))
+
+    def process_item(self, item):
+        """依次执行管道的各个阶段处理一个BatchItem"""
+        try:
+            for stage in (self._read_stage, self._decode_stage, self._composite_stage,
+                          self._encode_stage, self._write_stage):
+                stage(item)
+            return item.output_path
+        finally:
+            # 显式关闭图片以释放内存
+            item.release()
+
+    def process_bytes(self, data):
+        """
+        在内存中为一张图片添加水印，不读写磁盘，可在多个线程中同时调用
+        需要先调用 prepare(output=False)
+        :param data: 原始图片文件内容
+        :return: (输出文件内容, 格式名如JPEG)，输出格式与输入相同（MPO输出为JPEG）
+        """
+        item = BatchItem('<memory>', 'memory')
+        item.data = data
+        try:
+            self._decode_stage(item)
+            item.ext = FORMAT_EXTENSIONS.get(item.image.format)
+            if item.ext is None:
+                raise ValueError(f"不支持的图片格式: {item.image.format}")
+            self._composite_stage(item)
+            self._encode_stage(item)
+            return item.encoded, output_format(item.ext)
+        finally:
+            item.release()
+
+    def _output_path(self, display_name):
+        """
+        根据显示名称确定输出路径
+        从文件夹添加的图片显示名称带有子目录（用/分隔），输出到输出目录中相同的子目录
+        :return: (扩展名, 输出路径)
+        """
+        subdir, filename = posixpath.split(display_name)
+        name, ext = os.path.splitext(filename)
+        out_dir = self.out_path
+        if subdir:
+            parts = [part for part in subdir.split('/') if part not in ('', '.', '..')]
+            out_dir = os.path.join(self.out_path, *parts)
+            os.makedirs(out_dir, exist_ok=True)
+        return ext, os.path.join(out_dir, f"{name}_watermarked{ext}")
+
+    def _read_stage(self, item):
+        """读盘阶段：确定输出路径并把原始文件读入内存"""
+        # 保存图片，使用显示名称而不是原始文件名
+        item.ext, item.output_path = self._output_path(item.display_name)
+
+        # 增量处理：输入、输出和配置都未变化时跳过，只需stat和一次查找
+        item.source_stat = os.stat(item.image_path)
+        if self.config.get('Incremental', True) and self.manifest is not None and self.manifest.is_current(
+                item.image_path, item.source_stat, item.output_path, self.config_hash):
+            item.skipped = True
+            item.done = True
+            return item
+
+        # JPEG区域无损模式由jpegtran直接读取文件，不需要读入内存
+        if self._get_jpegtran(item.ext):
+            item.region = True
+            return item
+
+        with timed(item.timings, 'read'):
+            with open(item.image_path, 'rb') as f:
+                item.data = f.read()
+            if self.manifest is not None:
+                item.digest = file_fingerprint(data=item.data)
+        item.bytes_read = len(item.data)
+        return item
+
+    def _decode_stage(self, item):
+        """解码阶段"""
+        if item.region or item.done:
+            return item
+        with timed(item.timings, 'decode'):
+            item.image = Image.open(io.BytesIO(item.data))
+            item.image.load()
+        item.pixels = item.image.width * item.image.height
+        item.data = None
+        return item
+
+    def _composite_stage(self, item):
+        """合成阶段：计算位置并粘贴水印"""
+        if item.done:
+            return item
+        if item.region:
+            # JPEG区域无损模式：只重新编码水印覆盖的MCU块，失败时回退到整图处理
+            if self._composite_region(item):
+                return item
+            item.region = False
+            with timed(item.timings, 'decode'):
+                item.image = Image.open(item.image_path)
+                item.image.load()
+            item.pixels = item.image.width * item.image.height
+            item.bytes_read = item.source_stat.st_size
+
+        logo_x, logo_y = self._logo_position(item.image)
+        self._compose(item.image, logo_x, logo_y, item.timings)
+        return item
+
+    def _encode_stage(self, item):
+        """编码阶段：按输出格式和编码配置编码到内存，保留EXIF信息"""
+        if item.done:
+            return item
+
+        image = item.image
+
+        # 根据输出扩展名确定格式
+        image_format = output_format(item.ext)
+
+        # 按当前编码配置生成保存参数（默认配置：JPEG最高质量、PNG不优化、其他格式使用默认设置）
+        save_kwargs = build_save_kwargs(self.encoder_profile, image_format, image)
+        # 获取EXIF信息
+        exif_data = image.info.get('exif')
+        if exif_data:
+            save_kwargs['exif'] = exif_data
+
+        with timed(item.timings, 'encode'):
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, **save_kwargs)
+            item.encoded = buffer.getvalue()
+
+        # 编码完成后立即释放解码后的图像
+        image.close()
+        item.image = None
+        return item
+
+    def _write_stage(self, item):
+        """写盘阶段：写入输出并记入增量清单"""
+        if item.skipped:
+            return item
+        if not item.done:
+            with timed(item.timings, 'write'):
+                with atomic_output(item.output_path) as temp_path:
+                    with open(temp_path, 'wb') as f:
+                        f.write(item.encoded)
+            item.bytes_written = len(item.encoded)
+            item.encoded = None
+            item.done = True
+
+        if self.manifest is not None:
+            # JPEG区域无损模式没有把输入读入内存，此时再计算内容指纹
+            digest = item.digest or file_fingerprint(item.image_path)
+            self.manifest.record(item.image_path, item.source_stat, digest, item.output_path, self.config_hash)
+        return item
+
+    def _finish_batch(self):
+        """批次结束（包括中途出错或取消）时保存增量清单和性能报告"""
+        self.metrics.finish()
+        if self.manifest is not None:
+            try:
+                self.manifest.save()
+            except OSError as e:
+                print(f"保存处理清单时出错: {e}")
+
+        if self.config.get('Performance_report', True):
+            try:
+                self.report_path = self.metrics.write_report(get_report_dir(), self.config)
+            except OSError as e:
+                print(f"保存性能报告时出错: {e}")
+
+    def _composite_region(self, item):
+        """
+        使用jpegtran只处理水印覆盖的区域
+        :return: 成功时返回True，输出已写入
+        """
+        with Image.open(item.image_path) as header:
+            # 只读取文件头即可得到尺寸；手机和相机拍摄的JPEG常被识别为MPO，jpegtran只处理其中的主图
+            if header.format not in ('JPEG', 'MPO'):
+                return False
+            logo_x, logo_y = self._logo_position(header)
+            pixels = header.width * header.height
+
+        width, height = self.watermark.size
+        box = (logo_x, logo_y, logo_x + width, logo_y + height)
+
+        def compose(region, offset_x, offset_y):
+            self._compose(region, offset_x, offset_y, item.timings)
+
+        try:
+            # region阶段包含jpegtran裁剪、拼回以及区域的编解码，其中的analyze/paste另行统计
+            with timed(item.timings, 'region'):
+                with atomic_output(item.output_path) as temp_path:
+                    watermark_region(self._get_jpegtran(item.ext), item.image_path, temp_path, box, compose)
+        except JpegRegionError as e:
+            print(f"区域无损处理 {item.image_path} 失败，改为整图处理: {e}")
+            return False
+        item.pixels = pixels
+        item.bytes_read = item.source_stat.st_size
+        item.bytes_written = os.path.getsize(item.output_path)
+        item.done = True
+        return True
+
+    def _logo_position(self, image):
+        """根据配置计算水印在图片中的位置"""
+        logo_bottom = self.config.get('Logo_bottom', 0)  # 获取底部距离配置
+        logo_xy = self.config.get('Logo_xy', {})
+
+        # 获取水印位置
+        x_pos = logo_xy.get('x', 0)  # 0:居中, 1:靠左, 2:靠右
+        y_pos = logo_xy.get('y', 0)  # 0:居中, 1:靠上, 2:靠下
+        return calculate_logo_position(image, self.watermark, x_pos, y_pos, logo_bottom)
+
+    def _compose(self, image, logo_x, logo_y, timings=None):
+        """
+        在图片上原地粘贴水印，整图处理和JPEG区域处理共用
+        :param logo_x/logo_y: 水印左上角在image中的位置，可以为负数或超出图片
+        :param timings: 记录亮度分析和粘贴耗时的字典
+        """
+        timings = {} if timings is None else timings
+        watermark = self.watermark
+        auto_invert = self.config.get('Auto_invert', False)  # 获取自动反色配置
+        invert_accuracy = self.config.get('Invert_accuracy', DEFAULT_ACCURACY)  # 背景亮度采样精度
+
+        # 如果启用了自动反色功能，则根据背景明暗选择预先生成的反色水印
+        logo_image = watermark.image
+        if auto_invert:
+            with timed(timings, 'analyze'):
+                logo_image = adjust_watermark_color(image, watermark, logo_x, logo_y, invert_accuracy)
+
+        # 如果水印有alpha通道，则使用alpha通道作为mask
+        with timed(timings, 'paste'):
+            if logo_image.mode == 'RGBA':
+                image.paste(logo_image, (logo_x, logo_y), logo_image)
+            else:
+                image.paste(logo_image, (logo_x, logo_y))
+
+    def _get_jpegtran(self, ext):
+        """判断输出格式能否使用JPEG区域无损模式，可以时返回jpegtran路径"""
+        if not self.config.get('Jpeg_lossless', False):
+            return None
+        if ext.lower() not in ('.jpg', '.jpeg'):
+            return None
+        return find_jpegtran(self.config.get('Jpegtran_path', ''))
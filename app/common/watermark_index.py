@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+水印库索引
+
+data/watermark_index.json 记录 data/watermarks 中每个水印的元数据：
+尺寸、颜色模式、是否有透明通道及不透明区域的范围、平均亮度和明暗分类、内容哈希，
+以及预先生成的预览图（保存在 data/watermark_previews 中，按内容哈希命名，重命名水印不需要重新生成）。
+
+导入、重命名、删除水印时增量更新；sync() 只需一次目录遍历和stat()，
+只有新增或修改过的水印才会重新解码分析。水印管理页面从索引读取，不需要重复分析水印文件。
+本模块只依赖Pillow，不依赖Qt。
+"""
+
+import json
+import os
+import threading
+
+from PIL import Image, ImageStat
+
+from app.common.atomic_file import atomic_output, atomic_write
+from app.common.dedupe import full_digest
+
+INDEX_VERSION = 1
+
+# 同步时每分析这么多个水印保存一次，中途退出时已分析的结果不会丢失
+SYNC_SAVE_INTERVAL = 20
+
+# 水印库支持的图片格式
+WATERMARK_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+# 预览图最大尺寸
+PREVIEW_SIZE = (120, 120)
+
+
+def analyse_watermark(logo_path, preview_dir):
+    """
+    解码并分析水印文件，同时生成预览图
+    :return: 索引记录
+    """
+    stat = os.stat(logo_path)
+    digest = full_digest(logo_path)
+    with Image.open(logo_path) as image:
+        image.load()
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        alpha_bbox = None
+        if has_alpha:
+            alpha_bbox = image.convert('RGBA').getchannel('A').getbbox()
+        # 按原图计算的明暗分类，只用于水印库的显示；处理图片时在缩放后的水印上重新计算
+        lightness = ImageStat.Stat(image.convert('L')).mean[0]
+
+        preview_name = f"{digest[:32]}.png"
+        preview_path = os.path.join(preview_dir, preview_name)
+        if not os.path.exists(preview_path):
+            preview = image.convert('RGBA') if has_alpha else image.convert('RGB')
+            preview.thumbnail(PREVIEW_SIZE, Image.LANCZOS)
+            os.makedirs(preview_dir, exist_ok=True)
+            with atomic_output(preview_path) as temp_path:
+                preview.save(temp_path, 'PNG')
+
+        return {
+            'file_size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'width': image.width,
+            'height': image.height,
+            'mode': image.mode,
+            'has_alpha': has_alpha,
+            'alpha_bbox': list(alpha_bbox) if alpha_bbox else None,
+            'lightness': round(lightness, 3),
+            'is_light': lightness >= 128,
+            'hash': digest,
+            'preview': preview_name,
+        }
+
+
+class WatermarkIndex:
+    """
+    水印库索引，以文件名为键，保持文件加入索引的顺序
+    可以在多个线程中同时使用，每次修改后原子替换索引文件
+    """
+
+    def __init__(self, directory, index_path, preview_dir):
+        self.directory = directory
+        self.index_path = index_path
+        self.preview_dir = preview_dir
+        self.entries = {}
+        self._lock = threading.RLock()
+
+    def load(self):
+        """读取索引文件，不存在或损坏时为空索引"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError) as e:
+            print(f"读取水印索引时出错: {e}")
+            data = {}
+        with self._lock:
+            self.entries = data.get('entries', {}) if data.get('version') == INDEX_VERSION else {}
+        return self
+
+    def save(self):
+        """
+        先写入临时文件再原子替换，写入过程中崩溃不会损坏索引
+        替换完成前一直持有锁，较早的快照不会覆盖其他线程刚保存的较新内容
+        """
+        with self._lock:
+            payload = json.dumps({'version': INDEX_VERSION, 'entries': self.entries}, ensure_ascii=False, indent=2)
+            try:
+                atomic_write(self.index_path, payload)
+            except OSError as e:
+                print(f"保存水印索引时出错: {e}")
+
+    def filenames(self):
+        with self._lock:
+            return list(self.entries)
+
+    def get(self, filename):
+        with self._lock:
+            return self.entries.get(filename)
+
+    def preview_path(self, filename):
+        """预览图路径，水印不在索引中时返回None"""
+        entry = self.get(filename)
+        return os.path.join(self.preview_dir, entry['preview']) if entry else None
+
+    def add(self, filename, save=True):
+        """分析水印库中的文件并加入索引（已存在时更新）"""
+        entry = analyse_watermark(os.path.join(self.directory, filename), self.preview_dir)
+        with self._lock:
+            old_entry = self.entries.get(filename)
+            self.entries[filename] = entry
+        if old_entry is not None and old_entry['preview'] != entry['preview']:
+            # 文件内容变化，旧预览图不再需要
+            self._drop_preview(old_entry['preview'])
+        if save:
+            self.save()
+        return entry
+
+    def rename(self, old_filename, new_filename):
+        """水印重命名后更新索引，内容和预览图不变"""
+        with self._lock:
+            entry = self.entries.pop(old_filename, None)
+            if entry is None:
+                return
+            self.entries[new_filename] = entry
+        self.save()
+
+    def remove(self, filename):
+        """水印删除后移出索引，预览图没有其他水印使用时一并删除"""
+        with self._lock:
+            entry = self.entries.pop(filename, None)
+        if entry is None:
+            return
+        self._drop_preview(entry['preview'])
+        self.save()
+
+    def _drop_preview(self, preview):
+        """删除没有水印再使用的预览图（内容相同的水印共用一个预览图）"""
+        with self._lock:
+            if any(entry['preview'] == preview for entry in self.entries.values()):
+                return
+        try:
+            os.remove(os.path.join(self.preview_dir, preview))
+        except OSError:
+            pass
+
+    def sync(self, on_updated=None, on_removed=None, stop_event=None):
+        """
+        与水印目录同步：新增或修改过的文件重新分析，已不存在的文件移出索引
+        :param on_updated: 回调 (文件名, 记录)，每分析完一个水印调用一次
+        :param on_removed: 回调 (文件名)
+        :return: 是否有变化
+        """
+        try:
+            with os.scandir(self.directory) as it:
+                files = {entry.name: entry.stat() for entry in it
+                         if entry.is_file() and entry.name.lower().endswith(WATERMARK_EXTENSIONS)}
+        except OSError as e:
+            print(f"读取水印目录时出错: {e}")
+            return False
+
+        changed = False
+        unsaved = 0
+        for filename in self.filenames():
+            if filename not in files:
+                self.remove(filename)
+                changed = True
+                if on_removed:
+                    on_removed(filename)
+
+        for filename, stat in files.items():
+            if stop_event is not None and stop_event.is_set():
+                break
+            entry = self.get(filename)
+            if entry is not None and entry['file_size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                continue
+            try:
+                entry = self.add(filename, save=False)
+            except Exception as e:
+                print(f"分析水印 {filename} 时出错: {e}")
+                continue
+            changed = True
+            unsaved += 1
+            if unsaved >= SYNC_SAVE_INTERVAL:
+                self.save()
+                unsaved = 0
+            if on_updated:
+                on_updated(filename, entry)
+
+        if unsaved:
+            self.save()
+        return changed
@@ -1,112 +1,255 @@
-from PyQt6.QtCore import Qt, QMimeData, QUrl, QObject, QThread, pyqtSignal, QTimer
-from PyQt6.QtGui import QPixmap
-from PyQt6.QtWidgets import QScrollArea, QWidget, QLabel, QVBoxLayout, QApplication, QSizePolicy
-from qfluentwidgets import FlowLayout, RoundMenu, Action, FluentIcon
+from collections import OrderedDict
+
+from PyQt6.QtCore import Qt, QSize, QRect, QThread, QAbstractListModel, QModelIndex, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QPainter, QPainterPath, QPixmap
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+from qfluentwidgets import RoundMenu, Action, FluentIcon, isDarkTheme, themeColor
 import os
-import re
-
-class ProcessedImageData:
-    """处理后的图片数据"""
-    def __init__(self, image_path, filename, display_filename=None, pixmap=None, error=None):
-        self.image_path = image_path
-        self.filename = filename  # 原始文件名
-        self.display_filename = display_filename or filename  # 显示用的文件名
-        self.pixmap = pixmap
-        self.error = error
-
-class ImageProcessor(QObject):
-    """图片处理器，用于在单独线程中处理图片"""
-    finished = pyqtSignal(ProcessedImageData)
-    error = pyqtSignal(str)
-    processing_done = pyqtSignal()
-
-    def __init__(self):
-        super().__init__()
-        self.file_queue = []
-
-    def process_images(self, file_map):
-        """处理图片文件列表
-        Args:
-            file_map: dict, {file_path: display_filename} 文件路径和显示名称的映射
+import threading
+import time
+
+from app.common.folder_scan import iter_input_files
+from app.common.image_collection import ImageCollection
+from app.components.thumbnailLoader import ImageProcessor
+
+# 卡片中缩略图的最大尺寸
+THUMBNAIL_SIZE = QSize(200, 100)
+# 卡片尺寸（含缩略图和文件名）
+CARD_SIZE = QSize(206, 150)
+# 内存中最多保留的缩略图数量，超出后淘汰最久未显示的，需要时再从磁盘缓存读取
+MAX_CACHED_PIXMAPS = 600
+# 一次删除中不连续区间超过这个数量时重置模型
+MAX_REMOVE_RANGES = 50
+# 扫描文件夹时每批交给列表的最大图片数和最长间隔（秒）
+SCAN_BATCH_SIZE = 500
+SCAN_BATCH_INTERVAL = 0.1
+
+
+class FolderScanner(QThread):
+    """
+    在后台线程中递归枚举拖入的文件夹
+    找到的图片分批发给列表，遍历很大的目录树时第一批缩略图就可以开始显示
+    """
+    found = pyqtSignal(list)  # [(image_path, subdir), ...]
+
+    def __init__(self, directories, parent=None):
+        super().__init__(parent)
+        self.directories = directories
+        self._stop_event = threading.Event()
+
+    def run(self):
+        batch = []
+        last_emit = time.monotonic()
+        for entry in iter_input_files(self.directories, self._stop_event):
+            batch.append(entry)
+            if len(batch) >= SCAN_BATCH_SIZE or time.monotonic() - last_emit >= SCAN_BATCH_INTERVAL:
+                self.found.emit(batch)
+                batch = []
+                last_emit = time.monotonic()
+        if batch and not self._stop_event.is_set():
+            self.found.emit(batch)
+
+    def stop(self):
+        """停止扫描，已发出但还未处理的批次由接收方丢弃"""
+        self._stop_event.set()
+
+
+class ImageListModel(QAbstractListModel):
+    """
+    已添加图片的列表模型，数据保存在ImageCollection中
+    缩略图在视图请求时（即图片可见时）才加载，内存中只保留最近显示的一部分
+    """
+    ImagePathRole = Qt.ItemDataRole.UserRole + 1
+    ErrorRole = Qt.ItemDataRole.UserRole + 2
+
+    def __init__(self, collection, processor, parent=None):
+        super().__init__(parent)
+        self.collection = collection
+        self.processor = processor
+        self.processor.finished.connect(self._on_thumbnail)
+        self._pixmaps = OrderedDict()  # image_path -> QPixmap，按最近使用排序
+        self._errors = {}  # image_path -> 错误信息
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.collection)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        image_path, display_filename = self.collection.at(index.row())
+        if role == Qt.ItemDataRole.DisplayRole:
+            return display_filename
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self._pixmaps.get(image_path)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(image_path)
+            elif image_path not in self._errors:
+                self.processor.request(image_path)
+            return pixmap
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return image_path
+        if role == self.ImagePathRole:
+            return image_path
+        if role == self.ErrorRole:
+            return self._errors.get(image_path)
+        return None
+
+    def add_images(self, image_paths):
+        """
+        一次性插入多张图片，已存在的路径会被跳过
+        :param image_paths: 图片路径，或文件夹扫描产出的 (image_path, subdir)
+        :return: 实际添加的 [(image_path, display_filename), ...]
+        """
+        # 插入前先确定新增的行数
+        entries = {}
+        for entry in image_paths:
+            path, subdir = entry if isinstance(entry, tuple) else (entry, '')
+            if path and path not in self.collection and path not in entries:
+                entries[path] = subdir
+        if not entries:
+            return []
+        start = len(self.collection)
+        self.beginInsertRows(QModelIndex(), start, start + len(entries) - 1)
+        added = self.collection.extend(entries.items())
+        self.endInsertRows()
+        return added
+
+    def remove_rows(self, rows):
         """
-        self.file_queue = list(file_map.items())
-        self._process_next()
-
-    def _process_next(self):
-        """处理队列中的下一个文件"""
-        if self.file_queue:
-            file_path, display_filename = self.file_queue.pop(0)
-            if os.path.isfile(file_path):
-                filename = os.path.basename(file_path)  # 原始文件名
-                
-                try:
-                    pixmap = QPixmap(file_path)
-                    if not pixmap.isNull():
-                        scaled_pixmap = pixmap.scaled(
-                            200, 100, 
-                            Qt.AspectRatioMode.KeepAspectRatio, 
-                            Qt.TransformationMode.SmoothTransformation
-                        )
-                        processed_data = ProcessedImageData(file_path, filename, display_filename, scaled_pixmap)
-                    else:
-                        processed_data = ProcessedImageData(file_path, filename, display_filename, error="图片加载失败")
-                except Exception as e:
-                    processed_data = ProcessedImageData(file_path, filename, display_filename, error=f"处理图片时出错: {str(e)}")
-                
-                self.finished.emit(processed_data)
-            else:
-                self.error.emit(f"文件不存在: {file_path}")
-            
-            QTimer.singleShot(10, self._process_next)
+        删除多行，连续的行合并为一次删除
+        不连续的区间过多时改为重置模型，避免视图为每个区间重新布局一次
+        :return: 被删除的 [(image_path, display_filename), ...]
+        """
+        ranges = []
+        rows = sorted(set(rows), reverse=True)
+        index = 0
+        while index < len(rows):
+            last = first = rows[index]
+            while index + 1 < len(rows) and rows[index + 1] == first - 1:
+                index += 1
+                first = rows[index]
+            ranges.append((first, last))
+            index += 1
+
+        removed = []
+        if len(ranges) > MAX_REMOVE_RANGES:
+            self.beginResetModel()
+            for first, last in ranges:
+                removed.extend(self.collection.remove_rows(first, last))
+            self.endResetModel()
+        else:
+            for first, last in ranges:
+                self.beginRemoveRows(QModelIndex(), first, last)
+                removed.extend(self.collection.remove_rows(first, last))
+                self.endRemoveRows()
+
+        for image_path, _ in removed:
+            self._pixmaps.pop(image_path, None)
+            self._errors.pop(image_path, None)
+        return removed
+
+    def clear(self):
+        self.beginResetModel()
+        self.collection.clear()
+        self._pixmaps.clear()
+        self._errors.clear()
+        self.endResetModel()
+
+    def _on_thumbnail(self, data):
+        """缩略图加载完成，QPixmap只能在GUI线程中创建"""
+        row = self.collection.row_of(data.image_path)
+        if row is None:
+            return
+        if data.error:
+            self._errors[data.image_path] = data.error
         else:
-            self.processing_done.emit()
+            self._pixmaps[data.image_path] = QPixmap.fromImage(data.image)
+            while len(self._pixmaps) > MAX_CACHED_PIXMAPS:
+                self._pixmaps.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class ImageCardDelegate(QStyledItemDelegate):
+    """绘制图片卡片：圆角背景、居中的缩略图和加粗的文件名"""
+
+    def sizeHint(self, option, index):
+        return CARD_SIZE
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        dark = isDarkTheme()
+        rect = option.rect.adjusted(3, 3, -3, -3)
 
-class AddImgBox(QScrollArea):
-    """可滚动图片容器组件"""
+        # 卡片背景，颜色与原卡片样式一致
+        path = QPainterPath()
+        path.addRoundedRect(rect.toRectF(), 8, 8)
+        painter.fillPath(path, QColor(0, 0, 0, 77) if dark else QColor(255, 255, 255, 204))
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.setPen(themeColor())
+            painter.drawPath(path)
+
+        image_rect = QRect(rect.x(), rect.y() + 8, rect.width(), THUMBNAIL_SIZE.height())
+        error = index.data(ImageListModel.ErrorRole)
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        if error:
+            painter.setPen(QColor('red'))
+            painter.drawText(image_rect, Qt.AlignmentFlag.AlignCenter, error)
+        elif pixmap is not None:
+            target = QRect(0, 0, pixmap.width(), pixmap.height())
+            target.moveCenter(image_rect.center())
+            painter.drawPixmap(target, pixmap)
+
+        font = QFont(option.font)
+        font.setPixelSize(12)
+        font.setBold(True)
+        painter.setFont(font)
+        painter.setPen(QColor('#E9EAEA') if dark else QColor('#333333'))
+        name_rect = QRect(rect.x() + 6, image_rect.bottom() + 4, rect.width() - 12, rect.bottom() - image_rect.bottom() - 4)
+        name = painter.fontMetrics().elidedText(index.data(Qt.ItemDataRole.DisplayRole),
+                                                 Qt.TextElideMode.ElideMiddle, name_rect.width())
+        painter.drawText(name_rect, Qt.AlignmentFlag.AlignCenter, name)
+        painter.restore()
+
+
+class AddImgBox(QListView):
+    """
+    图片网格组件
+    基于模型/视图，只绘制可见的卡片，上万张图片也不会创建上万个控件
+    """
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setObjectName('AddImgBox')
         self.setMinimumHeight(300)
-        
-        self.added_images = set()
-        self.added_filenames = {}  # 用于跟踪已添加的文件名
-        
-        self.scroll_widget = QWidget()
-        self.scroll_widget.setObjectName('scrollWidget')
-        self.setWidget(self.scroll_widget)
-        self.setWidgetResizable(True)
-        
-        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
 
-        self.main_layout = FlowLayout(self.scroll_widget)
-        self.main_layout.setObjectName('mainLayout')
-        self.main_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        self.default_container = QWidget(self.scroll_widget)
-        self.default_container.setObjectName('defaultContainer')
-        container_layout = QVBoxLayout(self.default_container)
-        container_layout.setContentsMargins(0, 0, 0, 0)
-        
-        self.default_label = QLabel('拖拽图片到这里')
-        self.default_label.setObjectName('defaultLabel')
-        self.default_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.default_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
-        
-        container_layout.addWidget(self.default_label)
-        self.default_container.setLayout(container_layout)
-        self.main_layout.addWidget(self.default_container)
+        # 已添加的图片及其显示名称，处理任务也从这里读取
+        self.collection = ImageCollection()
+        self._scanners = set()  # 正在扫描的文件夹
+
+        self.image_processor = ImageProcessor(THUMBNAIL_SIZE)
+        self.image_model = ImageListModel(self.collection, self.image_processor, self)
+        self.setModel(self.image_model)
+        self.setItemDelegate(ImageCardDelegate(self))
+
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setSpacing(4)
+        # 大量插入时分批布局，界面保持响应
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(500)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
 
         self.setAcceptDrops(True)
-        
-        self.thread = QThread()
-        self.image_processor = ImageProcessor()
-        self.image_processor.moveToThread(self.thread)
-        self.image_processor.finished.connect(self.addImageCard)
-        self.image_processor.error.connect(self.handleImageError)
-        
-        self.thread.start()
+        self.setDragDropMode(QAbstractItemView.DragDropMode.DropOnly)
+
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.showCardContextMenu)
 
     def dragEnterEvent(self, event):
         """处理拖入事件"""
@@ -115,176 +258,120 @@ class AddImgBox(QScrollArea):
         else:
             event.ignore()
 
+    def dragMoveEvent(self, event):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+        else:
+            event.ignore()
+
     def dropEvent(self, event):
         """处理拖放事件"""
         mime_data = event.mimeData()
         if mime_data.hasUrls():
-            if self.default_container and self.default_container.parent():
-                self.main_layout.removeWidget(self.default_container)
-                self.default_container.deleteLater()
-                self.default_container = None
-                self.default_label = None
-                
-                self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-                self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-            
-            file_map = {}  # {file_path: display_filename}
-            for url in mime_data.urls():
-                file_path = url.toLocalFile()
-                if file_path not in self.added_images:
-                    self.added_images.add(file_path)
-                    
-                    # 检查文件名是否已存在，如果存在则重命名显示名称
-                    filename = os.path.basename(file_path)
-                    display_filename = filename
-                    if filename in self.added_filenames:
-                        # 文件名已存在，需要重命名显示名称
-                        display_filename = self._rename_duplicate_file(filename)
-                    
-                    # 记录文件名（用于检查重复）
-                    self.added_filenames[display_filename] = file_path
-                    file_map[file_path] = display_filename
-                else:
-                    # 文件已存在，跳过处理
-                    continue
-            
-            if file_map:
-                self.image_processor.process_images(file_map)
-            
+            self.add_paths([url.toLocalFile() for url in mime_data.urls()])
             event.acceptProposedAction()
         else:
             event.ignore()
 
-    def _rename_duplicate_file(self, filename):
-        """
-        重命名重复的文件显示名称
-        
-        Args:
-            filename (str): 原始文件名
-            
-        Returns:
-            str: 重命名后的显示文件名
-        """
-        name, ext = os.path.splitext(filename)
-        
-        # 查找已存在的同名文件数量
-        counter = 1
-        new_filename = f"{name}({counter}){ext}"
-        
-        # 检查显示名称是否已存在
-        existing_display_names = set(self.added_filenames.keys())
-        while new_filename in existing_display_names:
-            counter += 1
-            new_filename = f"{name}({counter}){ext}"
-            
-        return new_filename
-
-    def handleImageError(self, error_msg):
-        """处理图片处理错误"""
-        print(f"图片处理错误: {error_msg}")
+    def add_paths(self, paths):
+        """添加文件和文件夹（拖放、其他实例转发的命令行参数）"""
+        self.add_images(path for path in paths if os.path.isfile(path))
+        directories = [path for path in paths if os.path.isdir(path)]
+        if directories:
+            self.add_folders(directories)
+
+    def add_images(self, file_paths):
+        """添加图片，重复的路径会被跳过，同名文件按 name(1).ext 重命名显示名称"""
+        return self.image_model.add_images(file_paths)
+
+    def add_folders(self, directories):
+        """在后台递归扫描文件夹，找到的图片按子目录结构陆续添加"""
+        scanner = FolderScanner(directories, self)
+        scanner.found.connect(self._on_folder_scanned)
+        scanner.finished.connect(self._on_scan_finished)
+        self._scanners.add(scanner)
+        scanner.start()
+
+    @property
+    def scanning(self):
+        """是否还有文件夹正在扫描"""
+        return bool(self._scanners)
+
+    def _on_folder_scanned(self, entries):
+        # 清空列表后，已停止的扫描线程发出的剩余批次直接丢弃
+        if self.sender() in self._scanners:
+            self.add_images(entries)
+
+    def _on_scan_finished(self):
+        scanner = self.sender()
+        self._scanners.discard(scanner)
+        scanner.deleteLater()
+
+    def _stop_scanners(self):
+        for scanner in self._scanners:
+            scanner.stop()
+        self._scanners.clear()
+
+    def image_paths_with_names(self):
+        """按显示顺序返回 [(image_path, display_filename), ...]"""
+        return self.collection.items()
+
+    def clear_images(self):
+        """清空所有图片"""
+        # 停止扫描文件夹，丢弃还未显示的缩略图
+        self._stop_scanners()
+        self.image_processor.cancel()
+        self.image_model.clear()
 
     def resizeEvent(self, event):
         """处理窗口大小调整事件"""
         super().resizeEvent(event)
-        if hasattr(self, 'default_container') and self.default_container:
-            self.default_container.resize(self.viewport().size())
-            self.default_container.setMinimumSize(self.viewport().size())
-            
-            self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-            self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        
         if self.parent():
             parent_height = self.parent().height()
             self.setFixedHeight(int(parent_height * 0.5))
 
-    def addImageCard(self, processed_data):
-        """添加图片卡片"""
-        card = QWidget()
-        card.setObjectName('imageCard')
-        card.setMinimumSize(206, 120)
-        card.setMaximumWidth(206)
-        
-        card.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        card.customContextMenuRequested.connect(lambda pos: self.showCardContextMenu(card, pos))
-        card.image_path = processed_data.image_path  # 原始路径
-        card.display_filename = processed_data.display_filename  # 显示用的文件名
-        card.original_filename = processed_data.filename  # 原始文件名
-
-        layout = QVBoxLayout(card)
-        layout.setSpacing(5)
-        layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        img_label = QLabel()
-        img_label.setObjectName('imageLabel')
-        
-        if processed_data.error:
-            img_label.setText(processed_data.error)
-            img_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            img_label.setStyleSheet("color: red; border: 1px solid gray;border-radius: 10px;")
+    def paintEvent(self, event):
+        """没有图片时显示拖放提示"""
+        super().paintEvent(event)
+        if not self.collection:
+            painter = QPainter(self.viewport())
+            font = QFont(self.font())
+            font.setPixelSize(14)
+            painter.setFont(font)
+            painter.setPen(QColor('#aaaaaa') if isDarkTheme() else QColor('#666666'))
+            painter.drawText(self.viewport().rect(), Qt.AlignmentFlag.AlignCenter, '拖拽图片到这里')
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key.Key_Delete:
+            self.removeSelected()
         else:
-            img_label.setPixmap(processed_data.pixmap)
-            img_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        # 使用显示名称而不是原始文件名
-        name_label = QLabel(processed_data.display_filename)
-        name_label.setObjectName('nameLabel')
-        name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        layout.addWidget(img_label)
-        layout.addWidget(name_label)
-        
-        self.main_layout.addWidget(card)
-        QApplication.processEvents()
-    
-    def showCardContextMenu(self, card, pos):
+            super().keyPressEvent(event)
+
+    def showCardContextMenu(self, pos):
         """显示卡片上下文菜单"""
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return
+        if not self.selectionModel().isSelected(index):
+            self.setCurrentIndex(index)
+
         menu = RoundMenu(parent=self)
-        
         delete_action = Action(FluentIcon.DELETE, '删除')
-        delete_action.triggered.connect(lambda: self.removeCard(card))
+        delete_action.triggered.connect(self.removeSelected)
         menu.addAction(delete_action)
-        
-        menu.exec(card.mapToGlobal(pos))
-    
-    def removeCard(self, card):
-        """移除卡片"""
-        self.main_layout.removeWidget(card)
-        if hasattr(card, 'image_path'):
-            self.added_images.discard(card.image_path)
-            # 同时从文件名字典中移除显示名称
-            if hasattr(card, 'display_filename'):
-                self.added_filenames.pop(card.display_filename, None)
-        card.deleteLater()
-        
-        self.main_layout.update()
-        self.scroll_widget.update()
-        QApplication.processEvents()
-        
-        if self.main_layout.count() == 0:
-            if not self.default_container:
-                self.default_container = QWidget(self.scroll_widget)
-                self.default_container.setObjectName('defaultContainer')
-                container_layout = QVBoxLayout(self.default_container)
-                container_layout.setContentsMargins(0, 0, 0, 0)
-                
-                self.default_label = QLabel('拖拽图片到这里')
-                self.default_label.setObjectName('defaultLabel')
-                self.default_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                self.default_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
-                
-                container_layout.addWidget(self.default_label)
-                self.default_container.setLayout(container_layout)
-                self.main_layout.addWidget(self.default_container)
-                
-                if self.viewport():
-                    self.default_container.resize(self.viewport().size())
-                    self.default_container.setMinimumSize(self.viewport().size())
-            
-            self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-            self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        menu.exec(self.viewport().mapToGlobal(pos))
+
+    def removeSelected(self):
+        """一次性移除所有选中的图片"""
+        rows = [index.row() for index in self.selectionModel().selectedIndexes()]
+        self.image_model.remove_rows(rows)
 
     def closeEvent(self, event):
         """窗口关闭事件，用于正确关闭线程"""
-        self.thread.quit()
-        self.thread.wait()
-        event.accept()
\ No newline at end of file
+        for scanner in list(self._scanners):
+            scanner.stop()
+            scanner.wait()
+        self._scanners.clear()
+        self.image_processor.cancel()
+        self.image_processor.wait()
+        event.accept()
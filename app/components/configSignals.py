@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+配置变更信号
+
+把配置服务的变更回调转换为Qt信号，回调在哪个线程触发都会排队到接收者所在的线程处理。
+"""
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from app.common.config_store import get_config_store
+
+
+class ConfigSignals(QObject):
+    """配置项变化时发出 changed(键, 新值)"""
+    changed = pyqtSignal(str, object)
+
+    def __init__(self, store=None, parent=None):
+        super().__init__(parent)
+        self.store = store or get_config_store()
+        self.store.add_listener(self.changed.emit)
+
+
+_signals = None
+
+
+def config_signals():
+    """获取全局的配置变更信号对象，需在GUI线程中首次调用"""
+    global _signals
+    if _signals is None:
+        _signals = ConfigSignals()
+    return _signals
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+延迟创建的子界面
+
+导航栏中先放一个空的占位界面，第一次切换过去（占位界面显示）时才构造真正的界面，
+不在首屏显示的界面不再拖慢启动。
+"""
+
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtWidgets import QVBoxLayout, QWidget
+
+from app.common.startup_profiler import profiler
+
+
+class LazyInterface(QWidget):
+    """占位界面，显示时调用factory()创建真正的界面并填满自身"""
+    created = pyqtSignal(QWidget)
+
+    def __init__(self, object_name, factory, parent=None):
+        """
+        :param object_name: 导航使用的对象名，与真正界面的对象名相同
+        :param factory: 无参数的构造函数，返回真正的界面
+        """
+        super().__init__(parent)
+        self.setObjectName(object_name)
+        self.factory = factory
+        self.widget = None
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+
+    def ensure_created(self):
+        """创建真正的界面（只创建一次）"""
+        if self.widget is None:
+            with profiler.span(f"create {self.objectName()}"):
+                self.widget = self.factory()
+                self._layout.addWidget(self.widget)
+            self.created.emit(self.widget)
+        return self.widget
+
+    def showEvent(self, event):
+        self.ensure_created()
+        super().showEvent(event)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+单实例运行
+
+第一个启动的MarkFlow监听一个本地套接字（QLocalServer，Windows上为命名管道）。
+之后再启动时（双击图片、"打开方式"等）先尝试连接，连接成功就把命令行中的文件和文件夹转发给
+已经运行的窗口并立即退出，不再加载qfluentwidgets和各个界面。
+
+本模块只依赖QtCore和QtNetwork，需在创建QApplication之后、导入界面模块之前使用。
+"""
+
+import getpass
+import hashlib
+import json
+import os
+import sys
+
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtNetwork import QAbstractSocket, QLocalServer, QLocalSocket
+
+# 转发时等待连接和应答的时间（毫秒）
+FORWARD_TIMEOUT = 500
+
+# 收到的消息超过这个大小时断开连接
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+def server_name():
+    """本地套接字名称，同一用户、同一安装位置的MarkFlow共用一个实例"""
+    if getattr(sys, 'frozen', False):
+        location = os.path.dirname(sys.executable)
+    else:
+        location = os.path.dirname(os.path.abspath(sys.argv[0]))
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = ''
+    digest = hashlib.sha1(f"{user}|{os.path.normcase(location)}".encode('utf-8')).hexdigest()[:16]
+    return f"MarkFlow-{digest}"
+
+
+def forward_to_running_instance(paths, timeout=FORWARD_TIMEOUT):
+    """
+    把文件和文件夹转发给已经运行的实例
+    :param paths: 命令行参数中的路径，相对路径按当前目录解析
+    :return: 是否转发成功（成功时当前进程应直接退出）
+    """
+    socket = QLocalSocket()
+    socket.connectToServer(server_name())
+    if not socket.waitForConnected(timeout):
+        return False
+
+    message = json.dumps({'paths': [os.path.abspath(path) for path in paths]}, ensure_ascii=False)
+    socket.write(message.encode('utf-8') + b'\n')
+    if not socket.waitForBytesWritten(timeout):
+        socket.abort()
+        return False
+
+    # 等待对方确认收到，避免对方正在退出时文件丢失
+    reply = b''
+    while not reply.endswith(b'\n'):
+        if not socket.waitForReadyRead(timeout):
+            socket.abort()
+            return False
+        reply += bytes(socket.readAll())
+    socket.disconnectFromServer()
+    return reply.strip() == b'ok'
+
+
+class SingleInstanceServer(QObject):
+    """监听本地套接字，收到其他实例转发的路径时发出 pathsReceived(路径列表)"""
+    pathsReceived = pyqtSignal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        self.server.newConnection.connect(self._on_new_connection)
+        self._buffers = {}
+
+    def listen(self):
+        """
+        开始监听
+        :return: 是否成功（失败时程序照常运行，只是不接收转发）
+        """
+        name = server_name()
+        if self.server.listen(name):
+            return True
+        if self.server.serverError() == QAbstractSocket.SocketError.AddressInUseError:
+            # 同时启动的另一个实例已经在监听
+            probe = QLocalSocket()
+            probe.connectToServer(name)
+            if probe.waitForConnected(FORWARD_TIMEOUT):
+                probe.abort()
+                return False
+            # 上次异常退出留下的套接字文件
+            QLocalServer.removeServer(name)
+            if self.server.listen(name):
+                return True
+        print(f"单实例监听失败: {self.server.errorString()}")
+        return False
+
+    def close(self):
+        self.server.close()
+
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self._buffers[socket] = b''
+            socket.readyRead.connect(lambda socket=socket: self._on_ready_read(socket))
+            socket.disconnected.connect(lambda socket=socket: self._on_disconnected(socket))
+
+    def _on_ready_read(self, socket):
+        buffer = self._buffers.get(socket, b'') + bytes(socket.readAll())
+        if len(buffer) > MAX_MESSAGE_SIZE:
+            socket.abort()
+            return
+        if not buffer.endswith(b'\n'):
+            self._buffers[socket] = buffer
+            return
+        self._buffers[socket] = b''
+        try:
+            paths = json.loads(buffer.decode('utf-8')).get('paths', [])
+        except (ValueError, AttributeError) as e:
+            print(f"解析转发的路径时出错: {e}")
+            socket.abort()
+            return
+        socket.write(b'ok\n')
+        socket.flush()
+        self.pathsReceived.emit([path for path in paths if isinstance(path, str)])
+
+    def _on_disconnected(self, socket):
+        self._buffers.pop(socket, None)
+        socket.deleteLater()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+缩略图加载
+
+在线程池中按缩略图尺寸解码图片，结果保存到磁盘缓存（data/thumbnails），
+主页图片列表和水印库共用。
+"""
+
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThread, QThreadPool, QBuffer, QByteArray, QIODevice, pyqtSignal
+from PyQt6.QtGui import QImage, QImageReader
+import os
+import threading
+
+from app.common.thumbnail_cache import create_thumbnail_cache
+
+
+class ProcessedImageData:
+    """处理后的图片数据"""
+    def __init__(self, image_path, filename, display_filename=None, pixmap=None, error=None, image=None):
+        self.image_path = image_path
+        self.filename = filename  # 原始文件名
+        self.display_filename = display_filename or filename  # 显示用的文件名
+        self.pixmap = pixmap
+        self.image = image  # 工作线程中解码的QImage，在GUI线程中转换为QPixmap
+        self.error = error
+
+
+def load_thumbnail(file_path, size):
+    """
+    按缩略图尺寸解码图片，可在任意线程中调用
+    QImageReader.setScaledSize 让JPEG插件使用libjpeg的DCT缩放，直接解码出1/2~1/8大小的图像，
+    不需要先解码出全分辨率图片。先解码到约两倍尺寸，再平滑缩放，保证缩略图的清晰度。
+    :return: QImage，失败时返回None
+    """
+    reader = QImageReader(file_path)
+    reader.setAutoTransform(True)  # 按EXIF方向旋转
+    source_size = reader.size()
+    if source_size.isValid() and (source_size.width() > size.width() * 2 or source_size.height() > size.height() * 2):
+        reader.setScaledSize(source_size.scaled(size * 2, Qt.AspectRatioMode.KeepAspectRatio))
+
+    image = reader.read()
+    if image.isNull():
+        return None
+    return image.scaled(size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+
+def encode_thumbnail(image):
+    """把缩略图编码为缓存用的字节，有透明通道时使用PNG，否则使用JPEG"""
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    if image.hasAlphaChannel():
+        image.save(buffer, 'PNG')
+    else:
+        image.save(buffer, 'JPG', 90)
+    buffer.close()
+    return bytes(data)
+
+
+class ThumbnailTask(QRunnable):
+    """在线程池中解码一张缩略图"""
+
+    def __init__(self, processor, generation, file_path):
+        super().__init__()
+        self.processor = processor
+        self.generation = generation
+        self.file_path = file_path
+
+    def run(self):
+        file_path = self.file_path
+        filename = os.path.basename(file_path)  # 原始文件名
+        if not os.path.isfile(file_path):
+            result = ProcessedImageData(file_path, filename, error="文件不存在")
+        else:
+            try:
+                image = self._load(file_path)
+                if image is not None:
+                    result = ProcessedImageData(file_path, filename, image=image)
+                else:
+                    result = ProcessedImageData(file_path, filename, error="图片加载失败")
+            except Exception as e:
+                result = ProcessedImageData(file_path, filename, error=f"处理图片时出错: {str(e)}")
+        self.processor._task_done(self.generation, result)
+
+    def _load(self, file_path):
+        """优先从磁盘缓存读取缩略图，未命中时解码原图并写入缓存"""
+        size = self.processor.size
+        cache = self.processor.cache
+        if cache is None:
+            return load_thumbnail(file_path, size)
+
+        key = cache.key(file_path, f"{size.width()}x{size.height()}")
+        data = cache.get(key)
+        if data:
+            image = QImage.fromData(data)
+            if not image.isNull():
+                return image
+
+        image = load_thumbnail(file_path, size)
+        if image is not None:
+            cache.put(key, encode_thumbnail(image))
+        return image
+
+
+class ImageProcessor(QObject):
+    """
+    缩略图加载器，在线程池中并行解码
+    后请求的先处理，主页图片列表快速滚动时优先显示当前位置的缩略图
+    信号从工作线程发出，经队列连接在GUI线程中处理
+    """
+    finished = pyqtSignal(ProcessedImageData)
+
+    def __init__(self, size, use_cache=True):
+        """
+        :param size: 缩略图最大尺寸，不同尺寸的缩略图在磁盘缓存中分开保存
+        :param use_cache: 是否使用磁盘缓存，加载的本身就是小图时不需要
+        """
+        super().__init__()
+        self.size = size
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max(2, QThread.idealThreadCount()))
+        self.cache = create_thumbnail_cache() if use_cache else None
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._pending = set()  # 已提交但还未完成的图片路径
+        self._priority = 0
+
+    def request(self, file_path):
+        """请求加载一张缩略图，已在加载中的图片不会重复提交"""
+        with self._lock:
+            if file_path in self._pending:
+                return
+            self._pending.add(file_path)
+            self._priority = min(self._priority + 1, 2 ** 30)
+            task = ThumbnailTask(self, self._generation, file_path)
+            priority = self._priority
+        self.pool.start(task, priority)
+
+    def cancel(self):
+        """丢弃尚未开始的请求，正在解码的结果也不再发出"""
+        self.pool.clear()
+        with self._lock:
+            self._generation += 1
+            self._pending.clear()
+
+    def wait(self):
+        """等待正在解码的缩略图完成"""
+        self.pool.waitForDone()
+
+    def _task_done(self, generation, result):
+        """工作线程回调"""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pending.discard(result.image_path)
+        self.finished.emit(result)
@@ -3,7 +3,6 @@
 # @Author  : Quenan
 
 import os
-import json
 import sys
 from pathlib import Path
 
@@ -15,10 +14,12 @@ from qfluentwidgets import (SettingCardGroup, PushSettingCard, OptionsSettingCar
 from qfluentwidgets import (ScrollArea, qconfig, InfoBar, InfoBarPosition)  # 添加ScrollArea
 from qfluentwidgets.common.config import ConfigItem, OptionsConfigItem, OptionsValidator, QConfig
 
+from app.common.config_store import get_config_store
+
 class MarkFlowConfig(QConfig):
     """ MarkFlow configuration """
+    # 在选择目录或处理图片时才创建，导入本模块没有副作用
     default_download_path = os.path.join(Path.home(), 'Downloads', 'MarkFlow')
-    os.makedirs(default_download_path, exist_ok=True)
     
     workFolder = ConfigItem("Folders", "WorkFolder", default_download_path)
     themeMode = OptionsConfigItem(
@@ -38,63 +39,33 @@ def get_application_path():
     return application_path
 
 def load_config_from_file():
-    """从data/config.json文件加载配置到QConfig中"""
-    current_dir = get_application_path()
-    config_file_path = os.path.join(current_dir, 'data', 'config.json')
-    
-    if os.path.exists(config_file_path):
-        try:
-            with open(config_file_path, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
-            
-            if "Out_path" in config_data and config_data["Out_path"]:
-                qconfig.set(markflowConfig.workFolder, config_data["Out_path"])
-            else:
-                # 如果Out_path为空或不存在，使用默认路径
-                qconfig.set(markflowConfig.workFolder, markflowConfig.default_download_path)
-                
-            if "Theme_mode" in config_data:
-                theme_map = {
-                    "Light": Theme.LIGHT,
-                    "Dark": Theme.DARK,
-                    "Auto": Theme.AUTO
-                }
-                theme = theme_map.get(config_data["Theme_mode"], Theme.AUTO)
-                qconfig.set(markflowConfig.themeMode, theme)
-                
-        except Exception as e:
-            print(f"读取配置文件时出错: {e}")
-            # 出错时使用默认配置
-            qconfig.set(markflowConfig.workFolder, markflowConfig.default_download_path)
+    """从配置服务加载配置到QConfig中（启动时由main.py在data目录准备好之后调用）"""
+    store = get_config_store()
+    out_path = store.get_str('Out_path')
+    # 如果Out_path为空或不存在，使用默认路径
+    qconfig.set(markflowConfig.workFolder, out_path or markflowConfig.default_download_path)
 
-def save_config_to_file():
-    """将QConfig中的配置保存到data/config.json文件中"""
-    current_dir = get_application_path()
-    config_file_path = os.path.join(current_dir, 'data', 'config.json')
-    
-    try:
-        config_data = {}
-        if os.path.exists(config_file_path):
-            with open(config_file_path, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
-        
-        config_data["Out_path"] = qconfig.get(markflowConfig.workFolder)
-        
-        theme_value = qconfig.get(markflowConfig.themeMode)
-        theme_map_reverse = {
-            Theme.LIGHT: "Light",
-            Theme.DARK: "Dark",
-            Theme.AUTO: "Auto"
+    theme_mode = store.get_str('Theme_mode')
+    if theme_mode:
+        theme_map = {
+            "Light": Theme.LIGHT,
+            "Dark": Theme.DARK,
+            "Auto": Theme.AUTO
         }
-        config_data["Theme_mode"] = theme_map_reverse.get(theme_value, "Auto")
-        
-        with open(config_file_path, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, ensure_ascii=False, indent=4)
-            
-    except Exception as e:
-        print(f"保存配置文件时出错: {e}")
+        qconfig.set(markflowConfig.themeMode, theme_map.get(theme_mode, Theme.AUTO))
 
-load_config_from_file()
+def save_config_to_file():
+    """将QConfig中的配置交给配置服务，由其合并写入data/config.json"""
+    theme_value = qconfig.get(markflowConfig.themeMode)
+    theme_map_reverse = {
+        Theme.LIGHT: "Light",
+        Theme.DARK: "Dark",
+        Theme.AUTO: "Auto"
+    }
+    get_config_store().update({
+        "Out_path": qconfig.get(markflowConfig.workFolder),
+        "Theme_mode": theme_map_reverse.get(theme_value, "Auto"),
+    })
 
 def load_theme_styles(app, theme_mode):
     """根据主题模式加载相应的样式表"""
@@ -142,6 +113,8 @@ class CustomFolderSettingCard(PushSettingCard):
         
     def __onButtonClicked(self):
         """ 选择文件夹 """
+        if self._dialogDirectory == markflowConfig.default_download_path:
+            os.makedirs(self._dialogDirectory, exist_ok=True)
         folder = QFileDialog.getExistingDirectory(
             self, self.tr("选择输出目录"), self._dialogDirectory)
         
@@ -1,4 +1,4 @@
-from PyQt6.QtCore import Qt, QUrl, pyqtSignal, QTimer, QEasingCurve
+from PyQt6.QtCore import Qt, QUrl, QSize, QThread, pyqtSignal, QTimer, QEasingCurve
 from PyQt6.QtGui import QPixmap
 from PyQt6.QtWidgets import (QVBoxLayout, QHBoxLayout, QLabel, QWidget, 
                              QFileDialog, QApplication, QMenu)
@@ -6,8 +6,16 @@ from qfluentwidgets import (SmoothScrollArea, PushButton, FlowLayout,
                             FluentIcon as FIF, RoundMenu, Action, MessageBoxBase, 
                             SubtitleLabel, LineEdit, SwitchButton, BodyLabel)
 import os
-import json
 import sys
+import threading
+
+from app.common.config_store import get_config_store
+from app.common.watermark_engine import get_watermark_index
+from app.components.configSignals import config_signals
+from app.components.thumbnailLoader import ImageProcessor
+
+# 水印卡片中预览图的最大尺寸
+PREVIEW_SIZE = QSize(120, 120)
 
 class RenameDialog(MessageBoxBase):
     """重命名对话框"""
@@ -51,9 +59,27 @@ class RenameDialog(MessageBoxBase):
             
         return True
 
+class WatermarkIndexSync(QThread):
+    """在后台线程中同步水印库索引，只有新增或修改过的水印才会被解码分析"""
+    updated = pyqtSignal(str, dict)  # 文件名, 索引记录
+    removed = pyqtSignal(str)  # 文件名
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self._stop_event = threading.Event()
+
+    def run(self):
+        self.index.sync(self.updated.emit, self.removed.emit, self._stop_event)
+
+    def stop(self):
+        self._stop_event.set()
+
 class WatermarkCard(QWidget):
     """水印卡片组件"""
     watermarkSelected = pyqtSignal(str)
+    watermarkRenamed = pyqtSignal(str, str)  # 原文件名, 新文件名
+    watermarkDeleted = pyqtSignal(str)
     
     def __init__(self, image_path, filename, parent=None):
         super().__init__(parent)
@@ -62,7 +88,6 @@ class WatermarkCard(QWidget):
         self.filename = filename
         self.is_selected = False
         self.setup_ui()
-        self.load_image()
     
     def setup_ui(self):
         """设置界面"""
@@ -98,17 +123,9 @@ class WatermarkCard(QWidget):
         self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.customContextMenuRequested.connect(self.show_context_menu)
     
-    def load_image(self):
-        """加载并显示图片"""
-        if os.path.exists(self.image_path):
-            pixmap = QPixmap(self.image_path)
-            if not pixmap.isNull():
-                scaled_pixmap = pixmap.scaled(
-                    120, 120,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation
-                )
-                self.img_label.setPixmap(scaled_pixmap)
+    def set_preview(self, image):
+        """显示后台加载好的预览图（QImage，已缩放到预览尺寸）"""
+        self.img_label.setPixmap(QPixmap.fromImage(image))
     
     def mousePressEvent(self, event):
         """处理鼠标按下事件"""
@@ -173,8 +190,10 @@ class WatermarkCard(QWidget):
             
             os.rename(self.image_path, new_path)
             
+            old_name = self.filename
             self.image_path = new_path
             self.filename = new_name
+            self.watermarkRenamed.emit(old_name, new_name)
             
             self.name_label.setText(new_name)
             
@@ -215,6 +234,7 @@ class WatermarkCard(QWidget):
                 os.remove(self.image_path)
             
             self.hide()
+            self.watermarkDeleted.emit(self.filename)
         except Exception as e:
             print(f"隐藏水印时出错: {e}")
     
@@ -231,10 +251,19 @@ class WatermarkInterface(SmoothScrollArea):
         self.setScrollAnimation(Qt.Orientation.Horizontal, 800, QEasingCurve.Type.InOutQuad)
         self.watermark_dir = self.get_watermark_directory()
         self.selected_card = None
+        # 水印元数据和预览图来自水印库索引，启动时不需要解码原图
+        self.watermark_index = get_watermark_index()
+        self.index_sync = None
+        self._sync_pending = False
+        # 预览图已是小图，在后台线程中加载，不需要再经过缩略图缓存
+        self.preview_loader = ImageProcessor(PREVIEW_SIZE, use_cache=False)
+        self.preview_loader.finished.connect(self._on_preview_loaded)
         self.setup_ui()
         self.load_watermarks()
         self.load_selected_watermark()
         self.load_auto_invert_config()
+        # 配置在其他地方被修改（包括外部编辑config.json）时同步选中的水印和自动反色开关
+        config_signals().changed.connect(self._on_config_changed)
         
     def _safe_delete_file(self, file_path):
         """安全删除文件"""
@@ -339,44 +368,22 @@ class WatermarkInterface(SmoothScrollArea):
         self.save_selected_watermark(filename)
     
     def save_selected_watermark(self, filename):
-        """保存选中的水印到配置文件"""
-        try:
-            project_root = WatermarkInterface.get_application_path()
-            config_file_path = os.path.join(project_root, 'data', 'config.json')
-            
-            config_data = {}
-            if os.path.exists(config_file_path):
-                with open(config_file_path, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
-            
-            config_data['Use_logo'] = filename
-            
-            with open(config_file_path, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, ensure_ascii=False, indent=4)
-                
-        except Exception as e:
-            print(f"保存选中水印到配置文件时出错: {e}")
+        """保存选中的水印到配置"""
+        get_config_store().set('Use_logo', filename)
     
     def load_selected_watermark(self):
         """加载并选中配置文件中指定的水印"""
-        try:
-            project_root = WatermarkInterface.get_application_path()
-            config_file_path = os.path.join(project_root, 'data', 'config.json')
-            
-            if os.path.exists(config_file_path):
-                with open(config_file_path, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
-                
-                selected_watermark = config_data.get('Use_logo') or config_data.get('use_logo')
-                if selected_watermark:
-                    for i in range(self.watermark_layout.count()):
-                        widget = self.watermark_layout.itemAt(i).widget()
-                        if widget and isinstance(widget, WatermarkCard) and widget.filename == selected_watermark:
-                            widget.set_selected(True)
-                            self.selected_card = widget
-                            break
-        except Exception as e:
-            print(f"加载选中水印时出错: {e}")
+        selected_watermark = self._configured_watermark()
+        if selected_watermark:
+            card = self._find_card(selected_watermark)
+            if card is not None:
+                card.set_selected(True)
+                self.selected_card = card
+    
+    def _configured_watermark(self):
+        """读取配置中选中的水印文件名"""
+        store = get_config_store()
+        return store.get_str('Use_logo') or store.get_str('use_logo') or None
     
     def remove_watermark_card(self, card):
         """隐藏水印卡片（避免删除导致的崩溃）"""
@@ -410,15 +417,17 @@ class WatermarkInterface(SmoothScrollArea):
                     from shutil import copy2
                     copy2(file_path, target_path)
                     
-                    card = WatermarkCard(target_path, os.path.basename(target_path), self)
-                    card.watermarkSelected.connect(self.handle_watermark_selected)
-                    self.watermark_layout.addWidget(card)
+                    # 预览图在索引同步时生成
+                    self._add_card(target_path, os.path.basename(target_path))
                     
                     success_count += 1
                 except Exception as e:
                     failed_files.append((os.path.basename(file_path), str(e)))
                     print(f"导入水印 {file_path} 失败: {e}")
             
+            if success_count:
+                self.sync_watermark_index()
+            
             QApplication.processEvents()
             
             if failed_files:
@@ -446,74 +455,111 @@ class WatermarkInterface(SmoothScrollArea):
                 )
     
     def load_watermarks(self):
-        """加载已有的水印"""
-        if not os.path.exists(self.watermark_dir):
-            return
+        """从水印库索引加载已有的水印，再在后台检查目录中新增、修改和删除的水印"""
+        cards = [self._add_card(os.path.join(self.watermark_dir, filename), filename)
+                 for filename in self.watermark_index.filenames()]
         
-        image_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+        # 后请求的预览图先加载，逆序请求使排在前面（先看到）的卡片先显示
+        for card in reversed(cards):
+            self._request_preview(card.filename)
         
-        for filename in os.listdir(self.watermark_dir):
-            if filename.lower().endswith(image_extensions):
-                image_path = os.path.join(self.watermark_dir, filename)
-                card = WatermarkCard(image_path, filename, self)
-                card.watermarkSelected.connect(self.handle_watermark_selected)
-                self.watermark_layout.addWidget(card)
+        self.sync_watermark_index()
+        QApplication.instance().aboutToQuit.connect(self._stop_index_sync)
+    
+    def sync_watermark_index(self):
+        """在后台同步水印库索引，正在同步时等本次结束后再同步一次"""
+        if self.index_sync is not None:
+            self._sync_pending = True
+            return
+        self.index_sync = WatermarkIndexSync(self.watermark_index, self)
+        self.index_sync.updated.connect(self._on_index_updated)
+        self.index_sync.removed.connect(self._on_index_removed)
+        self.index_sync.finished.connect(self._on_index_sync_finished)
+        self.index_sync.start()
+    
+    def _on_index_sync_finished(self):
+        self.index_sync.deleteLater()
+        self.index_sync = None
+        if self._sync_pending:
+            self._sync_pending = False
+            self.sync_watermark_index()
+    
+    def _stop_index_sync(self):
+        """程序退出时停止同步，已分析的水印已写入索引"""
+        if self.index_sync is not None:
+            self.index_sync.stop()
+            self.index_sync.wait()
+    
+    def _find_card(self, filename):
+        for i in range(self.watermark_layout.count()):
+            widget = self.watermark_layout.itemAt(i).widget()
+            if isinstance(widget, WatermarkCard) and widget.filename == filename and widget.isVisibleTo(self):
+                return widget
+        return None
+    
+    def _add_card(self, image_path, filename):
+        """创建水印卡片并添加到列表"""
+        card = WatermarkCard(image_path, filename, self)
+        card.watermarkSelected.connect(self.handle_watermark_selected)
+        card.watermarkRenamed.connect(self.watermark_index.rename)
+        card.watermarkDeleted.connect(self.watermark_index.remove)
+        self.watermark_layout.addWidget(card)
+        return card
+    
+    def _request_preview(self, filename):
+        preview_path = self.watermark_index.preview_path(filename)
+        if preview_path:
+            self.preview_loader.request(preview_path)
+    
+    def _on_index_updated(self, filename, entry):
+        """后台分析完一个新增或修改过的水印"""
+        if self._find_card(filename) is None:
+            card = self._add_card(os.path.join(self.watermark_dir, filename), filename)
+            if self.selected_card is None and filename == self._configured_watermark():
+                card.set_selected(True)
+                self.selected_card = card
+        self._request_preview(filename)
+    
+    def _on_index_removed(self, filename):
+        """水印文件已在程序外被删除"""
+        card = self._find_card(filename)
+        if card is not None and card is not self.selected_card:
+            card.hide()
+    
+    def _on_preview_loaded(self, data):
+        """预览图加载完成，在GUI线程中显示到对应的卡片（内容相同的水印共用预览图）"""
+        if data.error:
+            print(f"加载水印预览 {data.image_path} 时出错: {data.error}")
+            return
+        for i in range(self.watermark_layout.count()):
+            widget = self.watermark_layout.itemAt(i).widget()
+            if isinstance(widget, WatermarkCard) and self.watermark_index.preview_path(widget.filename) == data.image_path:
+                widget.set_preview(data.image)
     
     def on_auto_invert_changed(self, checked):
         """自动反色开关状态改变时的处理函数"""
         self.save_auto_invert_config(checked)
     
     def save_auto_invert_config(self, enabled):
-        """保存自动反色配置到配置文件"""
-        try:
-            project_root = WatermarkInterface.get_application_path()
-            config_file_path = os.path.join(project_root, 'data', 'config.json')
-            
-            # 如果在打包环境中且data目录不存在，则尝试_internal同级目录
-            if not os.path.exists(os.path.dirname(config_file_path)) and getattr(sys, 'frozen', False):
-                config_file_path = os.path.join(project_root, '_internal', 'data', 'config.json')
-            
-            # 确保data目录存在
-            data_dir = os.path.dirname(config_file_path)
-            if not os.path.exists(data_dir):
-                os.makedirs(data_dir)
-            
-            config_data = {}
-            if os.path.exists(config_file_path):
-                with open(config_file_path, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
-            
-            # 统一使用Auto_invert作为键名（注意大小写）
-            config_data['Auto_invert'] = enabled
-            
-            with open(config_file_path, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, ensure_ascii=False, indent=4)
-                
-        except Exception as e:
-            print(f"保存自动反色配置时出错: {e}")
+        """保存自动反色配置"""
+        # 统一使用Auto_invert作为键名（注意大小写）
+        get_config_store().set('Auto_invert', enabled)
     
     def load_auto_invert_config(self):
         """加载自动反色配置"""
-        try:
-            project_root = WatermarkInterface.get_application_path()
-            config_file_path = os.path.join(project_root, 'data', 'config.json')
-            
-            # 如果在打包环境中且data目录不存在，则尝试_internal同级目录
-            if not os.path.exists(config_file_path) and getattr(sys, 'frozen', False):
-                config_file_path = os.path.join(project_root, '_internal', 'data', 'config.json')
-            
-            if os.path.exists(config_file_path):
-                with open(config_file_path, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
-                
-                # 统一使用Auto_invert作为键名（注意大小写）
-                auto_invert = config_data.get('Auto_invert', False)
-                self.auto_invert_switch.setChecked(auto_invert)
-                print(f"加载自动反色配置: {auto_invert}")  # 调试信息
-            else:
-                # 如果配置文件不存在，设置默认值为False
-                self.auto_invert_switch.setChecked(False)
-                print("配置文件不存在，使用默认值False")  # 调试信息
-        except Exception as e:
-            print(f"加载自动反色配置时出错: {e}")
-            self.auto_invert_switch.setChecked(False)
+        # 统一使用Auto_invert作为键名（注意大小写）
+        self.auto_invert_switch.setChecked(get_config_store().get_bool('Auto_invert'))
+    
+    def _on_config_changed(self, key, value):
+        """配置变化时更新界面"""
+        if key == 'Auto_invert':
+            if self.auto_invert_switch.isChecked() != bool(value):
+                self.auto_invert_switch.setChecked(bool(value))
+        elif key == 'Use_logo':
+            card = self._find_card(value) if value else None
+            if card is not self.selected_card:
+                if self.selected_card:
+                    self.selected_card.set_selected(False)
+                self.selected_card = card
+                if card is not None:
+                    card.set_selected(True)
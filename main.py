@@ -1,18 +1,53 @@
 import sys
 import os  # 添加os模块用于文件路径检查
-import json
 
-from PyQt6.QtCore import Qt, QSize, QFile, QTextStream, QEventLoop, QTimer
+# 命令行模式：在导入PyQt6/qfluentwidgets之前分流，无需显示环境即可运行
+CLI_COMMANDS = ('batch', 'resume', 'profiles', 'bench', 'build-profile', 'watch', 'serve')
+if __name__ == '__main__' and len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS:
+    from app.common.cli import main as cli_main
+    sys.exit(cli_main(sys.argv[1:]))
+
+from app.common.startup_profiler import profiler
+
+# 单实例：已有MarkFlow在运行时把文件和文件夹转发给它并立即退出，不再加载qfluentwidgets和界面
+# Qt的本地套接字需要在创建QApplication之后使用；Single_instance为false时不转发，每次启动都打开新窗口
+if __name__ == '__main__':
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtWidgets import QApplication
+    from app.common.config_store import get_config_store
+
+    # 启用高分屏缩放（需在创建QApplication之前设置）
+    QApplication.setHighDpiScaleFactorRoundingPolicy(
+        Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
+    # QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)
+
+    # 不能命名为app，之后的import app.components...会覆盖这个名称
+    application = QApplication(sys.argv)
+    profiler.mark('QApplication')
+
+    launch_paths = [arg for arg in sys.argv[1:] if os.path.exists(arg)]
+    single_instance = get_config_store().get_bool('Single_instance', True)
+    if single_instance:
+        from app.components.singleInstance import forward_to_running_instance
+        if forward_to_running_instance(launch_paths):
+            sys.exit(0)
+
+from PyQt6.QtCore import Qt, QSize, QFile, QTextStream, QTimer
 from PyQt6.QtGui import QIcon
-from PyQt6.QtWidgets import QApplication, QMessageBox  # 添加QMessageBox用于提示
+from PyQt6.QtWidgets import QApplication
 from qfluentwidgets import FluentIcon as FIF, FluentWindow, SplashScreen, setTheme, Theme
 from qfluentwidgets.common.config import qconfig  # 导入qconfig用于获取主题设置
+from app.common.config_store import get_config_store
+from app.common.watermark_engine import get_report_dir
+from app.components.lazyInterface import LazyInterface
+from app.components.singleInstance import SingleInstanceServer
 from app.view.home_Interface import HomeInterface
-from app.view.settings_interface import SettingsInterface, markflowConfig, load_theme_styles  # 导入配置类和load_theme_styles函数
-from app.view.watermark_interface import WatermarkInterface  # 导入水印管理界面
+from app.view.settings_interface import SettingsInterface, markflowConfig, load_config_from_file  # 导入配置类
 # 导入资源文件
 import app.components.resources_rc
 
+profiler.mark('imports')
+
 
 class MainWindow(FluentWindow):
     def __init__(self):
@@ -27,24 +62,60 @@ class MainWindow(FluentWindow):
         self.splashScreen.setIconSize(QSize(106, 106))
         self.splashScreen.raise_()
 
-        # 导入界面
-        self.home_interface = HomeInterface()
-        self.settings_interface = SettingsInterface()
-        self.watermark_interface = WatermarkInterface()  # 创建水印管理界面实例
+        # 导入界面：首屏只需要主页，其他界面默认在第一次切换过去时才创建
+        lazy = get_config_store().get_bool('Lazy_interfaces', True)
+        with profiler.span('create HomeInterface'):
+            self.home_interface = HomeInterface()
+        self.watermark_interface = self.create_interface('WatermarkInterface', create_watermark_interface, lazy)
+        self.settings_interface = self.create_interface('SettingsInterface', SettingsInterface, lazy)
+        self._first_paint = False
 
         # 初始化
         self.initNav()
         self.initWindows()
         
-        # 在创建其他子页面前先显示主界面
         self.show()
-        
-        # 创建子界面
-        self.createSubInterface()
+        profiler.mark('window shown')
         
         # 隐藏启动页面
         self.splashScreen.finish()
 
+    @staticmethod
+    def create_interface(object_name, factory, lazy):
+        """创建子界面，lazy为True时先放置占位界面"""
+        if lazy:
+            return LazyInterface(object_name, factory)
+        with profiler.span(f"create {object_name}"):
+            return factory()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._first_paint:
+            self._first_paint = True
+            # 首次绘制之后再处理启动统计和可能弹出对话框的操作
+            QTimer.singleShot(0, self.on_first_paint)
+
+    def on_first_paint(self):
+        """首次绘制完成"""
+        profiler.finish(get_config_store().snapshot(), get_report_dir())
+        if os.environ.get('MARKFLOW_EXIT_AFTER_STARTUP') == '1':
+            # 测量冷启动耗时（build-profile --dist）时首次绘制后立即退出
+            QApplication.quit()
+            return
+
+        # 上次的批处理被中断时询问是否继续
+        self.home_interface.offer_resume()
+
+    def open_paths(self, paths):
+        """打开命令行参数或其他实例转发的文件和文件夹，并把窗口切换到前台"""
+        if paths:
+            self.switchTo(self.home_interface)
+            self.home_interface.add_img_box.add_paths(paths)
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
     def initNav(self):
         """初始化导航栏"""
         self.addSubInterface(self.home_interface, FIF.HOME, '主页')
@@ -60,13 +131,12 @@ class MainWindow(FluentWindow):
         w, h = desktop.width(), desktop.height()
         self.move(w // 2 - self.width() // 2, h // 2 - self.height() // 2)
         QApplication.processEvents()
-        
-    def createSubInterface(self):
-        """创建子界面"""
-        # 使用事件循环模拟加载过程
-        loop = QEventLoop(self)
-        QTimer.singleShot(1500, loop.quit)
-        loop.exec()
+
+
+def create_watermark_interface():
+    """创建水印管理界面，第一次使用时才导入模块"""
+    from app.view.watermark_interface import WatermarkInterface
+    return WatermarkInterface()
 
 
 def load_global_styles(app):
@@ -127,50 +197,42 @@ def check_data_folder():
         # 创建data文件夹
         os.makedirs(data_folder_path)
     
-    # 检查文件是否存在
-    data_json_path = os.path.join(data_folder_path, 'config.json')
-    if not os.path.exists(data_json_path):
-        # 查找默认配置文件的路径
-        # 在打包后的程序中，config目录在_internal目录中
-        if getattr(sys, 'frozen', False):
-            # 打包后的程序，config目录在_internal中
-            default_config_path = os.path.join(current_dir, '_internal', 'config', 'default_config.json')
-        else:
-            # 直接运行的Python脚本
-            default_config_path = os.path.join(current_dir, 'config', 'default_config.json')
-            
-        if os.path.exists(default_config_path):
-            # 从默认配置文件读取内容
-            with open(default_config_path, 'r', encoding='utf-8') as f:
-                default_config = json.load(f)
-            
-            # 写入
-            with open(data_json_path, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, ensure_ascii=False, indent=4)
-        else:
-            with open(data_json_path, 'w', encoding='utf-8') as f:
-                f.write('{}')
+    # config.json不存在时按默认配置创建（原子写入）
+    get_config_store().ensure_file()
 
 
 if __name__ == '__main__':
-    # 启用高分屏缩放
-    QApplication.setHighDpiScaleFactorRoundingPolicy(
-        Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
-    # QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)
+    app = application
 
-    app = QApplication(sys.argv)
-    
     # 检查并创建必要的数据文件夹
     check_data_folder()
+    # 退出前写入还在防抖等待中的配置修改
+    app.aboutToQuit.connect(get_config_store().flush)
+    # data目录准备好之后再读取输出目录和主题
+    load_config_from_file()
+    profiler.mark('config')
+
+    # 尽早开始监听，窗口创建过程中再启动的实例也能转发过来（在事件循环开始后处理）
+    instance_server = None
+    if single_instance:
+        instance_server = SingleInstanceServer(app)
+        instance_server.listen()
+        app.aboutToQuit.connect(instance_server.close)
     
     # 设置主题
     setTheme(qconfig.get(markflowConfig.themeMode))
     
     # 加载全局样式表
     load_global_styles(app)
+    profiler.mark('styles')
     
     # 创建主窗口
     w = MainWindow()
-    w.show()
+    # 退出前停止监视文件夹，等待正在处理的一批图片完成
+    app.aboutToQuit.connect(lambda: w.home_interface.stop_watching(wait=True))
+    if instance_server is not None:
+        instance_server.pathsReceived.connect(w.open_paths)
+    if launch_paths:
+        w.open_paths(launch_paths)
     
     app.exec()
@@ -1,7 +1,16 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import sys
+
+sys.path.insert(0, SPECPATH)
+from app.common.build_profile import derive_profile, filter_qt_files
+
 block_cipher = None
 
+profile = derive_profile(SPECPATH)
+for name, error in profile['failures'].items():
+    print(f"导入失败: {name}: {error}")
+
 a = Analysis(
     ['main.py'],
     pathex=[],
@@ -11,47 +20,30 @@ a = Analysis(
         ('config', 'config'),
         # data目录不打包，它将在运行时自动创建
     ],
-    hiddenimports=[
-        'app.view.home_Interface',
-        'app.view.settings_interface',
-        'app.view.watermark_interface',
-        'app.components.addImgBox',
-        'app.components.resources_rc',
-        'qfluentwidgets',
-        'qfluentwidgets.common',
-        'qfluentwidgets.common.config',
-        'PyQt6',
-        'PyQt6.QtCore',
-        'PyQt6.QtGui',
-        'PyQt6.QtWidgets',
-        'colorthief',
-        'PIL',
-        'PIL.Image',
-        'PIL.ImageDraw',
-        'PIL.ImageFont',
-        'scipy',
-        'scipy.ndimage',
-        'numpy'
-    ],
+    # 隐藏导入和排除项从代码的实际导入推导，见 app/common/build_profile.py
+    hiddenimports=profile['hiddenimports'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=profile['excludes'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
 )
 
+# 去掉用不到的Qt插件和翻译文件
+a.binaries = filter_qt_files(a.binaries)
+a.datas = filter_qt_files(a.datas)
+
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
+# 目录模式：依赖库直接放在_internal中，启动时不需要先解压到临时目录
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='MarkFlow',
     debug=False,
     bootloader_ignore_signals=False,